@@ -1,14 +1,35 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+import time
+_boot_started = time.perf_counter()
+
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, g, Response
 from flask_wtf import CSRFProtect
+from flask_sock import Sock
+import click
 import os
 from dotenv import load_dotenv
 
 # Import modules
-from modules.database import db
+from modules.database import db, migrate_emotion_vectors
 from modules.auth import register_user, login_user, logout_user, require_auth, get_current_user, generate_oauth_url, exchange_oauth_code, login_oauth_user, create_guest_user
 from modules.chat import initialize_gemini, process_chat_message, get_user_sessions, get_session_conversation, delete_chat_session
 from modules.emotions import detect_image_emotions
-from modules.profile import get_profile_page, update_profile, update_preferences, get_profile_statistics
+from modules.models import register_model, get_model, warm_up_models, model_states, models_ready
+from modules.profile import get_profile_page, update_profile, update_preferences, get_profile_statistics, get_bootstrap_data
+from modules.capture import get_capture_config, next_capture_config, track_inference
+from modules.streaming import handle_emotion_stream
+from modules.metrics import render_metrics, HTTP_REQUEST_SECONDS
+from modules.admission import admission_control
+from modules.responses import json_response, compress_response
+from modules.versions import conditional_json, user_etag, session_etag
+from modules.rollups import get_mood_series, backfill_rollups
+from modules.export import export_response
+from modules.search import search_conversations, rebuild_index
+from modules.memories import rebuild_memories
+from modules.guests import route_guest_request, reset_guest_route, run_sweep, start_guest_sweeper
+from modules.assets import asset_url, send_asset, build_assets
+from modules.pages import cached_page
+from modules.profiling import profiling_enabled, should_profile, start_request_profile, save_request_profile
+import uuid
 from modules.wellness import start_meditation_session, complete_meditation_session, get_wellness_reminders, get_mindfulness_prompt
 
 # Load environment variables
@@ -19,11 +40,116 @@ print(f"📄 .env file exists: {os.path.exists('.env')}")
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
 csrf = CSRFProtect(app)
+sock = Sock(app)
 
-# Initialize Gemini AI
+# Initialize Gemini AI (created on first use through the model registry)
 gemini_api_key = os.environ.get('GEMINI_API_KEY')
 print(f"🔑 GEMINI_API_KEY loaded: {'Yes' if gemini_api_key else 'No'}")
-model = initialize_gemini(gemini_api_key)
+register_model('gemini', lambda: initialize_gemini(gemini_api_key))
+
+# Load models in the background so non-ML routes can serve immediately.
+# MODEL_WARMUP=off leaves every model to load on first use; MODEL_WARMUP=preload
+# (set by gunicorn.conf.py) loads the fork-safe model weights synchronously so
+# the pre-fork master shares them with its workers.
+PRELOAD_MODELS = ['text_emotion', 'image_emotion', 'text_embedding']
+model_warmup = os.environ.get('MODEL_WARMUP', 'background')
+if __name__ == '__mp_main__':
+    # Re-imported by the password hashing pool's processes under `python app.py`; they need no models
+    model_warmup = 'off'
+if model_warmup == 'preload':
+    warm_up_models(PRELOAD_MODELS, background=False)
+elif model_warmup == 'background':
+    warm_up_models()
+
+@app.context_processor
+def inject_asset_url():
+    return {'asset_url': asset_url}
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Build fingerprinted, minified and precompressed static assets"""
+    build_assets(app.static_folder)
+
+@app.cli.command('migrate-emotion-vectors')
+@click.option('--start-after', help='resume after this conversation id (printed after each page)')
+def migrate_emotion_vectors_command(start_after):
+    """Pack conversations' legacy emotion lists into fixed-order score vectors"""
+    migrate_emotion_vectors(start_after=start_after)
+
+@app.cli.command('sweep-guests')
+@click.option('--legacy', is_flag=True, help='also delete guests created before expiry existed, by creation time')
+def sweep_guests_command(legacy):
+    """Delete expired guest accounts and everything they own"""
+    print(f"🧹 Deleted {run_sweep(legacy=legacy)} guest accounts")
+
+@app.cli.command('backfill-rollups')
+@click.option('--user', 'user_id', help='rebuild a single user (default: everyone)')
+def backfill_rollups_command(user_id):
+    """Rebuild daily mood rollups from stored conversations and meditations"""
+    backfill_rollups(user_id)
+
+@app.cli.command('rebuild-search-index')
+@click.option('--user', 'user_id', help='rebuild a single user (default: everyone)')
+def rebuild_search_index_command(user_id):
+    """Rebuild conversation search indexes from stored conversations"""
+    rebuild_index(user_id)
+
+@app.cli.command('rebuild-memories')
+@click.option('--user', 'user_id', help='rebuild a single user (default: everyone)')
+def rebuild_memories_command(user_id):
+    """Re-embed stored conversations into the long-term memory indexes"""
+    rebuild_memories(user_id)
+
+# Request instrumentation
+@app.before_request
+def start_request_timer():
+    g.request_started_at = time.perf_counter()
+
+@app.before_request
+def route_guest_storage():
+    g.guest_route = route_guest_request()
+
+@app.teardown_request
+def reset_guest_storage(exc):
+    reset_guest_route(g.pop('guest_route', None))
+
+@app.before_request
+def start_profiler():
+    if profiling_enabled() and should_profile():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.profiler = start_request_profile()
+
+@app.after_request
+def record_request_latency(response):
+    started_at = g.get('request_started_at')
+    if started_at is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started_at,
+            method=request.method, route=route, status=response.status_code
+        )
+    return response
+
+@app.after_request
+def finish_profiler(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        profile_file = save_request_profile(profiler, route, g.request_id)
+        response.headers['X-Request-ID'] = g.request_id
+        if profile_file:
+            response.headers['X-Profile-File'] = profile_file
+    return response
+
+# Registered last so it runs first: compression time is included in metrics
+app.after_request(compress_response)
+
+@app.teardown_request
+def stop_profiler(exc):
+    # Requests that raised never reach after_request; don't leak the sampler
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
 
 # Routes
 
@@ -132,6 +258,7 @@ def guest_login():
 @app.route('/chat', methods=['POST'])
 @csrf.exempt
 @require_auth
+@admission_control('chat')
 def chat():
     data = request.get_json()
     if not data:
@@ -144,7 +271,7 @@ def chat():
     if not message:
         return jsonify({"error": "Message cannot be empty"}), 400
     
-    result, status_code = process_chat_message(message, session_id, image_emotion, model)
+    result, status_code = process_chat_message(message, session_id, image_emotion, get_model('gemini'))
     return jsonify(result), status_code
 
 @app.route('/chat/sessions', methods=['GET', 'POST'])
@@ -152,17 +279,22 @@ def chat():
 @require_auth
 def chat_sessions():
     if request.method == 'GET':
-        result, status_code = get_user_sessions()
-        return jsonify(result), status_code
+        return conditional_json(user_etag(session['user_id'], 'sessions'), get_user_sessions)
     
     # POST method for creating new session is handled in chat route
     return jsonify({"error": "Method not allowed"}), 405
 
+@app.route('/chat/search')
+@require_auth
+def search_chat():
+    result, status_code = search_conversations(session['user_id'], request.args)
+    return json_response(result, status_code)
+
 @app.route('/chat/sessions/<session_id>/messages')
 @require_auth
 def get_session_messages(session_id):
-    result, status_code = get_session_conversation(session_id)
-    return jsonify(result), status_code
+    etag = session_etag(session_id, session['user_id'])
+    return conditional_json(etag, lambda: get_session_conversation(session_id))
 
 @app.route('/chat/sessions/<session_id>', methods=['DELETE'])
 @csrf.exempt
@@ -175,18 +307,32 @@ def delete_session(session_id):
 @app.route('/emotions/analyze-image', methods=['POST'])
 @csrf.exempt
 @require_auth
+@admission_control('inference')
 def analyze_image_emotion():
     try:
         data = request.get_json()
         if not data or 'image' not in data:
             return jsonify({"error": "No image data provided"}), 400
         
-        result = detect_image_emotions(data['image'])
+        with track_inference():
+            result = detect_image_emotions(data['image'])
+        result['capture'] = next_capture_config(session['user_id'], result['dominant_emotion'])
         return jsonify(result)
     except Exception as e:
         print(f"Error in image emotion analysis: {e}")
         return jsonify({"error": "Failed to analyze image"}), 500
 
+@app.route('/emotions/capture-config')
+@require_auth
+def capture_config():
+    """Frame size, JPEG quality and poll interval the camera client should use"""
+    return jsonify(get_capture_config(session['user_id']))
+
+@sock.route('/emotions/stream')
+def emotion_stream(ws):
+    """Persistent WebSocket channel for real-time camera emotion detection"""
+    handle_emotion_stream(ws)
+
 # Profile routes
 @app.route('/profile')
 @require_auth
@@ -218,8 +364,27 @@ def update_user_preferences():
 @app.route('/profile/stats')
 @require_auth
 def profile_stats():
-    result, status_code = get_profile_statistics()
-    return jsonify(result), status_code
+    return conditional_json(user_etag(session['user_id'], 'stats'), get_profile_statistics)
+
+@app.route('/profile/export')
+@require_auth
+def export_history():
+    """Stream the user's profile, sessions, messages and meditations as NDJSON"""
+    return export_response(session['user_id'])
+
+@app.route('/profile/mood-series')
+@require_auth
+def mood_series():
+    """Daily or weekly mood buckets over ?start=&end=&bucket=, built from rollups"""
+    return conditional_json(user_etag(session['user_id'], 'mood-series'),
+                             lambda: get_mood_series(session['user_id'], request.args))
+
+@app.route('/api/bootstrap')
+@require_auth
+def bootstrap():
+    """Everything the dashboard needs for its first paint, in one request"""
+    result, status_code = get_bootstrap_data()
+    return json_response(result, status_code)
 
 # Wellness routes
 @app.route('/meditation/start', methods=['POST'])
@@ -253,15 +418,52 @@ def mindfulness_prompt():
 
 @app.route('/terms')
 def terms():
-    from datetime import datetime
-    current_date = datetime.now().strftime("%B %d, %Y")
-    return render_template('terms.html', current_date=current_date)
+    return cached_page('terms', lambda current_date: render_template('terms.html', current_date=current_date))
 
 @app.route('/privacy')
 def privacy():
-    from datetime import datetime
-    current_date = datetime.now().strftime("%B %d, %Y")
-    return render_template('privacy.html', current_date=current_date)
+    return cached_page('privacy', lambda current_date: render_template('privacy.html', current_date=current_date))
+
+@app.route('/assets/<path:filename>')
+def hashed_asset(filename):
+    """Fingerprinted build output from static/dist, cached forever"""
+    return send_asset(filename)
+
+# Health checks
+@app.route('/healthz')
+def healthz():
+    """Liveness: the worker is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/healthz/ready')
+def healthz_ready():
+    """Readiness: per-model loading state; 503 until no model is still loading"""
+    ready = models_ready()
+    return jsonify({
+        'ready': ready,
+        'boot_ms': boot_ms,
+        'models': model_states()
+    }), 200 if ready else 503
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint: bearer METRICS_TOKEN, or local scrapes only when it isn't set"""
+    token = os.environ.get('METRICS_TOKEN')
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return jsonify({'error': 'Unauthorized'}), 401
+    elif request.remote_addr not in LOCAL_ADDRESSES:
+        return jsonify({'error': 'Forbidden'}), 403
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+# Startup report: time from first import to a routable app (models excluded)
+boot_ms = round((time.perf_counter() - _boot_started) * 1000, 1)
+print(f"⏱️  App ready to serve in {boot_ms} ms")
 
 if __name__ == '__main__':
+    # Sweep from the reloader's serving process only
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_guest_sweeper()
     app.run(debug=True, port=5001)
@@ -0,0 +1,3 @@
+"""
+Offline benchmarks and load tests for Kinds Speak
+"""
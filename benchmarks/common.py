@@ -0,0 +1,81 @@
+"""
+Shared helpers for the offline benchmarks: timing, percentiles, baselines
+"""
+import json
+import os
+import platform
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(ROOT, 'benchmarks', 'baselines')
+
+def force_offline():
+    """Make sure nothing tries to reach the Hugging Face Hub"""
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+    os.environ.setdefault('MODEL_WARMUP', 'off')
+
+def summarize(latencies, elapsed=None):
+    """Throughput and latency percentiles (milliseconds) for a list of durations in seconds"""
+    samples = np.asarray(latencies, dtype=np.float64) * 1000
+    elapsed = elapsed if elapsed is not None else samples.sum() / 1000
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) if len(samples) else (0.0, 0.0, 0.0)
+    return {
+        'count': int(len(samples)),
+        'throughput_per_sec': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(float(samples.mean()), 3) if len(samples) else 0.0,
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+    }
+
+def measure(fn, iterations, warmup=2):
+    """Run fn repeatedly and summarize its latency"""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started_at)
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"💾 Results written to {path}")
+
+def compare_results(current, baseline, metric='p95_ms', max_regression=0.2):
+    """Print per-case deltas against a baseline; returns the cases that regressed"""
+    regressions = []
+    if current.get('config') != baseline.get('config'):
+        print("⚠️  Baseline was recorded with a different configuration; deltas may not be comparable")
+
+    for case, stats in current['cases'].items():
+        base = baseline.get('cases', {}).get(case)
+        if not base or not base.get(metric):
+            print(f"  {case:<40} {stats[metric]:>10.3f} ms  (new)")
+            continue
+        delta = (stats[metric] - base[metric]) / base[metric]
+        flag = '❌' if delta > max_regression else '✅'
+        print(f"  {case:<40} {stats[metric]:>10.3f} ms  {delta:+7.1%} {flag}")
+        if delta > max_regression:
+            regressions.append(case)
+    return regressions
+
+def print_table(cases):
+    print(f"  {'case':<40} {'ops/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for case, stats in cases.items():
+        print(f"  {case:<40} {stats['throughput_per_sec']:>10.1f} {stats['p50_ms']:>10.3f} "
+              f"{stats['p95_ms']:>10.3f} {stats['p99_ms']:>10.3f}")
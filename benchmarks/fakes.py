@@ -0,0 +1,196 @@
+"""
+Deterministic local stand-ins for Firestore, Gemini, the emotion models and
+an OAuth provider
+
+Everything here runs in-process with no network (the OAuth stub listens on
+loopback). Each fake takes an injected latency (seconds) so benchmarks and
+load tests can model a remote service. The Firestore fake is the app's own
+in-memory store (modules/memory_store.py), which also backs in-memory guests.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+
+import numpy as np
+
+from modules.memory_store import MemoryFirestore as FakeFirestore
+
+def _sleep(latency):
+    if latency:
+        time.sleep(latency)
+
+class FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGenerativeModel:
+    """Stand-in for genai.GenerativeModel with a fixed, injectable latency"""
+
+    REPLIES = [
+        "That sounds like a lot to carry. What feels heaviest right now?",
+        "Thank you for sharing that with me. Let's take one slow breath together.",
+        "It makes sense to feel that way. What would help you feel a little calmer?",
+        "I'm glad you told me. Would a short mindfulness exercise help right now?",
+    ]
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        _sleep(self.latency)
+        self.calls += 1
+        digest = hashlib.sha1(prompt.encode('utf-8')).digest()
+        return FakeGeminiResponse(self.REPLIES[digest[0] % len(self.REPLIES)])
+
+TEXT_EMOTION_LABELS = ['anger', 'anticipation', 'disgust', 'fear', 'joy', 'love',
+                       'optimism', 'pessimism', 'sadness', 'surprise', 'trust']
+IMAGE_EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise']
+
+def _scores(text, labels):
+    digest = hashlib.sha256(text.encode('utf-8')).digest()
+    return [{'label': label, 'score': digest[i] / 255} for i, label in enumerate(labels)]
+
+class StubTextClassifier:
+    """Deterministic stand-in for the text-classification pipeline"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def __call__(self, text, **kwargs):
+        _sleep(self.latency)
+        if isinstance(text, list):
+            # Batched call: one forward pass for every input
+            return [self._classify(t, kwargs) for t in text]
+        return self._classify(text, kwargs)
+
+    def _classify(self, text, kwargs):
+        scores = _scores(text, TEXT_EMOTION_LABELS)
+        if kwargs.get('top_k', 1) is None:
+            return scores
+        return [max(scores, key=lambda s: s['score'])]
+
+class StubImageClassifier:
+    """Deterministic stand-in for the image-classification pipeline"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def __call__(self, image, **kwargs):
+        _sleep(self.latency)
+        return _scores(f"{image.size}", IMAGE_EMOTION_LABELS)
+
+class StubTextEncoder:
+    """Deterministic stand-in for the feature-extraction pipeline
+
+    Hashes words into signed buckets, so texts that share words embed close together.
+    """
+
+    def __init__(self, latency=0.0, dim=384):
+        self.latency = latency
+        self.dim = dim
+
+    def __call__(self, texts, **kwargs):
+        _sleep(self.latency)
+        return [[[self._embed(text)]] for text in texts]
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r'\w+', text.lower()):
+            digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+            vector[int.from_bytes(digest[:4], 'little') % self.dim] += 1 if digest[4] & 1 else -1
+        return vector
+
+class _OAuthHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like real providers
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.provider.count('connections')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out and hung up
+
+    def do_POST(self):
+        provider = self.server.provider
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        calls = provider.count('token')
+        _sleep(provider.latency + provider.stall)
+        if provider.fail_token_every and calls % provider.fail_token_every == 0:
+            self._reply(503, {'error': 'unavailable'})
+            return
+        self._reply(200, {'access_token': f"token-{next(provider.ids)}", 'token_type': 'bearer'})
+
+    def do_GET(self):
+        provider = self.server.provider
+        calls = provider.count('userinfo')
+        _sleep(provider.latency + provider.stall)
+        if provider.fail_every and calls % provider.fail_every == 0:
+            self._reply(503, {'error': 'unavailable'})
+            return
+        user_id = self.headers.get('Authorization', '').rsplit('-', 1)[-1]
+        self._reply(200, {'id': user_id, 'login': f"user{user_id}", 'email': f"user{user_id}@example.com"})
+
+class StubOAuthProvider:
+    """Local OAuth token + user-info endpoints; counts calls and TCP connections
+
+    `fail_every=n` answers every n-th user-info call with 503 to exercise retries,
+    `fail_token_every=n` does the same for token calls, and `stall` adds seconds
+    to every call to exercise read timeouts.
+    """
+
+    def __init__(self, latency=0.0, fail_every=0, fail_token_every=0, stall=0.0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.fail_token_every = fail_token_every
+        self.stall = stall
+        self.ids = itertools.count(1)
+        self.counts = {'connections': 0, 'token': 0, 'userinfo': 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _OAuthHandler)
+        self._server.daemon_threads = True
+        self._server.provider = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+            return self.counts[name]
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def config(self):
+        """Provider entry in the shape of auth.OAUTH_PROVIDERS"""
+        return {
+            'client_id': 'stub-client', 'client_secret': 'stub-secret',
+            'authorize_url': f"{self.base_url}/authorize",
+            'token_url': f"{self.base_url}/token",
+            'userinfo_url': f"{self.base_url}/user",
+            'scopes': ['user'],
+        }
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
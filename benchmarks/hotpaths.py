@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the emotion, chat and database hot paths
+
+Covers detect_emotions across message-length buckets, detect_image_emotions at
+several frame resolutions and process_chat_message end to end. Gemini and
+Firestore are replaced by the deterministic fakes in benchmarks/fakes.py with
+configurable latency; emotion models load from the local Hugging Face cache
+(offline) or fall back to deterministic stubs.
+
+    python -m benchmarks.hotpaths --save-baseline
+    python -m benchmarks.hotpaths --compare benchmarks/baselines/hotpaths.json
+"""
+import argparse
+import base64
+import io
+import os
+import random
+import sys
+import tempfile
+
+from .common import (
+    BASELINE_DIR, force_offline, measure, environment, save_results,
+    compare_results, print_table
+)
+
+force_offline()
+
+import json
+import numpy as np
+from flask import Flask, session
+from PIL import Image
+
+from modules.database import db
+from modules.models import get_model, set_model
+from modules.emotions import detect_emotions, detect_image_emotions
+from modules.chat import process_chat_message, generate_ai_response
+from modules import memories, response_cache, search
+from .fakes import FakeFirestore, FakeGenerativeModel, StubTextClassifier, StubImageClassifier, StubTextEncoder
+
+MESSAGE_BUCKETS = {'short': 8, 'medium': 40, 'long': 200, 'very_long': 800}
+FRAME_RESOLUTIONS = [(160, 120), (320, 240), (640, 480), (1280, 720)]
+
+VOCABULARY = (
+    "i feel today really tired anxious happy calm work exam sleep friends family "
+    "worried excited lonely grateful stressed hopeful night morning week better "
+    "worse again always never think maybe need help talk breathe heavy light"
+).split()
+
+def make_message(words, seed=0):
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(words))
+
+def make_frame(width, height, seed=0):
+    """A deterministic JPEG data URL with some structure for the encoder"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = ((x / width) * 180 + (y / height) * 60).astype(np.uint8)
+    noise = rng.integers(0, 40, size=(height, width), dtype=np.uint8)
+    pixels = np.stack([base + noise, base, 255 - base], axis=-1).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=80)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+def install_models(args):
+    """Use real cached models where possible, deterministic stubs otherwise"""
+    modes = {}
+    stubs = {
+        'text_emotion': StubTextClassifier(args.model_latency_ms / 1000),
+        'image_emotion': StubImageClassifier(args.model_latency_ms / 1000),
+        'text_embedding': StubTextEncoder(args.model_latency_ms / 1000),
+    }
+    for name, stub in stubs.items():
+        if not args.stub_models and get_model(name) is not None:
+            modes[name] = 'real'
+        else:
+            set_model(name, stub)
+            modes[name] = 'stub'
+    modes['face_detection'] = 'real' if not args.stub_models and get_model('face_detection') else 'none'
+    if modes['face_detection'] == 'none':
+        set_model('face_detection', None)
+    return modes
+
+def use_scratch_indexes():
+    """Write search and memory indexes to a temporary directory, not the working tree"""
+    scratch = tempfile.mkdtemp(prefix='benchmark-indexes-')
+    search.SEARCH_INDEX_DIR = os.path.join(scratch, 'search_index')
+    memories.MEMORY_INDEX_DIR = os.path.join(scratch, 'memory_index')
+    return scratch
+
+def bench_detect_emotions(args, cases):
+    for bucket, words in MESSAGE_BUCKETS.items():
+        message = make_message(words, seed=words)
+        cases[f'detect_emotions/{bucket}'] = measure(lambda: detect_emotions(message), args.iterations)
+
+def bench_detect_image_emotions(args, cases):
+    for width, height in FRAME_RESOLUTIONS:
+        frame = make_frame(width, height)
+        cases[f'detect_image_emotions/{width}x{height}'] = measure(
+            lambda: detect_image_emotions(frame), args.iterations
+        )
+
+def bench_process_chat_message(args, cases):
+    app = Flask(__name__)
+    app.secret_key = 'benchmark'
+    model = FakeGenerativeModel(args.gemini_latency_ms / 1000)
+    message = make_message(MESSAGE_BUCKETS['medium'], seed=1)
+
+    db.collection('users').document('bench-user').set({'username': 'bench-user'})
+    with app.test_request_context('/chat', method='POST'):
+        session['user_id'] = 'bench-user'
+
+        cases['process_chat_message/new_session'] = measure(
+            lambda: process_chat_message(message, None, None, model), args.iterations
+        )
+
+        result, _ = process_chat_message(message, None, None, model)
+        session_id = result['session_id']
+        cases['process_chat_message/existing_session'] = measure(
+            lambda: process_chat_message(message, session_id, None, model), args.iterations
+        )
+
+    # A recurring short message with the response cache on, once its variants are collected
+    short_message = "I can't sleep again"
+    context = " The user's text shows sadness."
+    response_cache.RESPONSE_CACHE_ENABLED = True
+    try:
+        cases['generate_ai_response/uncached'] = measure(
+            lambda: generate_ai_response(short_message + str(random.random()), context, model), args.iterations
+        )
+        for _ in range(response_cache.RESPONSE_CACHE_VARIANTS):
+            generate_ai_response(short_message, context, model)
+        cases['generate_ai_response/cached'] = measure(
+            lambda: generate_ai_response(short_message, context, model), args.iterations
+        )
+    finally:
+        response_cache.RESPONSE_CACHE_ENABLED = False
+        response_cache.response_cache.clear()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--db-latency-ms', type=float, default=0.0, help='latency injected into every fake Firestore call')
+    parser.add_argument('--gemini-latency-ms', type=float, default=0.0, help='latency injected into every fake Gemini call')
+    parser.add_argument('--model-latency-ms', type=float, default=0.0, help='latency of the stub emotion models')
+    parser.add_argument('--stub-models', action='store_true', help='never load real emotion models')
+    parser.add_argument('--only', choices=['emotions', 'images', 'chat'], help='run a single group')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--save-baseline', action='store_true', help='write results to benchmarks/baselines/hotpaths.json')
+    parser.add_argument('--compare', help='baseline JSON to compare p95 against')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='allowed p95 slowdown before failing (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    db.use_client(FakeFirestore(latency=args.db_latency_ms / 1000))
+    models = install_models(args)
+    use_scratch_indexes()
+
+    cases = {}
+    groups = {
+        'emotions': bench_detect_emotions,
+        'images': bench_detect_image_emotions,
+        'chat': bench_process_chat_message,
+    }
+    for name, run in groups.items():
+        if args.only in (None, name):
+            run(args, cases)
+
+    results = {
+        'benchmark': 'hotpaths',
+        'environment': environment(),
+        'config': {
+            'iterations': args.iterations,
+            'db_latency_ms': args.db_latency_ms,
+            'gemini_latency_ms': args.gemini_latency_ms,
+            'model_latency_ms': args.model_latency_ms,
+            'models': models,
+        },
+        'cases': cases,
+    }
+
+    print_table(cases)
+    if args.output:
+        save_results(results, args.output)
+    if args.save_baseline:
+        save_results(results, os.path.join(BASELINE_DIR, 'hotpaths.json'))
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, max_regression=args.max_regression):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
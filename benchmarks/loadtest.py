@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Concurrent-user load test against the real Flask app
+
+Serves app.py from a bounded thread pool (like one gunicorn gthread worker)
+backed by the in-memory Firestore and a fake GenerativeModel, then replays
+realistic sessions from a growing number of simulated users:
+
+    login or guest -> chat burst -> camera polling every 3s -> meditation start/complete
+
+Each concurrency stage reports per-endpoint throughput, latency percentiles and
+error rate, and the first stage that breaks the SLO is reported as saturation.
+
+    python -m benchmarks.loadtest --stages 1,5,10,25,50 --stage-seconds 30
+"""
+import argparse
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import force_offline, summarize, environment, save_results
+
+force_offline()
+
+import requests
+from werkzeug.serving import BaseWSGIServer
+
+from modules.database import db
+from modules.models import set_model
+from .fakes import FakeFirestore, FakeGenerativeModel
+from .hotpaths import install_models, use_scratch_indexes, make_message, make_frame
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server that handles requests on a fixed-size thread pool"""
+
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app)
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+class StatsCollector:
+    """Thread-safe latency and error samples keyed by endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._errors = {}
+        self._shed = {}
+
+    def record(self, endpoint, seconds, ok, shed=False):
+        with self._lock:
+            self._latencies.setdefault(endpoint, []).append(seconds)
+            if shed:
+                self._shed[endpoint] = self._shed.get(endpoint, 0) + 1
+            elif not ok:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+
+    def report(self, elapsed):
+        with self._lock:
+            report = {}
+            for endpoint, latencies in sorted(self._latencies.items()):
+                stats = summarize(latencies, elapsed)
+                stats['errors'] = self._errors.get(endpoint, 0)
+                stats['error_rate'] = round(stats['errors'] / len(latencies), 4)
+                stats['shed'] = self._shed.get(endpoint, 0)
+                report[endpoint] = stats
+            return report
+
+class SimulatedUser:
+    """One browser tab replaying a companion-app session"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, base_url, stats, stop, args, seed):
+        self.base_url = base_url
+        self.stats = stats
+        self.stop = stop
+        self.args = args
+        self.rng = random.Random(seed)
+        self.http = requests.Session()
+        self.frame = make_frame(args.frame_width, args.frame_height, seed=seed)
+
+    def call(self, method, path, endpoint, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=60, allow_redirects=False, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        # 429s are deliberate load shedding, reported apart from errors
+        shed = response is not None and response.status_code == 429
+        self.stats.record(endpoint, time.perf_counter() - started_at, ok, shed)
+        return response
+
+    def pause(self, seconds):
+        self.stop.wait(seconds * self.args.time_scale)
+
+    def login(self):
+        if self.rng.random() < self.args.guest_ratio:
+            self.call('POST', '/auth/guest', 'POST /auth/guest')
+            return
+
+        username = f"load_{next(self._ids)}_{self.rng.randrange(1 << 30)}"
+        credentials = {'username': username, 'password': 'load-test-password'}
+        self.call('POST', '/register', 'POST /register', json={**credentials, 'email': f'{username}@load.test'})
+        self.call('POST', '/login', 'POST /login', json=credentials)
+
+    def chat_burst(self):
+        session_id = None
+        for _ in range(self.rng.randint(1, self.args.max_burst)):
+            if self.stop.is_set():
+                return
+            message = make_message(self.rng.choice([6, 20, 60]), seed=self.rng.randrange(1 << 30))
+            response = self.call('POST', '/chat', 'POST /chat', json={'message': message, 'session_id': session_id})
+            if response is not None and response.ok:
+                session_id = response.json().get('session_id')
+            self.pause(self.rng.uniform(1, 4))
+        self.call('GET', '/chat/sessions', 'GET /chat/sessions')
+
+    def camera(self):
+        for _ in range(self.args.camera_polls):
+            if self.stop.is_set():
+                return
+            self.call('POST', '/emotions/analyze-image', 'POST /emotions/analyze-image', json={'image': self.frame})
+            self.pause(3)
+
+    def meditation(self):
+        response = self.call('POST', '/meditation/start', 'POST /meditation/start', json={'duration': 5})
+        if response is not None and response.ok:
+            self.pause(2)
+            session_id = response.json()['session_id']
+            self.call('POST', f'/meditation/complete/{session_id}', 'POST /meditation/complete/<id>')
+
+    def run(self):
+        self.login()
+        while not self.stop.is_set():
+            self.chat_burst()
+            self.camera()
+            if self.rng.random() < 0.3:
+                self.meditation()
+
+def run_stage(base_url, concurrency, args, stage_index):
+    stats = StatsCollector()
+    stop = threading.Event()
+    users = [SimulatedUser(base_url, stats, stop, args, seed=stage_index * 100000 + i) for i in range(concurrency)]
+    threads = [threading.Thread(target=user.run, daemon=True) for user in users]
+
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+        # Stagger arrivals so users don't move in lockstep
+        time.sleep(min(0.05, args.stage_seconds / max(concurrency, 1) / 10))
+    stop.wait(args.stage_seconds)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=60)
+    return stats.report(time.perf_counter() - started_at)
+
+def print_stage(concurrency, report):
+    print(f"\n👥 {concurrency} concurrent users")
+    print(f"  {'endpoint':<36} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8} {'shed':>6}")
+    for endpoint, stats in report.items():
+        print(f"  {endpoint:<36} {stats['throughput_per_sec']:>8.1f} {stats['p50_ms']:>9.1f} "
+              f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['error_rate']:>8.1%} {stats['shed']:>6}")
+
+def breaches_slo(report, args):
+    for endpoint, stats in report.items():
+        if stats['error_rate'] > args.max_error_rate:
+            return f"{endpoint} error rate {stats['error_rate']:.1%}"
+        if endpoint in ('POST /chat', 'POST /emotions/analyze-image') and stats['p95_ms'] > args.slo_p95_ms:
+            return f"{endpoint} p95 {stats['p95_ms']:.0f} ms"
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', default='1,5,10,25,50', help='comma-separated concurrency levels')
+    parser.add_argument('--stage-seconds', type=float, default=30)
+    parser.add_argument('--threads', type=int, default=8, help='request threads in the app worker')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='multiplier for think time and camera interval')
+    parser.add_argument('--guest-ratio', type=float, default=0.5)
+    parser.add_argument('--max-burst', type=int, default=4)
+    parser.add_argument('--camera-polls', type=int, default=5)
+    parser.add_argument('--frame-width', type=int, default=320)
+    parser.add_argument('--frame-height', type=int, default=240)
+    parser.add_argument('--db-latency-ms', type=float, default=10.0)
+    parser.add_argument('--gemini-latency-ms', type=float, default=600.0)
+    parser.add_argument('--model-latency-ms', type=float, default=20.0, help='latency of the stub emotion models')
+    parser.add_argument('--stub-models', action='store_true', help='never load real emotion models')
+    parser.add_argument('--slo-p95-ms', type=float, default=2000.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--port', type=int, default=5077)
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args()
+
+    import app as companion_app
+
+    db.use_client(FakeFirestore(latency=args.db_latency_ms / 1000))
+    set_model('gemini', FakeGenerativeModel(latency=args.gemini_latency_ms / 1000))
+    models = install_models(args)
+    use_scratch_indexes()
+
+    server = PooledWSGIServer('127.0.0.1', args.port, companion_app.app, args.threads)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    stages = {}
+    saturation = None
+    for index, concurrency in enumerate(int(c) for c in args.stages.split(',')):
+        report = run_stage(base_url, concurrency, args, index)
+        stages[str(concurrency)] = report
+        print_stage(concurrency, report)
+        breach = breaches_slo(report, args)
+        if breach and saturation is None:
+            saturation = {'concurrency': concurrency, 'reason': breach}
+            print(f"  🔥 SLO breached: {breach}")
+
+    server.shutdown()
+    if saturation:
+        print(f"\n🔥 Saturation at {saturation['concurrency']} users ({saturation['reason']})")
+    else:
+        print("\n✅ No stage breached the SLO")
+
+    if args.output:
+        save_results({
+            'benchmark': 'loadtest',
+            'environment': environment(),
+            'config': {k: v for k, v in vars(args).items() if k != 'output'},
+            'models': models,
+            'stages': stages,
+            'saturation': saturation,
+        }, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+detect_emotions latency versus message length, whole-message vs windowed
+
+"before" hands the whole message to the pipeline (truncated at the model's
+maximum length); "after" splits it into overlapping token windows scored in one
+batched pass, capped at EMOTION_MAX_TOKENS. The comparison is only meaningful
+with the real model from the local Hugging Face cache; with stubs it measures
+the windowing overhead alone.
+
+    python -m benchmarks.long_text
+    python -m benchmarks.long_text --aggregation mean --output long_text.json
+"""
+import argparse
+
+from .common import force_offline, measure, environment, save_results, print_table
+
+force_offline()
+
+from modules import emotions
+from modules.database import db
+from modules.models import get_model
+from .fakes import FakeFirestore
+from .hotpaths import make_message, install_models
+
+MESSAGE_WORDS = [25, 100, 250, 500, 1000, 2500, 5000]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--model-latency-ms', type=float, default=0.0, help='latency of the stub text model')
+    parser.add_argument('--stub-models', action='store_true', help='never load the real text model')
+    parser.add_argument('--aggregation', choices=['max', 'mean'], default=emotions.EMOTION_AGGREGATION)
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args()
+
+    db.use_client(FakeFirestore())
+    models = install_models(args)
+    classifier = get_model('text_emotion')
+    emotions.EMOTION_AGGREGATION = args.aggregation
+
+    cases = {}
+    windows = {}
+    for words in MESSAGE_WORDS:
+        message = make_message(words, seed=words)
+        windows[words] = len(emotions.split_windows(classifier, message))
+        for mode, enabled in (('before', False), ('after', True)):
+            emotions.EMOTION_LONG_TEXT = enabled
+            cases[f'{words}_words/{mode}'] = measure(lambda: emotions.detect_emotions(message), args.iterations)
+
+    print(f"🧠 text model: {models['text_emotion']}, window {emotions.EMOTION_WINDOW_TOKENS} tokens, "
+          f"overlap {emotions.EMOTION_WINDOW_OVERLAP}, budget {emotions.EMOTION_MAX_TOKENS}, {args.aggregation}")
+    print_table(cases)
+    for words, count in windows.items():
+        print(f"  {words:>5} words -> {count} window(s)")
+
+    if args.output:
+        save_results({
+            'benchmark': 'long_text',
+            'environment': environment(),
+            'models': models,
+            'config': {
+                'iterations': args.iterations,
+                'window_tokens': emotions.EMOTION_WINDOW_TOKENS,
+                'overlap_tokens': emotions.EMOTION_WINDOW_OVERLAP,
+                'max_tokens': emotions.EMOTION_MAX_TOKENS,
+                'aggregation': args.aggregation,
+            },
+            'windows': windows,
+            'cases': cases,
+        }, args.output)
+
+if __name__ == '__main__':
+    main()
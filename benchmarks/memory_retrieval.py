@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Long-term memory retrieval latency and index size versus history length
+
+For each history size, writes a user's memory index (random unit vectors at the
+encoder's dimension) and measures:
+
+  search  top-k over the memory-mapped vectors for a precomputed query vector
+  recall  recall_memories end to end: embed the message, search, format the prompt
+  load    a worker's first search after a fresh start (journal replay + mmap)
+
+It also reports the bytes on disk per user. The stub encoder (the default) only
+makes `recall` cheaper than with the real model; search, load and size do not
+depend on the encoder.
+
+    python -m benchmarks.memory_retrieval
+    python -m benchmarks.memory_retrieval --turns 1000,10000,50000 --real-encoder
+"""
+import argparse
+import shutil
+import tempfile
+
+import numpy as np
+
+from .common import force_offline, measure, environment, save_results, print_table
+
+force_offline()
+
+from modules import memories
+from modules.models import get_model, set_model
+from .fakes import StubTextEncoder
+from .hotpaths import make_message
+
+def write_history(user_id, turns, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((turns, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    records = [
+        {'op': 'add', 'id': f'doc{i:08d}', 'session_id': f'session{i // 20}', 'timestamp': '2026-01-01T00:00:00',
+         'message': make_message(30, seed=i), 'response': make_message(40, seed=-i)}
+        for i in range(turns)
+    ]
+    memories.get_memory(user_id).replace(vectors, records)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', default='100,1000,10000,50000', help='comma-separated history sizes')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--real-encoder', action='store_true', help='use the cached sentence encoder for recall')
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args()
+
+    encoder = get_model('text_embedding') if args.real_encoder else None
+    if encoder is None:
+        encoder = StubTextEncoder()
+        set_model('text_embedding', encoder)
+    encoder_mode = 'stub' if isinstance(encoder, StubTextEncoder) else 'real'
+    dim = memories.embed_texts(encoder, ['probe']).shape[1]
+
+    scratch = tempfile.mkdtemp(prefix='memory-bench-')
+    memories.MEMORY_INDEX_DIR = scratch
+    message = make_message(30, seed=12345)
+    query = memories.embed_texts(encoder, [message])[0]
+
+    cases = {}
+    sizes = {}
+    try:
+        for turns in (int(t) for t in args.turns.split(',')):
+            user_id = f'bench-{turns}'
+            write_history(user_id, turns, dim, seed=turns)
+            sizes[turns] = memories.get_memory(user_id).size_bytes()
+
+            def cold_search():
+                memories.UserMemory(user_id).search(query)
+
+            cases[f'{turns}_turns/load'] = measure(cold_search, max(3, args.iterations // 10))
+            memory = memories.get_memory(user_id)
+            cases[f'{turns}_turns/search'] = measure(lambda: memory.search(query), args.iterations)
+            cases[f'{turns}_turns/recall'] = measure(lambda: memories.recall_memories(user_id, message), args.iterations)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"🧠 encoder: {encoder_mode} ({dim} dims), top {memories.MEMORY_TOP_K}, "
+          f"budget {memories.MEMORY_TOKEN_BUDGET} tokens")
+    print_table(cases)
+    for turns, size in sizes.items():
+        print(f"  {turns:>6} turns -> {size / 1024:,.0f} KiB on disk ({size / turns:,.0f} bytes/turn)")
+
+    if args.output:
+        save_results({
+            'benchmark': 'memory_retrieval',
+            'environment': environment(),
+            'config': {
+                'iterations': args.iterations,
+                'encoder': encoder_mode,
+                'dim': int(dim),
+                'top_k': memories.MEMORY_TOP_K,
+                'token_budget': memories.MEMORY_TOKEN_BUDGET,
+            },
+            'cases': cases,
+            'bytes_on_disk': sizes,
+        }, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+OAuth code exchange against a local stub provider: fresh requests vs pooled client
+
+Runs the token + user-info round trip the way exchange_oauth_code used to
+(module-level requests.post/get, a new connection per call) and through the
+pooled modules.oauth_client, from several threads at once. Reports latency and
+how many TCP connections each approach opened. Over real TLS the pooled client
+also skips a handshake per call; the stub is plain HTTP, so its savings here
+are TCP setup only.
+
+The pooled client's retry and timeout rules are checked against the same stub
+by tests/test_oauth_client.py.
+
+    python -m benchmarks.oauth_exchange --logins 200 --threads 8
+    python -m benchmarks.oauth_exchange --fail-every 5    # exercise retries
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .common import measure, environment, save_results, print_table
+from .fakes import StubOAuthProvider
+
+from modules import auth
+
+PROVIDER = 'github'
+
+def fresh_exchange(config, code):
+    """The original per-login calls: no session, no timeout"""
+    token_response = requests.post(config['token_url'], data={'code': code}, headers={'Accept': 'application/json'})
+    access_token = token_response.json().get('access_token')
+    user_response = requests.get(config['userinfo_url'], headers={'Authorization': f'Bearer {access_token}'})
+    return access_token, user_response.json() if user_response.status_code == 200 else None
+
+def pooled_exchange(config, code):
+    return auth.exchange_oauth_code(PROVIDER, code, 'http://localhost/callback')
+
+def run(exchange, config, logins, threads):
+    """Run `logins` exchanges on a thread pool; returns how many got user info"""
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda i: exchange(config, f"code-{i}"), range(logins)))
+    return sum(1 for _, user in results if user)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=200, help='exchanges per measured run')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--provider-latency-ms', type=float, default=5.0)
+    parser.add_argument('--fail-every', type=int, default=0, help='answer every n-th user-info call with 503')
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args()
+
+    cases = {}
+    connections = {}
+    succeeded = {}
+    for name, exchange in (('fresh', fresh_exchange), ('pooled', pooled_exchange)):
+        provider = StubOAuthProvider(args.provider_latency_ms / 1000, args.fail_every).start()
+        config = provider.config()
+        auth.OAUTH_PROVIDERS[PROVIDER] = config
+        try:
+            cases[name] = measure(lambda: succeeded.__setitem__(name, run(exchange, config, args.logins, args.threads)),
+                                  args.iterations)
+            connections[name] = provider.counts['connections']
+        finally:
+            provider.stop()
+
+    print(f"🔑 {args.logins} logins x {args.iterations} runs on {args.threads} threads, "
+          f"provider latency {args.provider_latency_ms} ms")
+    print_table(cases)
+    for name in cases:
+        print(f"  {name:<8} {connections[name]:>6} connections, {succeeded[name]}/{args.logins} logins got user info")
+
+    if args.output:
+        save_results({
+            'benchmark': 'oauth_exchange',
+            'environment': environment(),
+            'config': vars(args),
+            'cases': cases,
+            'connections': connections,
+            'succeeded': succeeded,
+        }, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Serialization and compression benchmark for list endpoints
+
+Builds a 1,000-message session shaped like get_session_messages output
+(Firestore timestamps, nested emotion arrays) and compares flask.jsonify with
+modules.responses.json_response, plus the bytes saved by gzip and brotli.
+
+    python -m benchmarks.serialization --messages 1000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from .common import measure, environment, save_results, print_table
+
+from flask import Flask, jsonify
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+
+from modules import responses
+from .fakes import TEXT_EMOTION_LABELS
+from .hotpaths import make_message
+
+def make_session_messages(count, seed=0):
+    rng = random.Random(seed)
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    messages = []
+    for i in range(count):
+        timestamp = started + timedelta(minutes=i)
+        emotions = [
+            {'emotion': label, 'confidence': round(rng.random(), 3)}
+            for label in rng.sample(TEXT_EMOTION_LABELS, rng.randint(1, 4))
+        ]
+        messages.append({
+            'user_id': 'bench-user',
+            'session_id': 'bench-session',
+            'message': make_message(rng.randint(5, 60), seed=i),
+            'response': make_message(rng.randint(20, 80), seed=i + count),
+            'emotions': emotions,
+            'dominant_emotion': emotions[0]['emotion'],
+            'image_emotion': {'emotion': 'happy', 'confidence': 0.82, 'timestamp': 1704067200000 + i} if i % 3 == 0 else None,
+            'timestamp': DatetimeWithNanoseconds(*timestamp.timetuple()[:6], tzinfo=timezone.utc),
+        })
+    return messages
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    messages = make_session_messages(args.messages)
+    cases = {}
+    sizes = {}
+
+    with app.app_context():
+        cases['jsonify'] = measure(lambda: jsonify(messages).get_data(), args.iterations)
+        cases['json_response'] = measure(lambda: responses.json_response(messages).get_data(), args.iterations)
+        raw = responses.json_response(messages).get_data()
+        sizes['jsonify_bytes'] = len(jsonify(messages).get_data())
+
+    sizes['json_bytes'] = len(raw)
+    encodings = ['gzip'] + (['br'] if responses.brotli is not None else [])
+    for encoding in encodings:
+        cases[f'compress/{encoding}'] = measure(lambda: responses.compress_bytes(raw, encoding), args.iterations)
+        compressed = len(responses.compress_bytes(raw, encoding))
+        sizes[f'{encoding}_bytes'] = compressed
+        sizes[f'{encoding}_saved_pct'] = round(100 * (1 - compressed / len(raw)), 1)
+
+    print(f"📦 {args.messages} messages, encoder: {'orjson' if responses.orjson else 'json'}")
+    print_table(cases)
+    for key, value in sizes.items():
+        print(f"  {key:<24} {value}")
+
+    if args.output:
+        save_results({
+            'benchmark': 'serialization',
+            'environment': environment(),
+            'config': {'messages': args.messages, 'iterations': args.iterations,
+                       'encoder': 'orjson' if responses.orjson else 'json'},
+            'cases': cases,
+            'sizes': sizes,
+        }, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Compare the Flask development server with the production launcher
+
+Starts `run.py` and `run.py --prod` in turn, drives each with keep-alive
+HTTP clients for a fixed duration and reports requests/sec plus memory for
+every server process (RSS, and PSS which accounts for copy-on-write sharing).
+
+    python benchmarks/serve_compare.py --path /healthz --clients 16 --seconds 15
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _children(pid):
+    """All descendant pids of a process (Linux /proc)"""
+    found = []
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            direct = [int(p) for p in f.read().split()]
+    except OSError:
+        return found
+    for child in direct:
+        found.append(child)
+        found.extend(_children(child))
+    return found
+
+def _memory_kb(pid):
+    """RSS and PSS of a process in kilobytes"""
+    memory = {'rss_kb': None, 'pss_kb': None}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Rss:'):
+                    memory['rss_kb'] = int(line.split()[1])
+                elif line.startswith('Pss:'):
+                    memory['pss_kb'] = int(line.split()[1])
+    except OSError:
+        pass
+    return memory
+
+def _wait_until_up(port, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/healthz')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+def _drive(port, path, clients, seconds):
+    """Hammer one path from keep-alive clients; returns requests/sec and errors"""
+    counts = [0] * clients
+    errors = [0] * clients
+    stop_at = time.time() + seconds
+
+    def client(index):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        while time.time() < stop_at:
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status < 500:
+                    counts[index] += 1
+                else:
+                    errors[index] += 1
+            except (OSError, http.client.HTTPException):
+                errors[index] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'requests_per_sec': round(sum(counts) / seconds, 1),
+        'errors': sum(errors)
+    }
+
+def measure(mode, args):
+    command = [sys.executable, os.path.join(ROOT, 'run.py'), '--port', str(args.port)]
+    if mode == 'prod':
+        command += ['--prod', '--workers', str(args.workers)]
+
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    try:
+        if not _wait_until_up(args.port, args.startup_timeout):
+            return {'mode': mode, 'error': 'server did not become ready'}
+
+        throughput = _drive(args.port, args.path, args.clients, args.seconds)
+        processes = {pid: _memory_kb(pid) for pid in [process.pid] + _children(process.pid)}
+        return {
+            'mode': mode,
+            'path': args.path,
+            'clients': args.clients,
+            **throughput,
+            'processes': processes,
+            'total_pss_kb': sum(m['pss_kb'] or 0 for m in processes.values())
+        }
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default='/healthz')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=int, default=15)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--startup-timeout', type=int, default=300)
+    args = parser.parse_args()
+
+    results = [measure('dev', args), measure('prod', args)]
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Gunicorn configuration for production (started by `python run.py --prod`)
+
+The app is imported once in the master with the emotion models loaded, then
+workers are forked so the model weights are shared copy-on-write.
+
+Graceful reload:
+    kill -HUP <master pid>    restart workers (re-runs post_fork, keeps preloaded code)
+    kill -USR2 <master pid>   start a new master with new code, then
+    kill -WINCH <old pid>     drain old workers and
+    kill -TERM <old pid>      retire the old master
+"""
+import gc
+import os
+import multiprocessing
+
+bind = os.environ.get('BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('WEB_CONCURRENCY', max(2, multiprocessing.cpu_count() // 2)))
+worker_class = 'gthread'
+# Every open /emotions/stream WebSocket holds a thread until it closes, so each
+# worker gets one thread per allowed stream (STREAM_MAX_CONNECTIONS, enforced in
+# modules/streaming.py) on top of WORKER_THREADS for ordinary requests
+threads = int(os.environ.get('WORKER_THREADS', 4)) + int(os.environ.get('STREAM_MAX_CONNECTIONS', 16))
+
+# Load the app (and its models) in the master before forking
+preload_app = True
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers occasionally to cap slow memory growth
+max_requests = int(os.environ.get('MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+# Tell app.py to load model weights synchronously while preloading
+os.environ.setdefault('MODEL_WARMUP', 'preload')
+
+def _torch_threads_per_worker():
+    configured = os.environ.get('TORCH_THREADS_PER_WORKER')
+    if configured:
+        return int(configured)
+    return max(1, multiprocessing.cpu_count() // workers)
+
+def pre_fork(server, worker):
+    # Move preloaded objects out of the GC's reach so collections in the
+    # workers don't write to (and un-share) the pages holding them
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Each worker gets its slice of the CPU instead of every worker spawning
+    # one intra-op thread per core
+    try:
+        import torch
+        torch.set_num_threads(_torch_threads_per_worker())
+    except ImportError:
+        pass
+
+    # Models that are unsafe to create before fork load in the worker
+    from modules.models import warm_up_models
+    warm_up_models()
+
+    from modules.guests import start_guest_sweeper
+    start_guest_sweeper()
+
+def worker_exit(server, worker):
+    # Finish deferred work, then don't leave the worker's password hashing
+    # processes or provider sockets behind
+    from modules.tasks import shutdown_tasks
+    from modules.passwords import shutdown_pool
+    from modules.oauth_client import close_sessions
+    shutdown_tasks()
+    shutdown_pool()
+    close_sessions()
@@ -0,0 +1,199 @@
+"""
+Admission control and load shedding for expensive endpoints
+
+Every endpoint class (image inference, chat/LLM) has per-user token buckets
+and a global concurrency limit. A request is rejected early with 429 and a
+Retry-After header when the user is over their rate, or when the expected
+wait for a free slot already exceeds the class's latency target. That way
+requests never pile up behind the model.
+"""
+from flask import session, jsonify
+from functools import wraps
+import math
+import os
+import threading
+import time
+from .metrics import Counter, Gauge, Histogram
+
+ADMISSION_DECISIONS = Counter(
+    'kinds_speak_admission_total', 'Admission decisions by endpoint class and outcome',
+    ('endpoint_class', 'outcome')
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    'kinds_speak_admission_in_flight', 'Admitted requests currently executing', ('endpoint_class',)
+)
+ADMISSION_WAITING = Gauge(
+    'kinds_speak_admission_waiting', 'Requests waiting for a concurrency slot', ('endpoint_class',)
+)
+ADMISSION_QUEUE_SECONDS = Histogram(
+    'kinds_speak_admission_queue_seconds', 'Time admitted requests waited for a slot', ('endpoint_class',)
+)
+
+def _setting(endpoint_class, name, default):
+    return float(os.environ.get(f'ADMISSION_{endpoint_class.upper()}_{name}', default))
+
+# Per-class defaults; each can be overridden with ADMISSION_<CLASS>_<SETTING>
+ENDPOINT_CLASSES = {
+    # Camera frames through the ViT face model
+    'inference': {
+        'rate': _setting('inference', 'RATE', 2.0),
+        'burst': _setting('inference', 'BURST', 6),
+        'max_concurrent': _setting('inference', 'MAX_CONCURRENT', os.cpu_count() or 2),
+        'latency_target': _setting('inference', 'LATENCY_TARGET', 2.0),
+    },
+    # Chat turns: text emotion model plus a paid Gemini call
+    'chat': {
+        'rate': _setting('chat', 'RATE', 0.5),
+        'burst': _setting('chat', 'BURST', 5),
+        'max_concurrent': _setting('chat', 'MAX_CONCURRENT', 16),
+        'latency_target': _setting('chat', 'LATENCY_TARGET', 8.0),
+    },
+}
+
+# Idle per-user buckets are dropped after this long (they'd be full anyway)
+BUCKET_IDLE_SECONDS = 600
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def take(self):
+        """Take one token; returns 0 on success or seconds until one is available"""
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float(BUCKET_IDLE_SECONDS)
+
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+class Rejected(Exception):
+    """Raised when a request is shed; carries the reason and a retry hint"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class AdmissionController:
+    """Rate limits and concurrency limit for one endpoint class"""
+
+    def __init__(self, name, rate, burst, max_concurrent, latency_target):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.latency_target = latency_target
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(self.max_concurrent)
+        self._buckets = {}
+        self._in_flight = 0
+        self._waiting = 0
+        self._service_time = None  # EWMA of execution time in seconds
+        self._last_sweep = time.monotonic()
+
+    def _bucket(self, user_id):
+        now = time.monotonic()
+        if now - self._last_sweep > BUCKET_IDLE_SECONDS:
+            self._buckets = {k: b for k, b in self._buckets.items() if now - b.updated_at < BUCKET_IDLE_SECONDS}
+            self._last_sweep = now
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _expected_wait(self):
+        """Queueing delay a new request would see, from the service-time EWMA"""
+        if self._in_flight < self.max_concurrent or not self._service_time:
+            return 0.0
+        return (self._waiting + 1) * self._service_time / self.max_concurrent
+
+    def acquire(self, user_id):
+        """Admit a request or raise Rejected; returns the admission time"""
+        with self._lock:
+            bucket = self._bucket(user_id)
+            retry_after = bucket.take()
+            if retry_after:
+                ADMISSION_DECISIONS.inc(endpoint_class=self.name, outcome='rate_limited')
+                raise Rejected('rate_limited', retry_after)
+
+            expected_wait = self._expected_wait()
+            if expected_wait > self.latency_target:
+                bucket.refund()
+                ADMISSION_DECISIONS.inc(endpoint_class=self.name, outcome='overloaded')
+                raise Rejected('overloaded', expected_wait)
+
+            self._waiting += 1
+            ADMISSION_WAITING.inc(endpoint_class=self.name)
+
+        started_at = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.latency_target)
+        waited = time.monotonic() - started_at
+
+        with self._lock:
+            self._waiting -= 1
+            ADMISSION_WAITING.dec(endpoint_class=self.name)
+            if not acquired:
+                bucket.refund()
+                ADMISSION_DECISIONS.inc(endpoint_class=self.name, outcome='queue_timeout')
+                raise Rejected('queue_timeout', self._service_time or self.latency_target)
+            self._in_flight += 1
+
+        ADMISSION_DECISIONS.inc(endpoint_class=self.name, outcome='admitted')
+        ADMISSION_IN_FLIGHT.inc(endpoint_class=self.name)
+        ADMISSION_QUEUE_SECONDS.observe(waited, endpoint_class=self.name)
+        return time.monotonic()
+
+    def release(self, admitted_at):
+        """Free the slot and fold the execution time into the EWMA"""
+        elapsed = time.monotonic() - admitted_at
+        with self._lock:
+            self._in_flight -= 1
+            self._service_time = elapsed if self._service_time is None else 0.8 * self._service_time + 0.2 * elapsed
+        ADMISSION_IN_FLIGHT.dec(endpoint_class=self.name)
+        self._slots.release()
+
+_controllers = {name: AdmissionController(name, **config) for name, config in ENDPOINT_CLASSES.items()}
+
+def get_controller(endpoint_class):
+    return _controllers[endpoint_class]
+
+def rejection_response(rejected):
+    """429 response for a shed request"""
+    response = jsonify({
+        'error': 'Too many requests' if rejected.reason == 'rate_limited' else 'Server busy, please retry',
+        'reason': rejected.reason,
+        'retry_after': rejected.retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(rejected.retry_after)
+    return response
+
+def admission_control(endpoint_class):
+    """Decorator that admits or sheds requests for an endpoint class"""
+    controller = get_controller(endpoint_class)
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            try:
+                admitted_at = controller.acquire(session.get('user_id'))
+            except Rejected as rejected:
+                return rejection_response(rejected)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                controller.release(admitted_at)
+        return wrapper
+    return decorator
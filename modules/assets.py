@@ -0,0 +1,127 @@
+"""
+Fingerprinted, minified and precompressed static assets
+
+`build_assets` minifies the app's JS/CSS, writes each file under
+static/dist/ with a content hash in its name, alongside .gz and .br
+variants, and records the mapping in static/dist/manifest.json. Templates
+call `asset_url('js/dashboard.js')`, which resolves to the hashed file when a
+build exists and to the plain static file otherwise (always, in debug mode, so
+edits show up without a rebuild). Hashed files never change, so they are served
+with immutable far-future caching.
+
+    python -m modules.assets        # or: flask --app app build-assets
+"""
+from flask import current_app, send_from_directory, url_for, abort
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from .responses import accepts_encoding, choose_encoding
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSET_SOURCES = ['js/dashboard.js', 'js/auth.js', 'css/modern.css']
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+_manifest_cache = {'mtime': None, 'entries': {}}
+
+def minify(path, source):
+    """Minify JS/CSS when the minifier is installed; otherwise pass through"""
+    if path.endswith('.js') and rjsmin is not None:
+        return rjsmin.jsmin(source)
+    if path.endswith('.css') and rcssmin is not None:
+        return rcssmin.cssmin(source)
+    return source
+
+def build_assets(static_folder):
+    """Build hashed, minified and precompressed copies of ASSET_SOURCES"""
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+
+    for path in ASSET_SOURCES:
+        with open(os.path.join(static_folder, path), encoding='utf-8') as f:
+            content = minify(path, f.read()).encode('utf-8')
+
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        stem, ext = os.path.splitext(path)
+        hashed_path = f"{stem}.{digest}{ext}"
+        target = os.path.join(dist_folder, hashed_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        with open(target, 'wb') as f:
+            f.write(content)
+        with open(target + '.gz', 'wb') as f:
+            f.write(gzip.compress(content, compresslevel=9))
+        if brotli is not None:
+            with open(target + '.br', 'wb') as f:
+                f.write(brotli.compress(content, quality=11))
+
+        manifest[path] = hashed_path
+        print(f"📦 {path} -> {DIST_DIR}/{hashed_path} ({len(content)} bytes)")
+
+    with open(os.path.join(dist_folder, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def _load_manifest():
+    """Manifest entries, reloaded only when the file changes"""
+    path = os.path.join(current_app.static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+
+    if _manifest_cache['mtime'] != mtime:
+        with open(path) as f:
+            _manifest_cache['entries'] = json.load(f)
+        _manifest_cache['mtime'] = mtime
+    return _manifest_cache['entries']
+
+def asset_url(path):
+    """URL for a static asset, fingerprinted when a build is available (sources in debug mode)"""
+    hashed_path = None if current_app.debug else _load_manifest().get(path)
+    if hashed_path:
+        return url_for('hashed_asset', filename=hashed_path)
+    return url_for('static', filename=path)
+
+def send_asset(filename):
+    """Serve a hashed asset, preferring a precompressed variant"""
+    dist_folder = os.path.join(current_app.static_folder, DIST_DIR)
+    if filename == MANIFEST_NAME or filename.endswith(('.gz', '.br')):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = choose_encoding()
+    if encoding == 'br' and not os.path.exists(os.path.join(dist_folder, filename + '.br')):
+        encoding = 'gzip' if accepts_encoding('gzip') else None
+    if encoding and not os.path.exists(os.path.join(dist_folder, filename + PRECOMPRESSED_SUFFIXES[encoding])):
+        encoding = None
+    served = filename + PRECOMPRESSED_SUFFIXES[encoding] if encoding else filename
+
+    response = send_from_directory(dist_folder, served, mimetype=mimetype, max_age=31536000)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    response.vary.add('Accept-Encoding')
+    return response
+
+if __name__ == '__main__':
+    build_assets(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static'))
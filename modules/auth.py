@@ -2,12 +2,15 @@
 Authentication module for user registration, login, and session management
 """
 from flask import session, redirect, url_for, jsonify, render_template, request, flash
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timezone
 import secrets
-import requests
 import os
-from .database import get_user_by_username, get_user_by_email, create_user, db
+from .database import get_user_by_username, get_user_by_email, create_user, update_user_profile, db
+from .oauth_client import oauth_request
+from .guests import guest_expiry, guest_storage, GUEST_STORAGE
+from .passwords import hash_password, verify_password, needs_rehash, HasherBusy
+
+HASHER_BUSY_ERROR = {'error': 'Too many sign-in attempts right now. Please try again shortly.'}
 
 def register_user(username, email, password):
     """Register a new user"""
@@ -19,8 +22,11 @@ def register_user(username, email, password):
     if get_user_by_email(email):
         return {'error': 'Email already exists'}, 400
     
-    # Create password hash
-    password_hash = generate_password_hash(password)
+    # Create password hash (on the hashing pool, off the request thread)
+    try:
+        password_hash = hash_password(password)
+    except HasherBusy:
+        return HASHER_BUSY_ERROR, 503
     
     # Prepare user data
     user_data = {
@@ -54,10 +60,23 @@ def login_user(username, password):
         return {'error': 'Invalid username or password'}, 401
     
     user_data = user_doc.to_dict()
-    
-    if not check_password_hash(user_data['password_hash'], password):
+    password_hash = user_data.get('password_hash')
+    if not password_hash:
         return {'error': 'Invalid username or password'}, 401
     
+    try:
+        if not verify_password(password_hash, password):
+            return {'error': 'Invalid username or password'}, 401
+    except HasherBusy:
+        return HASHER_BUSY_ERROR, 503
+    
+    # Upgrade hashes made with outdated KDF parameters while we have the password
+    if needs_rehash(password_hash):
+        try:
+            update_user_profile(user_doc.id, {'password_hash': hash_password(password)})
+        except Exception as e:
+            print(f"Error rehashing password: {e}")
+    
     # Set session
     session['user_id'] = user_doc.id
     session['username'] = user_data['username']
@@ -66,6 +85,11 @@ def login_user(username, password):
 
 def logout_user():
     """Clear user session"""
+    if session.get('is_guest') and session.get('user_id'):
+        # A guest can't sign back in, so their data goes now rather than at expiry
+        from .guests import delete_guest
+        from .tasks import defer, LOW
+        defer(delete_guest, session['user_id'], priority=LOW, retries=3)
     session.clear()
     return redirect(url_for('login'))
 
@@ -244,10 +268,9 @@ def exchange_oauth_code(provider, code, redirect_uri):
         'grant_type': 'authorization_code'
     }
     
-    headers = {'Accept': 'application/json'}
-    token_response = requests.post(config['token_url'], data=token_data, headers=headers)
+    token_response = oauth_request(provider, 'token', 'POST', config['token_url'], data=token_data)
     
-    if token_response.status_code != 200:
+    if token_response is None or token_response.status_code != 200:
         return None, None
     
     token_info = token_response.json()
@@ -258,9 +281,9 @@ def exchange_oauth_code(provider, code, redirect_uri):
     
     # Get user info
     user_headers = {'Authorization': f'Bearer {access_token}'}
-    user_response = requests.get(config['userinfo_url'], headers=user_headers)
+    user_response = oauth_request(provider, 'userinfo', 'GET', config['userinfo_url'], headers=user_headers)
     
-    if user_response.status_code != 200:
+    if user_response is None or user_response.status_code != 200:
         return None, None
     
     return access_token, user_response.json()
@@ -269,6 +292,7 @@ def create_guest_user():
     """Create a temporary guest user"""
     try:
         guest_id = f"guest_{secrets.token_hex(8)}"
+        expires_at = guest_expiry()
         user_data = {
             'username': guest_id,
             'email': f"{guest_id}@guest.local",
@@ -276,6 +300,7 @@ def create_guest_user():
             'is_guest': True,
             'created_at': datetime.utcnow(),
             'auth_provider': 'guest',
+            'expires_at': expires_at,
             'preferences': {
                 'camera_emotion_detection': True,
                 'voice_input': True,
@@ -286,13 +311,16 @@ def create_guest_user():
             }
         }
         
-        user_id = create_user(user_data)
+        with guest_storage():
+            user_id = create_user(user_data)
         
         # Set session
         session['user_id'] = user_id
         session['username'] = guest_id
         session['auth_provider'] = 'guest'
         session['is_guest'] = True
+        session['guest_expires_at'] = expires_at.replace(tzinfo=timezone.utc).timestamp()
+        session['guest_storage'] = GUEST_STORAGE
         
         return {'message': 'Guest session created', 'user_id': user_id}, 200
     except Exception as e:
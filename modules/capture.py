@@ -0,0 +1,106 @@
+"""
+Capture settings and adaptive cadence for camera emotion analysis
+
+The server tells the client how big a frame to send, how hard to compress it
+and how long to wait before the next one. Intervals stretch while a user's
+expression is stable or the node is busy and shrink again when it changes.
+"""
+from collections import deque
+from contextlib import contextmanager
+import threading
+import time
+import os
+
+# The ViT face model works on 224x224 crops, so frames only need to be a
+# little larger than that once the face has been cropped out
+CAPTURE_WIDTH = int(os.environ.get('CAPTURE_WIDTH', 320))
+CAPTURE_HEIGHT = int(os.environ.get('CAPTURE_HEIGHT', 240))
+CAPTURE_JPEG_QUALITY = float(os.environ.get('CAPTURE_JPEG_QUALITY', 0.6))
+
+# Poll interval bounds in milliseconds
+MIN_INTERVAL_MS = 1000
+BASE_INTERVAL_MS = 3000
+MAX_INTERVAL_MS = 12000
+
+# Consecutive identical results before the interval starts growing
+STABLE_RESULTS = 3
+STABLE_GROWTH = 1.5
+
+# Concurrent image inferences per CPU before the node counts as loaded
+LOAD_PER_CPU = 1.0
+
+# Cadence state for users idle longer than this is forgotten
+STATE_TTL_SECONDS = 10 * 60
+
+_lock = threading.Lock()
+_cadence = {}
+_inflight = 0
+
+@contextmanager
+def track_inference():
+    """Count an image inference as in flight for load-aware cadence"""
+    global _inflight
+    with _lock:
+        _inflight += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _inflight -= 1
+
+def _load_factor():
+    """Ratio of in-flight inferences to what the node handles comfortably"""
+    capacity = max(1.0, (os.cpu_count() or 1) * LOAD_PER_CPU)
+    return _inflight / capacity
+
+def _apply_load(interval_ms):
+    """Stretch an interval proportionally when the node is overloaded"""
+    load = _load_factor()
+    if load > 1.0:
+        interval_ms = interval_ms * load
+    return int(min(MAX_INTERVAL_MS, max(MIN_INTERVAL_MS, interval_ms)))
+
+def _build_config(interval_ms):
+    return {
+        'width': CAPTURE_WIDTH,
+        'height': CAPTURE_HEIGHT,
+        'jpeg_quality': CAPTURE_JPEG_QUALITY,
+        'interval_ms': interval_ms
+    }
+
+def _purge_idle(now):
+    """Drop cadence state for users who stopped streaming"""
+    for user_id in [uid for uid, state in _cadence.items() if now - state['updated_at'] > STATE_TTL_SECONDS]:
+        del _cadence[user_id]
+
+def get_capture_config(user_id):
+    """Get the current capture settings for a user"""
+    with _lock:
+        state = _cadence.get(user_id)
+        interval_ms = state['interval_ms'] if state else BASE_INTERVAL_MS
+        return _build_config(_apply_load(interval_ms))
+
+def next_capture_config(user_id, dominant_emotion):
+    """Update a user's cadence with the latest result and get the next settings"""
+    now = time.monotonic()
+    with _lock:
+        state = _cadence.get(user_id)
+        if state is None:
+            if len(_cadence) > 1000:
+                _purge_idle(now)
+            state = {'interval_ms': BASE_INTERVAL_MS, 'recent': deque(maxlen=STABLE_RESULTS), 'updated_at': now}
+            _cadence[user_id] = state
+
+        recent = state['recent']
+        if recent and recent[-1] != dominant_emotion:
+            # Expression changed: look again soon
+            state['interval_ms'] = max(MIN_INTERVAL_MS, min(BASE_INTERVAL_MS, state['interval_ms'] / 2))
+            recent.clear()
+        recent.append(dominant_emotion)
+
+        if len(recent) == STABLE_RESULTS:
+            # Expression has been steady for a while: back off
+            state['interval_ms'] = min(MAX_INTERVAL_MS, state['interval_ms'] * STABLE_GROWTH)
+
+        state['updated_at'] = now
+        return _build_config(_apply_load(state['interval_ms']))
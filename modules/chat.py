@@ -3,18 +3,27 @@ Chat and conversation management module
 """
 from flask import session, jsonify, request
 from datetime import datetime
-import google.generativeai as genai
 from .database import (
     create_chat_session, update_chat_session, get_chat_session,
     save_conversation, get_user_chat_sessions, get_session_messages
 )
 from .emotions import detect_emotions
+from .emotion_vectors import EMOTION_CODEC, encode_scores, decode_conversation
+from .profile import refresh_profile_statistics
+from .rollups import record_chat_turn, remove_chat_turn
+from .memories import recall_memories, remember_turn, forget_session
+from .response_cache import response_cache, cacheable
+from .search import index_conversation, remove_session
+from .versions import new_stamp, remember_version, forget_version, bump_user_version
+from .metrics import CHAT_STAGE_SECONDS, INFERENCE_SECONDS
+from .tasks import defer, HIGH, LOW
 from google.cloud.firestore import Increment
 
 # Initialize Gemini AI
 def initialize_gemini(api_key):
     """Initialize Gemini AI model"""
     if api_key:
+        import google.generativeai as genai
         genai.configure(api_key=api_key)
         model = genai.GenerativeModel('gemini-1.5-flash')
         print("✅ Gemini AI initialized successfully")
@@ -23,34 +32,111 @@ def initialize_gemini(api_key):
         print("⚠️  GEMINI_API_KEY not found. Using fallback responses.")
         return None
 
-def generate_ai_response(message, emotion_context="", model=None):
-    """Generate AI response using Gemini or fallback"""
-    try:
-        if model:
-            # Include emotion context in the prompt for more empathetic responses
-            prompt = f"""You are a calm, supportive AI companion focused on mindfulness and well-being.{emotion_context}
+def _build_prompt(message, emotion_context="", memory_context=""):
+    # Include emotion context and recalled past turns in the prompt for more empathetic responses
+    return f"""You are a calm, supportive AI companion focused on mindfulness and well-being.{emotion_context}{memory_context}
             Respond to the user's message in a helpful, empathetic way. Keep responses concise and encouraging.
             
             User message: {message}"""
-            
-            gemini_response = model.generate_content(prompt)
-            return gemini_response.text
-        else:
-            # Fallback to keyword-based responses
-            message_lower = message.lower()
-            if 'hello' in message_lower:
-                return "Hello! How can I help you today?"
-            elif 'how are you' in message_lower:
-                return "I'm doing well, thank you for asking! How about you?"
-            elif 'meditation' in message_lower:
-                return "Meditation is a great practice for mindfulness. Would you like to start a session?"
-            elif 'help' in message_lower:
-                return "I'm here to help! You can chat with me, track meditation sessions, or manage your profile."
-            else:
-                return "That's interesting! Tell me more about it."
+
+def _fallback_response(message):
+    """Keyword-based responses for when Gemini is unavailable"""
+    message_lower = message.lower()
+    if 'hello' in message_lower:
+        return "Hello! How can I help you today?"
+    elif 'how are you' in message_lower:
+        return "I'm doing well, thank you for asking! How about you?"
+    elif 'meditation' in message_lower:
+        return "Meditation is a great practice for mindfulness. Would you like to start a session?"
+    elif 'help' in message_lower:
+        return "I'm here to help! You can chat with me, track meditation sessions, or manage your profile."
+    else:
+        return "That's interesting! Tell me more about it."
+
+ERROR_RESPONSE = "I'm here to help! Could you tell me more about what you'd like to discuss?"
+
+def generate_ai_response(message, emotion_context="", model=None, memory_context="", message_vector=None):
+    """Generate AI response using Gemini or fallback"""
+    try:
+        if not model:
+            return _fallback_response(message)
+        
+        use_cache = cacheable(message, memory_context)
+        if use_cache:
+            cached = response_cache.lookup(message, emotion_context, message_vector)
+            if cached is not None:
+                return cached
+        
+        with INFERENCE_SECONDS.time(model='gemini'):
+            gemini_response = model.generate_content(_build_prompt(message, emotion_context, memory_context))
+        if use_cache:
+            response_cache.store(message, emotion_context, gemini_response.text, message_vector)
+        return gemini_response.text
     except Exception as e:
         print(f"Error generating AI response: {e}")
-        return "I'm here to help! Could you tell me more about what you'd like to discuss?"
+        return ERROR_RESPONSE
+
+def _new_session_data(user_id, message):
+    # Generate title from first few words of message
+    title_words = message.split()[:4]
+    title = ' '.join(title_words) + ('...' if len(message.split()) > 4 else '')
+    
+    return {
+        'user_id': user_id,
+        'title': title,
+        'created_at': datetime.utcnow(),
+        'last_updated': datetime.utcnow(),
+        'message_count': 0,
+        'version': new_stamp()
+    }
+
+def _emotion_context(emotion_data, image_emotion):
+    """Combine text and image emotions for context"""
+    combined_emotion_context = ""
+    if emotion_data['dominant_emotion'] != 'neutral':
+        combined_emotion_context += f" The user's text shows {emotion_data['dominant_emotion']}."
+    
+    if image_emotion and image_emotion.get('emotion') != 'neutral':
+        # Check if image emotion is recent (within last 10 seconds)
+        if (datetime.utcnow().timestamp() * 1000 - image_emotion.get('timestamp', 0)) < 10000:
+            combined_emotion_context += f" Their facial expression shows {image_emotion['emotion']}."
+    return combined_emotion_context
+
+def _recall(user_id, message):
+    """Relevant turns from earlier conversations, and the message's embedding"""
+    with CHAT_STAGE_SECONDS.time(stage='recall_memories'):
+        try:
+            return recall_memories(user_id, message)
+        except Exception as e:
+            print(f"Error recalling memories: {e}")
+            return "", None
+
+def _conversation_record(user_id, session_id, message, response, emotion_data, image_emotion):
+    return {
+        'user_id': user_id,
+        'session_id': session_id,
+        'message': message,
+        'response': response,
+        'emotion_vector': encode_scores(emotion_data['scores']),
+        'emotion_codec': EMOTION_CODEC,
+        'dominant_emotion': emotion_data['dominant_emotion'],
+        'image_emotion': image_emotion if image_emotion else None,
+        'timestamp': datetime.utcnow()
+    }
+
+def _defer_turn_work(user_id, session_id, conversation_id, conversation_data, emotion_data, message_vector):
+    """Everything else about the turn happens after the response is sent"""
+    defer(_record_turn, user_id, session_id, emotion_data, conversation_data['timestamp'], priority=HIGH)
+    defer(index_conversation, user_id, conversation_id, conversation_data, retries=2)
+    defer(remember_turn, user_id, conversation_id, conversation_data, message_vector, priority=LOW)
+
+def _turn_result(response, emotion_data, session_id):
+    return {
+        'response': response,
+        'emotions': emotion_data['emotions'],
+        'dominant_emotion': emotion_data['dominant_emotion'],
+        'session_id': session_id
+    }
 
 def process_chat_message(message, session_id=None, image_emotion=None, model=None):
     """Process a chat message and return response"""
@@ -61,65 +147,68 @@ def process_chat_message(message, session_id=None, image_emotion=None, model=Non
     
     # Create new session if none provided
     if not session_id:
-        # Generate title from first few words of message
-        title_words = message.split()[:4]
-        title = ' '.join(title_words) + ('...' if len(message.split()) > 4 else '')
-        
-        session_data = {
-            'user_id': user_id,
-            'title': title,
-            'created_at': datetime.utcnow(),
-            'last_updated': datetime.utcnow(),
-            'message_count': 0
-        }
-        session_id = create_chat_session(session_data)
+        session_data = _new_session_data(user_id, message)
+        with CHAT_STAGE_SECONDS.time(stage='session_lookup'):
+            session_id = create_chat_session(session_data)
+        remember_version('session', session_id, session_data['version'], user_id)
     else:
         # Validate existing session
-        session_doc = get_chat_session(session_id)
+        with CHAT_STAGE_SECONDS.time(stage='session_lookup'):
+            session_doc = get_chat_session(session_id)
         if not session_doc.exists or session_doc.to_dict().get('user_id') != user_id:
             return {'error': 'Session not found'}, 404
     
     # Detect emotions in user message
-    emotion_data = detect_emotions(message)
+    with CHAT_STAGE_SECONDS.time(stage='detect_emotions'):
+        emotion_data = detect_emotions(message)
+    combined_emotion_context = _emotion_context(emotion_data, image_emotion)
     
-    # Combine text and image emotions for context
-    combined_emotion_context = ""
-    if emotion_data['dominant_emotion'] != 'neutral':
-        combined_emotion_context += f" The user's text shows {emotion_data['dominant_emotion']}."
-    
-    if image_emotion and image_emotion.get('emotion') != 'neutral':
-        # Check if image emotion is recent (within last 10 seconds)
-        if (datetime.utcnow().timestamp() * 1000 - image_emotion.get('timestamp', 0)) < 10000:
-            combined_emotion_context += f" Their facial expression shows {image_emotion['emotion']}."
+    memory_context, message_vector = _recall(user_id, message)
     
     # Generate AI response
-    response = generate_ai_response(message, combined_emotion_context, model)
+    with CHAT_STAGE_SECONDS.time(stage='generate_response'):
+        response = generate_ai_response(message, combined_emotion_context, model, memory_context, message_vector)
     
     # Save conversation to database
-    conversation_data = {
-        'user_id': user_id,
-        'session_id': session_id,
-        'message': message,
-        'response': response,
-        'emotions': emotion_data['emotions'],
-        'dominant_emotion': emotion_data['dominant_emotion'],
-        'image_emotion': image_emotion if image_emotion else None,
-        'timestamp': datetime.utcnow()
-    }
-    save_conversation(conversation_data)
+    conversation_data = _conversation_record(user_id, session_id, message, response, emotion_data, image_emotion)
+    with CHAT_STAGE_SECONDS.time(stage='save_conversation'):
+        _, conversation_ref = save_conversation(conversation_data)
     
-    # Update session metadata
+    _defer_turn_work(user_id, session_id, conversation_ref.id, conversation_data, emotion_data, message_vector)
+    return _turn_result(response, emotion_data, session_id), 200
+
+def _record_turn(user_id, session_id, emotion_data, timestamp):
+    """Count the turn on its session and in the daily mood rollup, then move the version stamps
+
+    The user's stamp (the sessions and stats ETag) moves only once everything
+    it covers is written, so no client gets the new ETag with old data.
+    """
+    version = new_stamp()
     update_chat_session(session_id, {
         'last_updated': datetime.utcnow(),
-        'message_count': Increment(1)
+        'message_count': Increment(1),
+        'version': version
     })
-    
-    return {
-        'response': response,
-        'emotions': emotion_data['emotions'],
-        'dominant_emotion': emotion_data['dominant_emotion'],
-        'session_id': session_id
-    }, 200
+    remember_version('session', session_id, version, user_id)
+    record_chat_turn(user_id, emotion_data['emotions'], emotion_data['dominant_emotion'], timestamp)
+    bump_user_version(user_id)
+    refresh_profile_statistics(user_id)
+
+def _delete_session_messages(user_id, session_id):
+    """Delete a removed session's messages and drop them from search, memory and stats"""
+    from .database import db
+    messages_ref = db.collection('conversations').where('session_id', '==', session_id)
+    for msg in messages_ref.stream():
+        # The message and its share of the mood rollup go together
+        batch = db.batch()
+        batch.delete(msg.reference)
+        remove_chat_turn(user_id, decode_conversation(msg.to_dict()), batch)
+        batch.commit()
+    remove_session(user_id, session_id)
+    forget_session(user_id, session_id)
+    # Stats count messages: move the stamp again now that they are gone
+    bump_user_version(user_id)
+    refresh_profile_statistics(user_id)
 
 def get_user_sessions():
     """Get all chat sessions for current user"""
@@ -128,9 +217,6 @@ def get_user_sessions():
     
     try:
         sessions = get_user_chat_sessions(session['user_id'])
-        # Add session ID to each session
-        for i, sess in enumerate(sessions):
-            sessions[i]['id'] = sess.get('id', f'session_{i}')
         return sessions, 200
     except Exception as e:
         print(f"Error getting chat sessions: {e}")
@@ -167,11 +253,12 @@ def delete_chat_session(session_id):
         # Delete session document
         from .database import db
         db.collection('chat_sessions').document(session_id).delete()
+        forget_version('session', session_id)
+        
+        bump_user_version(session['user_id'])
         
-        # Delete all messages in the session
-        messages_ref = db.collection('conversations').where('session_id', '==', session_id)
-        for msg in messages_ref.stream():
-            msg.reference.delete()
+        # Delete all messages in the session in the background (safe to retry)
+        defer(_delete_session_messages, session['user_id'], session_id, retries=3)
         
         return {'message': 'Session deleted successfully'}, 200
     except Exception as e:
@@ -4,7 +4,13 @@ Database utilities and Firebase configuration for Kinds Speak application
 import firebase_admin
 from firebase_admin import credentials, firestore
 from google.cloud.firestore import Increment
+import contextvars
+import threading
 import os
+from .metrics import timed, DB_OPERATION_SECONDS
+from .emotion_vectors import (
+    EMOTION_CODEC, decode_conversation, encode_emotion_list, stack_vectors
+)
 
 # Initialize Firebase Admin SDK
 def initialize_firebase():
@@ -14,77 +20,183 @@ def initialize_firebase():
         firebase_admin.initialize_app(cred)
     return firestore.client()
 
-# Initialize database connection
-db = initialize_firebase()
+class LazyFirestoreClient:
+    """Firestore client proxy that connects on first use instead of at import
 
+    route_to() sends the current context's queries (one request, or work
+    handed to a thread with contextvars.copy_context) to another client, such
+    as the in-memory store behind in-memory guest accounts.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+        self._routed = contextvars.ContextVar('firestore_client', default=None)
+
+    def get_client(self):
+        routed = self._routed.get()
+        if routed is not None:
+            return routed
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def use_client(self, client):
+        """Swap in another client, e.g. the in-memory fake used by benchmarks"""
+        self._client = client
+
+    def routed_client(self):
+        """The client the current context is routed to, or None"""
+        return self._routed.get()
+
+    def route_to(self, client):
+        """Use `client` for the current context only; returns a token for reset_route"""
+        return self._routed.set(client)
+
+    def reset_route(self, token):
+        self._routed.reset(token)
+
+    def __getattr__(self, name):
+        return getattr(self.get_client(), name)
+
+# Database connection, opened by the first query
+db = LazyFirestoreClient(initialize_firebase)
+
+@timed(DB_OPERATION_SECONDS, operation='get_user_by_username')
 def get_user_by_username(username):
     """Get user document by username"""
     users_ref = db.collection('users').where('username', '==', username).limit(1)
     users = list(users_ref.stream())
     return users[0] if users else None
 
+@timed(DB_OPERATION_SECONDS, operation='get_user_by_email')
 def get_user_by_email(email):
     """Get user document by email"""
     users_ref = db.collection('users').where('email', '==', email).limit(1)
     users = list(users_ref.stream())
     return users[0] if users else None
 
+@timed(DB_OPERATION_SECONDS, operation='create_user')
 def create_user(user_data):
     """Create a new user in Firestore"""
     doc_ref = db.collection('users').add(user_data)
     return doc_ref[1].id
 
+@timed(DB_OPERATION_SECONDS, operation='get_user_conversations')
 def get_user_conversations(user_id, limit=20):
     """Get user conversations without ordering to avoid index requirements"""
     conversations_ref = db.collection('conversations').where('user_id', '==', user_id).limit(limit)
-    conversations_data = [conv.to_dict() for conv in conversations_ref.stream()]
+    conversations_data = [decode_conversation(conv.to_dict()) for conv in conversations_ref.stream()]
     
     # Sort conversations by timestamp in Python (descending order)
     from datetime import datetime
     return sorted(conversations_data, key=lambda x: x.get('timestamp', datetime.min), reverse=True)
 
+@timed(DB_OPERATION_SECONDS, operation='save_conversation')
 def save_conversation(conversation_data):
     """Save conversation to Firestore"""
     return db.collection('conversations').add(conversation_data)
 
+@timed(DB_OPERATION_SECONDS, operation='create_chat_session')
 def create_chat_session(session_data):
     """Create a new chat session"""
     doc_ref = db.collection('chat_sessions').add(session_data)
     return doc_ref[1].id
 
+@timed(DB_OPERATION_SECONDS, operation='update_chat_session')
 def update_chat_session(session_id, update_data):
     """Update chat session metadata"""
     session_ref = db.collection('chat_sessions').document(session_id)
     session_ref.update(update_data)
 
+@timed(DB_OPERATION_SECONDS, operation='get_chat_session')
 def get_chat_session(session_id):
     """Get chat session by ID"""
     session_ref = db.collection('chat_sessions').document(session_id)
     return session_ref.get()
 
-def get_user_chat_sessions(user_id):
-    """Get all chat sessions for a user"""
+@timed(DB_OPERATION_SECONDS, operation='get_user_chat_sessions')
+def get_user_chat_sessions(user_id, limit=None):
+    """Get chat sessions for a user, most recently updated first"""
     sessions_ref = db.collection('chat_sessions').where('user_id', '==', user_id).order_by('last_updated', direction=firestore.Query.DESCENDING)
-    return [session.to_dict() for session in sessions_ref.stream()]
+    if limit:
+        sessions_ref = sessions_ref.limit(limit)
+    return [{**session.to_dict(), 'id': session.id} for session in sessions_ref.stream()]
 
+@timed(DB_OPERATION_SECONDS, operation='get_session_messages')
 def get_session_messages(session_id):
     """Get all messages for a chat session"""
     messages_ref = db.collection('conversations').where('session_id', '==', session_id).order_by('timestamp')
-    return [msg.to_dict() for msg in messages_ref.stream()]
+    return [decode_conversation(msg.to_dict()) for msg in messages_ref.stream()]
 
+@timed(DB_OPERATION_SECONDS, operation='get_emotion_matrix')
+def get_emotion_matrix(user_id, start=None, end=None):
+    """Timestamps and an (n_messages, n_labels) score matrix for a user's messages
+
+    Only the packed vectors and timestamps are fetched; messages still in the
+    legacy list format are skipped (see migrate_emotion_vectors).
+    """
+    query = db.collection('conversations').where('user_id', '==', user_id)
+    if start is not None:
+        query = query.where('timestamp', '>=', start)
+    if end is not None:
+        query = query.where('timestamp', '<', end)
+    query = query.order_by('timestamp').select(['timestamp', 'emotion_vector'])
+
+    timestamps, blobs = [], []
+    for doc in query.stream():
+        data = doc.to_dict()
+        if data.get('emotion_vector') is not None:
+            timestamps.append(data.get('timestamp'))
+            blobs.append(data['emotion_vector'])
+    return timestamps, stack_vectors(blobs)
+
+def migrate_emotion_vectors(batch_size=400, start_after=None):
+    """Rewrite conversations stored with an `emotions` list into packed vectors
+
+    Pages through the collection by document id and commits each page as one
+    batch, so no query stays open for the whole collection. Each page reports
+    the last id it covered; pass it as `start_after` to resume a failed run.
+    """
+    conversations = db.collection('conversations')
+    query = conversations.order_by('__name__').limit(batch_size)
+    cursor = conversations.document(start_after).get() if start_after else None
+    migrated = 0
+    while True:
+        page = list((query.start_after(cursor) if cursor is not None else query).stream())
+        if not page:
+            break
+        batch = db.batch()
+        pending = 0
+        for doc in page:
+            data = doc.to_dict()
+            if 'emotion_vector' in data or 'emotions' not in data:
+                continue
+            batch.update(doc.reference, {
+                'emotion_vector': encode_emotion_list(data.get('emotions') or []),
+                'emotion_codec': EMOTION_CODEC,
+                'emotions': firestore.DELETE_FIELD
+            })
+            pending += 1
+        if pending:
+            batch.commit()
+            migrated += pending
+        cursor = page[-1]
+        print(f"🗜️  {migrated} conversations packed so far (resume with --start-after {cursor.id})")
+        if len(page) < batch_size:
+            break
+    print(f"🗜️  Packed emotion vectors for {migrated} conversations")
+    return migrated
+
+@timed(DB_OPERATION_SECONDS, operation='get_user')
+def get_user(user_id):
+    """Get user document by ID"""
+    return db.collection('users').document(user_id).get()
+
+@timed(DB_OPERATION_SECONDS, operation='update_user_profile')
 def update_user_profile(user_id, update_data):
     """Update user profile data"""
     db.collection('users').document(user_id).update(update_data)
-
-def get_user_stats(user_id):
-    """Get user statistics for profile"""
-    # Get conversation count
-    conversations_ref = db.collection('conversations').where('user_id', '==', user_id)
-    total_chats = len(list(conversations_ref.stream()))
-    
-    return {
-        'total_chats': total_chats,
-        'meditation_count': 0,  # Placeholder
-        'day_streak': 7,        # Placeholder
-        'wellness_score': 85    # Placeholder
-    }
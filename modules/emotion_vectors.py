@@ -0,0 +1,68 @@
+"""
+Compact fixed-order emotion score vectors
+
+Conversations store the text model's score for every label as one uint8 per
+label, in EMOTION_LABELS order, in an `emotion_vector` bytes field (11 bytes
+per message) tagged with `emotion_codec`. The quantization step is 1/255.
+`decode_conversation` turns a stored document back into the API's
+`emotions` list of {"emotion", "confidence"} dicts, and `stack_vectors` loads
+many messages into a NumPy matrix with a single buffer read.
+
+EMOTION_LABELS is append-only: codec 1 decoders must keep reading old vectors.
+"""
+import numpy as np
+
+EMOTION_CODEC = 1
+
+# Label order of cardiffnlp/twitter-roberta-base-emotion-multilabel-latest
+EMOTION_LABELS = ('anger', 'anticipation', 'disgust', 'fear', 'joy', 'love',
+                  'optimism', 'pessimism', 'sadness', 'surprise', 'trust')
+LABEL_INDEX = {label: i for i, label in enumerate(EMOTION_LABELS)}
+
+# Same cut-off detect_emotions has always applied to the API's emotion list
+MIN_CONFIDENCE = 0.1
+
+def encode_scores(scores):
+    """Pack a {label: score} mapping into a uint8 vector in EMOTION_LABELS order"""
+    vector = np.zeros(len(EMOTION_LABELS), dtype=np.float32)
+    for label, score in scores.items():
+        index = LABEL_INDEX.get(label)
+        if index is not None:
+            vector[index] = score
+    return np.rint(np.clip(vector, 0.0, 1.0) * 255).astype(np.uint8).tobytes()
+
+def encode_emotion_list(emotions):
+    """Pack a legacy list of {"emotion", "confidence"} dicts"""
+    return encode_scores({e.get('emotion'): e.get('confidence', 0) for e in emotions})
+
+def decode_vector(blob):
+    """Unpack a stored vector into float32 scores in EMOTION_LABELS order"""
+    return np.frombuffer(bytes(blob), dtype=np.uint8).astype(np.float32) / 255
+
+def vector_to_emotions(scores, threshold=MIN_CONFIDENCE):
+    """API shape: labels above the threshold, highest confidence first"""
+    order = np.argsort(-scores, kind='stable')
+    return [
+        {'emotion': EMOTION_LABELS[i], 'confidence': round(float(scores[i]), 3)}
+        for i in order if scores[i] > threshold
+    ]
+
+def decode_conversation(data):
+    """Replace a stored conversation's packed vector with the API's `emotions` list"""
+    blob = data.pop('emotion_vector', None)
+    data.pop('emotion_codec', None)
+    if blob is not None:
+        data['emotions'] = vector_to_emotions(decode_vector(blob))
+    return data
+
+def stack_vectors(blobs):
+    """Stack stored vectors into an (n_messages, n_labels) float32 matrix"""
+    width = len(EMOTION_LABELS)
+    rows = [bytes(b) for b in blobs]
+    if not rows:
+        return np.zeros((0, width), dtype=np.float32)
+    if any(len(row) != width for row in rows):
+        # Vectors written before labels were appended are zero-padded
+        rows = [row.ljust(width, b'\0') for row in rows]
+    packed = np.frombuffer(b''.join(rows), dtype=np.uint8)
+    return packed.reshape(-1, width).astype(np.float32) / 255
@@ -1,65 +1,122 @@
 """
 Emotion detection module for text and image analysis
 """
-from transformers import pipeline
-import torch
-import cv2
 import numpy as np
 from PIL import Image
-import mediapipe as mp
 import base64
 import io
+import os
+import re
+from .models import register_model, get_model
+from .metrics import INFERENCE_SECONDS
+from .emotion_vectors import MIN_CONFIDENCE
 
-# Initialize Text Emotion Recognition Pipeline
-try:
-    emotion_classifier = pipeline(
+# Heavy ML imports (torch, transformers, MediaPipe) happen inside the loaders
+# so importing this module stays cheap; models load on first use or warm-up
+
+def _inference_device():
+    import torch
+    return 0 if torch.cuda.is_available() else -1
+
+def _load_text_emotion_classifier():
+    """Text Emotion Recognition Pipeline"""
+    from transformers import pipeline
+    return pipeline(
         "text-classification",
         model="cardiffnlp/twitter-roberta-base-emotion-multilabel-latest",
-        device=0 if torch.cuda.is_available() else -1
+        device=_inference_device()
     )
-    print("✅ Text emotion recognition model initialized successfully")
-except Exception as e:
-    emotion_classifier = None
-    print(f"⚠️  Text emotion recognition model failed to load: {e}")
 
-# Initialize Image Emotion Recognition Pipeline
-try:
-    image_emotion_classifier = pipeline(
+def _load_image_emotion_classifier():
+    """Image Emotion Recognition Pipeline"""
+    from transformers import pipeline
+    return pipeline(
         "image-classification",
         model="trpakov/vit-face-expression",
-        device=0 if torch.cuda.is_available() else -1
+        device=_inference_device()
     )
-    print("✅ Image emotion recognition model initialized successfully")
-except Exception as e:
-    image_emotion_classifier = None
-    print(f"⚠️  Image emotion recognition model failed to load: {e}")
 
-# Initialize MediaPipe Face Detection
-try:
-    mp_face_detection = mp.solutions.face_detection
-    mp_drawing = mp.solutions.drawing_utils
-    face_detection = mp_face_detection.FaceDetection(model_selection=0, min_detection_confidence=0.5)
-    print("✅ MediaPipe face detection initialized successfully")
-except Exception as e:
-    face_detection = None
-    print(f"⚠️  MediaPipe face detection failed to load: {e}")
+def _load_face_detection():
+    """MediaPipe Face Detection"""
+    import mediapipe as mp
+    return mp.solutions.face_detection.FaceDetection(model_selection=0, min_detection_confidence=0.5)
+
+# Long-text mode: messages longer than one window are split into overlapping
+# token windows, scored in one batched forward pass and aggregated per label
+EMOTION_LONG_TEXT = os.environ.get('EMOTION_LONG_TEXT', 'true').lower() != 'false'
+EMOTION_WINDOW_TOKENS = int(os.environ.get('EMOTION_WINDOW_TOKENS', 256))
+EMOTION_WINDOW_OVERLAP = int(os.environ.get('EMOTION_WINDOW_OVERLAP', 64))
+# Tokens past this budget are ignored, keeping latency bounded for any length
+EMOTION_MAX_TOKENS = int(os.environ.get('EMOTION_MAX_TOKENS', 2048))
+EMOTION_AGGREGATION = os.environ.get('EMOTION_AGGREGATION', 'max')  # max or mean
+
+register_model('text_emotion', _load_text_emotion_classifier)
+register_model('image_emotion', _load_image_emotion_classifier)
+register_model('face_detection', _load_face_detection)
+
+def _token_spans(classifier, text):
+    """Character span of each token, from the model's fast tokenizer when available"""
+    tokenizer = getattr(classifier, 'tokenizer', None)
+    if tokenizer is not None and getattr(tokenizer, 'is_fast', False):
+        encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        return encoding['offset_mapping']
+    # Stubs and slow tokenizers: whitespace words approximate tokens
+    return [match.span() for match in re.finditer(r'\S+', text)]
+
+def split_windows(classifier, text):
+    """Split text into overlapping windows of at most EMOTION_WINDOW_TOKENS tokens"""
+    spans = _token_spans(classifier, text)[:EMOTION_MAX_TOKENS]
+    if not spans:
+        return [text]
+    
+    window = EMOTION_WINDOW_TOKENS
+    step = max(1, window - EMOTION_WINDOW_OVERLAP)
+    windows = []
+    for start in range(0, len(spans), step):
+        chunk = spans[start:start + window]
+        windows.append(text[chunk[0][0]:chunk[-1][1]])
+        if start + window >= len(spans):
+            break
+    return windows
+
+def score_text(classifier, text):
+    """Per-label scores for a message, windowed and batched when it is long"""
+    if not EMOTION_LONG_TEXT:
+        results = classifier(text, top_k=None, truncation=True)
+        return {result['label']: result['score'] for result in results}
+    
+    windows = split_windows(classifier, text)
+    batches = classifier(windows, top_k=None, truncation=True, batch_size=len(windows))
+    if len(windows) == 1:
+        return {result['label']: result['score'] for result in batches[0]}
+    
+    labels = [result['label'] for result in batches[0]]
+    matrix = np.array([[scores[label] for label in labels]
+                       for scores in ({r['label']: r['score'] for r in batch} for batch in batches)])
+    combined = matrix.mean(axis=0) if EMOTION_AGGREGATION == 'mean' else matrix.max(axis=0)
+    return dict(zip(labels, combined.tolist()))
 
 def detect_emotions(text):
     """Detect emotions in text using Hugging Face model"""
-    if not emotion_classifier or not text.strip():
-        return {"emotions": [], "dominant_emotion": "neutral"}
+    if not text.strip():
+        return {"emotions": [], "dominant_emotion": "neutral", "scores": {}}
+    
+    emotion_classifier = get_model('text_emotion')
+    if not emotion_classifier:
+        return {"emotions": [], "dominant_emotion": "neutral", "scores": {}}
     
     try:
-        # Get emotion predictions
-        results = emotion_classifier(text)
+        # Get every label's score, windowing long messages
+        with INFERENCE_SECONDS.time(model='text_emotion'):
+            scores = score_text(emotion_classifier, text)
         
-        # Process results - the model returns multiple labels with scores
+        # Only include emotions with confidence > 10%
         emotions = []
-        for result in results:
-            if result['score'] > 0.1:  # Only include emotions with confidence > 10%
+        for label, score in scores.items():
+            if score > MIN_CONFIDENCE:
                 emotions.append({
-                    "emotion": result['label'],
-                    "confidence": round(result['score'], 3)
+                    "emotion": label,
+                    "confidence": round(score, 3)
                 })
         
         # Sort by confidence and get dominant emotion
@@ -68,14 +125,16 @@ def detect_emotions(text):
         
         return {
             "emotions": emotions,
-            "dominant_emotion": dominant_emotion
+            "dominant_emotion": dominant_emotion,
+            "scores": scores
         }
     except Exception as e:
         print(f"Error in emotion detection: {e}")
-        return {"emotions": [], "dominant_emotion": "neutral"}
+        return {"emotions": [], "dominant_emotion": "neutral", "scores": {}}
 
 def detect_face_and_crop(image):
     """Detect face in image and return cropped face region"""
+    face_detection = get_model('face_detection')
     if not face_detection:
         return image
     
@@ -84,7 +143,8 @@ def detect_face_and_crop(image):
         image_rgb = np.array(image)
         
         # Detect faces
-        results = face_detection.process(image_rgb)
+        with INFERENCE_SECONDS.time(model='face_detection'):
+            results = face_detection.process(image_rgb)
         
         if results.detections:
             # Get the first detected face
@@ -115,13 +175,26 @@ def detect_face_and_crop(image):
         return image
 
 def detect_image_emotions(image_data):
-    """Detect emotions from image data"""
-    if not image_emotion_classifier:
+    """Detect emotions from a base64 data-URL image"""
+    if not get_model('image_emotion'):
         return {"emotions": [], "dominant_emotion": "neutral", "confidence": 0.0}
     
     try:
         # Decode base64 image
         image_bytes = base64.b64decode(image_data.split(',')[1])
+    except Exception as e:
+        print(f"Error decoding image data: {e}")
+        return {"emotions": [], "dominant_emotion": "neutral", "confidence": 0.0}
+    
+    return detect_image_emotions_from_bytes(image_bytes)
+
+def detect_image_emotions_from_bytes(image_bytes):
+    """Detect emotions from raw encoded image bytes (JPEG/PNG)"""
+    image_emotion_classifier = get_model('image_emotion')
+    if not image_emotion_classifier:
+        return {"emotions": [], "dominant_emotion": "neutral", "confidence": 0.0}
+    
+    try:
         image = Image.open(io.BytesIO(image_bytes))
         
         # Convert to RGB if necessary
@@ -132,7 +205,8 @@ def detect_image_emotions(image_data):
         face_image = detect_face_and_crop(image)
         
         # Analyze emotions
-        results = image_emotion_classifier(face_image)
+        with INFERENCE_SECONDS.time(model='image_emotion'):
+            results = image_emotion_classifier(face_image)
         
         # Process results
         emotions = []
@@ -0,0 +1,89 @@
+"""
+Streaming NDJSON export of a user's complete history
+
+The export is one JSON object per line: the profile first, then every chat
+session, conversation and meditation session, each tagged with a `type`.
+Collections are read EXPORT_PAGE_SIZE documents at a time with query cursors,
+and each line is sent as soon as it is encoded. Memory use stays flat and the
+first bytes go out immediately, however long the history is. Clients that
+accept gzip get the stream compressed on the fly, flushed once per page.
+"""
+from flask import Response, stream_with_context
+from datetime import datetime
+import os
+import zlib
+
+from .database import db, get_user
+from .emotion_vectors import decode_conversation
+from .metrics import Counter
+from .profile import public_user
+from .responses import dumps, accepts_encoding
+
+EXPORT_PAGE_SIZE = int(os.environ.get('EXPORT_PAGE_SIZE', 500))
+
+# collection -> record type, in export order
+EXPORTED_COLLECTIONS = (
+    ('chat_sessions', 'session'),
+    ('conversations', 'conversation'),
+    ('meditation_sessions', 'meditation'),
+)
+
+EXPORT_RECORDS = Counter('kinds_speak_export_records_total', 'Records written to history exports', ('type',))
+
+def _paged(collection, user_id):
+    """Yield pages of a user's documents using a cursor on the document id"""
+    query = db.collection(collection).where('user_id', '==', user_id).order_by('__name__').limit(EXPORT_PAGE_SIZE)
+    cursor = None
+    while True:
+        page = list((query.start_after(cursor) if cursor is not None else query).stream())
+        if not page:
+            return
+        yield page
+        if len(page) < EXPORT_PAGE_SIZE:
+            return
+        cursor = page[-1]
+
+def _line(record_type, data):
+    EXPORT_RECORDS.inc(type=record_type)
+    return dumps({'type': record_type, **data}) + b'\n'
+
+def export_lines(user_id):
+    """NDJSON export as a generator of byte chunks, one chunk per page"""
+    user_doc = get_user(user_id)
+    if user_doc.exists:
+        yield _line('profile', {**public_user(user_id, user_doc.to_dict()),
+                                'exported_at': datetime.utcnow()})
+
+    for collection, record_type in EXPORTED_COLLECTIONS:
+        for page in _paged(collection, user_id):
+            chunk = []
+            for doc in page:
+                data = doc.to_dict()
+                if record_type == 'conversation':
+                    data = decode_conversation(data)
+                chunk.append(_line(record_type, {'id': doc.id, **data}))
+            yield b''.join(chunk)
+
+def _gzip_stream(chunks):
+    """Gzip a chunk stream incrementally, flushing after every chunk"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def export_response(user_id):
+    """Streamed NDJSON download of a user's history"""
+    chunks = export_lines(user_id)
+    headers = {
+        'Content-Disposition': f'attachment; filename="history-{datetime.utcnow():%Y%m%d}.ndjson"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+    }
+    if accepts_encoding('gzip'):
+        # gzip with a sync flush per page keeps the stream live
+        chunks = _gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    return Response(stream_with_context(chunks), mimetype='application/x-ndjson', headers=headers)
@@ -0,0 +1,62 @@
+"""
+Exclusive locks on lock files, shared by every process on the host
+
+POSIX uses fcntl.flock. Windows has no fcntl; there, msvcrt.locking on the
+file's first byte gives the same exclusion (run.py serves with waitress in a
+single process, but CLI commands can still run alongside it). Either way the
+lock goes away with the process that holds it.
+"""
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# How often a blocking lock is retried on Windows, which has no blocking byte-range lock
+WINDOWS_LOCK_POLL_SECONDS = 0.05
+
+def _lock(handle, blocking):
+    if fcntl is not None:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    handle.seek(0)
+    while True:
+        try:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(WINDOWS_LOCK_POLL_SECONDS)
+
+def open_locked(path, blocking=True):
+    """Open `path` and lock it exclusively; pass the handle to release() when done
+
+    Returns None when `blocking` is False and another process holds the lock.
+    Errors opening the file propagate.
+    """
+    handle = open(path, 'a')
+    try:
+        if _lock(handle, blocking):
+            return handle
+    except BaseException:
+        handle.close()
+        raise
+    handle.close()
+    return None
+
+def release(handle):
+    """Unlock and close a handle from open_locked"""
+    if fcntl is None:
+        handle.seek(0)
+        try:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+    handle.close()
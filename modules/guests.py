@@ -0,0 +1,224 @@
+"""
+Ephemeral guest accounts: expiry, in-memory storage and a background sweeper
+
+Guest users carry an `expires_at` GUEST_TTL_HOURS after creation, and their
+session stops working at that point. The sweeper finds expired guests and
+deletes everything they own in chunked batch deletes, paced to at most
+GUEST_SWEEP_DELETES_PER_SECOND: sessions, conversations, meditations and mood
+rollups first, then the user document. An interrupted sweep is picked up
+again on the next run.
+
+The sweeper thread is started by the serving entry points (gunicorn's
+post_fork, run.py), not on import, so CLI commands and scripts don't sweep.
+Only the worker holding the lock on GUEST_SWEEP_LOCK_FILE sweeps Firestore;
+the others retry the lock each interval and take over if that worker exits.
+All workers share the lock file, so keep it on a local path.
+
+With GUEST_STORAGE=memory, guest data never reaches Firestore. The guest's
+requests are routed to a process-local MemoryFirestore. That state is per
+worker process, so it needs a single worker or sticky sessions, and it is
+lost on restart.
+
+    flask --app app sweep-guests [--legacy]
+"""
+from flask import session
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import os
+import random
+import tempfile
+import threading
+import time
+
+from .database import db
+from .filelock import open_locked
+from .memory_store import MemoryFirestore
+from .metrics import Counter, Gauge, Histogram
+
+GUEST_TTL_HOURS = float(os.environ.get('GUEST_TTL_HOURS', 24))
+GUEST_STORAGE = os.environ.get('GUEST_STORAGE', 'firestore')  # firestore or memory
+# Seconds between sweeps in each worker; 0 disables the in-process sweeper (use the CLI from cron)
+GUEST_SWEEP_INTERVAL = float(os.environ.get('GUEST_SWEEP_INTERVAL', 600))
+GUEST_SWEEP_BATCH_SIZE = min(500, int(os.environ.get('GUEST_SWEEP_BATCH_SIZE', 200)))
+GUEST_SWEEP_DELETES_PER_SECOND = float(os.environ.get('GUEST_SWEEP_DELETES_PER_SECOND', 100))
+GUEST_SWEEP_MAX_USERS = int(os.environ.get('GUEST_SWEEP_MAX_USERS', 500))
+# Held by the one worker per host that sweeps Firestore
+GUEST_SWEEP_LOCK_FILE = os.environ.get('GUEST_SWEEP_LOCK_FILE',
+                                       os.path.join(tempfile.gettempdir(), 'kinds-speak-guest-sweeper.lock'))
+
+# Everything a user owns, keyed by `user_id`
+GUEST_OWNED_COLLECTIONS = ('conversations', 'chat_sessions', 'meditation_sessions', 'mood_rollups')
+
+GUEST_SWEEP_USERS = Counter('kinds_speak_guest_sweep_users_total', 'Expired guest accounts deleted')
+GUEST_SWEEP_DOCUMENTS = Counter(
+    'kinds_speak_guest_sweep_documents_total', 'Documents deleted by the guest sweeper', ('collection',)
+)
+GUEST_SWEEP_SECONDS = Histogram('kinds_speak_guest_sweep_seconds', 'Duration of a guest sweep run', ('store',))
+GUEST_SWEEP_LAST_SUCCESS = Gauge(
+    'kinds_speak_guest_sweep_last_success_timestamp', 'Unix time of the last completed sweep', ('store',)
+)
+
+memory_store = MemoryFirestore()
+
+def guest_expiry(now=None):
+    return (now or datetime.utcnow()) + timedelta(hours=GUEST_TTL_HOURS)
+
+@contextmanager
+def guest_storage():
+    """Route queries in this block to guest storage (a no-op unless GUEST_STORAGE=memory)"""
+    if GUEST_STORAGE != 'memory':
+        yield
+        return
+    token = db.route_to(memory_store)
+    try:
+        yield
+    finally:
+        db.reset_route(token)
+
+def route_guest_request():
+    """before_request: expire finished guest sessions and route in-memory guests
+
+    Returns a routing token for reset_guest_route, or None.
+    """
+    expires_at = session.get('guest_expires_at')
+    if expires_at is not None and expires_at < time.time():
+        session.clear()
+        return None
+
+    if session.get('guest_storage') != 'memory':
+        return None
+    if not memory_store.collection('users').document(session.get('user_id', '')).get().exists:
+        # Swept, or created by another worker/process
+        session.clear()
+        return None
+    return db.route_to(memory_store)
+
+def reset_guest_route(token):
+    if token is not None:
+        db.reset_route(token)
+
+class _Pacer:
+    """Spaces out batch deletes so a sweep stays under a deletes-per-second budget"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.next_at = time.monotonic()
+
+    def wait(self, count):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + count / self.rate
+
+def _delete_owned(collection, user_id, pacer):
+    """Delete a user's documents in one collection, one batch at a time"""
+    deleted = 0
+    query = db.collection(collection).where('user_id', '==', user_id).limit(GUEST_SWEEP_BATCH_SIZE)
+    while True:
+        # Only references are needed; skip transferring document bodies
+        docs = list(query.select([]).stream())
+        if not docs:
+            return deleted
+        pacer.wait(len(docs))
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        deleted += len(docs)
+        GUEST_SWEEP_DOCUMENTS.inc(len(docs), collection=collection)
+
+def delete_guest(user_id, pacer=None):
+    """Delete a guest and everything they own; the user document goes last"""
+    from .profile import invalidate_profile_statistics
+    from .memories import drop_user_memory
+    from .search import drop_user_index
+    from .versions import forget_version
+
+    pacer = pacer or _Pacer(GUEST_SWEEP_DELETES_PER_SECOND)
+    deleted = {collection: _delete_owned(collection, user_id, pacer) for collection in GUEST_OWNED_COLLECTIONS}
+    pacer.wait(1)
+    db.collection('users').document(user_id).delete()
+    GUEST_SWEEP_DOCUMENTS.inc(collection='users')
+    GUEST_SWEEP_USERS.inc()
+    invalidate_profile_statistics(user_id)
+    forget_version('user', user_id)
+    drop_user_index(user_id)
+    drop_user_memory(user_id)
+    return deleted
+
+def sweep_expired_guests(now=None, legacy=False, max_users=GUEST_SWEEP_MAX_USERS):
+    """Delete up to `max_users` expired guests from the current store
+
+    `legacy` also matches guests created before expiry existed, by creation time.
+    """
+    now = now or datetime.utcnow()
+    users = db.collection('users').where('is_guest', '==', True)
+    if legacy:
+        users = users.where('created_at', '<', now - timedelta(hours=GUEST_TTL_HOURS))
+    else:
+        users = users.where('expires_at', '<', now)
+
+    pacer = _Pacer(GUEST_SWEEP_DELETES_PER_SECOND)
+    swept = 0
+    for doc in users.limit(max_users).select([]).stream():
+        delete_guest(doc.id, pacer)
+        swept += 1
+    return swept
+
+def run_sweep(legacy=False, firestore=True):
+    """Sweep Firestore (unless `firestore` is False), and the in-memory store when guests live there"""
+    stores = [('firestore', None)] if firestore else []
+    if GUEST_STORAGE == 'memory':
+        stores.append(('memory', memory_store))
+
+    total = 0
+    for name, client in stores:
+        token = db.route_to(client) if client is not None else None
+        try:
+            with GUEST_SWEEP_SECONDS.time(store=name):
+                swept = sweep_expired_guests(legacy=legacy)
+            GUEST_SWEEP_LAST_SUCCESS.set(time.time(), store=name)
+            total += swept
+            if swept:
+                print(f"🧹 Swept {swept} expired guest accounts from {name}")
+        except Exception as e:
+            print(f"Error sweeping guest accounts from {name}: {e}")
+        finally:
+            if token is not None:
+                db.reset_route(token)
+    return total
+
+_sweeper = None
+
+def _take_sweeper_lock():
+    """The lock file handle if this process is now the Firestore sweeper, else None"""
+    try:
+        handle = open_locked(GUEST_SWEEP_LOCK_FILE, blocking=False)
+    except OSError as e:
+        print(f"⚠️  Can't open guest sweeper lock {GUEST_SWEEP_LOCK_FILE}: {e}")
+        return None
+    if handle is None:
+        return None
+    print(f"🧹 Worker {os.getpid()} is the guest sweeper")
+    return handle
+
+def start_guest_sweeper():
+    """Start this process's background sweeper thread (once)"""
+    global _sweeper
+    if GUEST_SWEEP_INTERVAL <= 0 or (_sweeper is not None and _sweeper.is_alive()):
+        return
+
+    def loop():
+        lock = None
+        while True:
+            # Jitter keeps several workers from sweeping in lockstep
+            time.sleep(GUEST_SWEEP_INTERVAL * random.uniform(0.5, 1.5))
+            if lock is None:
+                lock = _take_sweeper_lock()
+            # In-memory guests live in each worker, so every worker sweeps its own store
+            run_sweep(firestore=lock is not None)
+
+    _sweeper = threading.Thread(target=loop, name='guest-sweeper', daemon=True)
+    _sweeper.start()
@@ -0,0 +1,360 @@
+"""
+Long-term companion memory: a per-user vector index of past conversation turns
+
+Each turn's message is embedded with a small local sentence encoder
+(MEMORY_ENCODER_MODEL, run on CPU) and appended to the user's index under
+MEMORY_INDEX_DIR:
+
+    current.json          {"generation", "dim", "encoder"}
+    vectors-<gen>.f32     float32 rows, memory-mapped for search
+    journal-<gen>.ndjson  one 'add' record per row (ids and snippet text),
+                          plus 'delete_session' tombstones
+
+Writers hold a lock on the user's directory, so rows and journal lines stay
+aligned across workers. A row or journal line left by a writer that died
+mid-append is cut off by the next writer. Readers replay only the journal tail and re-map the
+grown vector file. Once tombstoned rows outnumber live ones, the index is
+compacted into a new generation and current.json is swapped atomically.
+
+Before each reply, the top MEMORY_TOP_K past turns that score above
+MEMORY_MIN_SIMILARITY are added to the prompt, up to MEMORY_TOKEN_BUDGET tokens.
+
+    flask --app app rebuild-memories [--user <id>]
+"""
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from .database import db
+from .filelock import open_locked, release
+from .metrics import Histogram, INFERENCE_SECONDS
+from .models import register_model, get_model
+from .responses import dumps, loads
+
+MEMORY_ENABLED = os.environ.get('MEMORY_ENABLED', 'true').lower() != 'false'
+MEMORY_INDEX_DIR = os.environ.get('MEMORY_INDEX_DIR', 'memory_index')
+MEMORY_ENCODER_MODEL = os.environ.get('MEMORY_ENCODER_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+MEMORY_ENCODER_MAX_TOKENS = int(os.environ.get('MEMORY_ENCODER_MAX_TOKENS', 256))
+MEMORY_TOP_K = int(os.environ.get('MEMORY_TOP_K', 4))
+MEMORY_MIN_SIMILARITY = float(os.environ.get('MEMORY_MIN_SIMILARITY', 0.35))
+# Prompt budget for recalled snippets, estimated at ~4 characters per token
+MEMORY_TOKEN_BUDGET = int(os.environ.get('MEMORY_TOKEN_BUDGET', 300))
+MEMORY_SNIPPET_CHARS = 280
+MEMORY_MAX_LOADED_USERS = int(os.environ.get('MEMORY_MAX_LOADED_USERS', 256))
+MEMORY_COMPACT_MIN_DEAD = 200
+MEMORY_EMBED_BATCH = 32
+
+MEMORY_RECALL_SECONDS = Histogram('kinds_speak_memory_recall_seconds', 'Vector search over a user\'s past turns')
+
+def _load_text_encoder():
+    """Sentence embedding pipeline (mean-pooled token features)"""
+    from transformers import pipeline
+    return pipeline("feature-extraction", model=MEMORY_ENCODER_MODEL, device=-1)
+
+if MEMORY_ENABLED:
+    register_model('text_embedding', _load_text_encoder)
+
+def embed_texts(encoder, texts):
+    """L2-normalised float32 embeddings, one row per text"""
+    with INFERENCE_SECONDS.time(model='text_embedding'):
+        outputs = encoder(texts, truncation=True, max_length=MEMORY_ENCODER_MAX_TOKENS)
+    vectors = np.stack([np.asarray(output[0], dtype=np.float32).mean(axis=0) for output in outputs])
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def _user_dir(user_id):
+    return os.path.join(MEMORY_INDEX_DIR, hashlib.sha256(user_id.encode('utf-8')).hexdigest()[:32])
+
+def _clip(text):
+    text = ' '.join((text or '').split())
+    return text if len(text) <= MEMORY_SNIPPET_CHARS else text[:MEMORY_SNIPPET_CHARS - 1] + '…'
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _record(doc_id, conversation):
+    return {
+        'op': 'add', 'id': doc_id, 'session_id': conversation.get('session_id'),
+        'timestamp': _iso(conversation.get('timestamp')),
+        'message': _clip(conversation.get('message')), 'response': _clip(conversation.get('response')),
+    }
+
+class UserMemory:
+    """One user's vector index, synchronised with the files on disk"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.dir = _user_dir(user_id)
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self, current=None):
+        current = current or {}
+        self.generation = current.get('generation')
+        self.dim = current.get('dim')
+        self.encoder = current.get('encoder')
+        self.rows = []              # journal record per row
+        self.alive = bytearray()    # 1 per live row, 0 once its session is deleted
+        self.sessions = {}          # session id -> row numbers
+        self.dead = 0
+        self.offset = 0
+        self.vectors = None
+
+    def _path(self, name):
+        return os.path.join(self.dir, name)
+
+    def _files(self, generation):
+        return self._path(f'vectors-{generation}.f32'), self._path(f'journal-{generation}.ndjson')
+
+    def _flock(self):
+        os.makedirs(self.dir, exist_ok=True)
+        return open_locked(self._path('lock'))
+
+    def _read_current(self):
+        try:
+            with open(self._path('current.json'), 'rb') as f:
+                return loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    # Reading
+
+    def refresh(self):
+        """Pick up rows and tombstones written since the last read (by any worker)"""
+        with self.lock:
+            current = self._read_current()
+            if current is None:
+                if self.generation is not None:
+                    self._reset()
+                return
+            if current['generation'] != self.generation:
+                self._reset(current)
+
+            vectors_path, journal_path = self._files(self.generation)
+            rows_before = len(self.rows)
+            try:
+                with open(journal_path, 'rb') as f:
+                    f.seek(self.offset)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break  # a record still being written
+                        self.offset += len(line)
+                        self._apply(loads(line))
+            except FileNotFoundError:
+                # Compacted away since current.json was read; the next refresh loads the new generation
+                self._reset()
+                return
+
+            if self.rows and (len(self.rows) != rows_before or self.vectors is None):
+                # The vector file is written before the journal, so it holds every row read so far
+                self.vectors = np.memmap(vectors_path, dtype=np.float32, mode='r', shape=(len(self.rows), self.dim))
+
+    def _apply(self, record):
+        if record['op'] == 'add':
+            self.sessions.setdefault(record.get('session_id'), []).append(len(self.rows))
+            self.rows.append(record)
+            self.alive.append(1)
+        elif record['op'] == 'delete_session':
+            for row in self.sessions.pop(record['session_id'], []):
+                self.alive[row] = 0
+                self.dead += 1
+
+    def _live_rows(self):
+        return np.frombuffer(bytes(self.alive), dtype=bool)
+
+    def search(self, vector, k=MEMORY_TOP_K, min_similarity=MEMORY_MIN_SIMILARITY):
+        """The k most similar live past turns as (similarity, record) pairs"""
+        with self.lock:
+            self.refresh()
+            if self.vectors is None or self.dim != len(vector) or self.encoder != MEMORY_ENCODER_MODEL:
+                return []
+            scores = self.vectors @ np.asarray(vector, dtype=np.float32)
+            scores = np.where(self._live_rows(), scores, -np.inf)
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(float(scores[row]), self.rows[row]) for row in top if scores[row] >= min_similarity]
+
+    # Writing
+
+    def append(self, vector, record):
+        """Append one embedded turn"""
+        handle = self._flock()
+        try:
+            current = self._read_current()
+            if current is None or current['dim'] != len(vector) or current['encoder'] != MEMORY_ENCODER_MODEL:
+                # First turn, or the encoder changed: start a fresh generation
+                self._write_generation(np.zeros((0, len(vector)), dtype=np.float32), [], current)
+                current = self._read_current()
+            else:
+                self._cut_partial_append(current)
+            vectors_path, journal_path = self._files(current['generation'])
+            with open(vectors_path, 'ab') as f:
+                f.write(np.asarray(vector, dtype=np.float32).tobytes())
+            with open(journal_path, 'ab') as f:
+                f.write(dumps(record) + b'\n')
+        finally:
+            release(handle)
+
+    def delete_session(self, session_id):
+        """Tombstone a deleted session's turns, compacting when they pile up"""
+        handle = self._flock()
+        try:
+            current = self._read_current()
+            if current is None:
+                return
+            self._cut_partial_append(current)
+            _, journal_path = self._files(current['generation'])
+            with open(journal_path, 'ab') as f:
+                f.write(dumps({'op': 'delete_session', 'session_id': session_id}) + b'\n')
+            with self.lock:
+                self.refresh()
+                live = np.flatnonzero(self._live_rows())
+                if self.dead > MEMORY_COMPACT_MIN_DEAD and self.dead > len(live):
+                    self._write_generation(np.asarray(self.vectors[live]), [self.rows[row] for row in live], current)
+        finally:
+            release(handle)
+
+    def _cut_partial_append(self, current):
+        """Truncate both files to the last complete journal line and its row (caller holds the lock)
+
+        A writer that died between the two writes, or mid-write, leaves a row
+        without a journal line or a partial line. Left in place, every later
+        row would be paired with the wrong record.
+        """
+        with self.lock:
+            self.refresh()
+            vectors_path, journal_path = self._files(current['generation'])
+            for path, size in ((vectors_path, len(self.rows) * self.dim * 4), (journal_path, self.offset)):
+                try:
+                    if os.path.getsize(path) > size:
+                        os.truncate(path, size)
+                except FileNotFoundError:
+                    pass
+
+    def _write_generation(self, vectors, records, current):
+        """Write a complete index as a new generation and switch to it (caller holds the lock)"""
+        os.makedirs(self.dir, exist_ok=True)
+        generation = (current['generation'] + 1) if current else 1
+        vectors_path, journal_path = self._files(generation)
+        with open(vectors_path, 'wb') as f:
+            f.write(np.asarray(vectors, dtype=np.float32).tobytes())
+        with open(journal_path, 'wb') as f:
+            for record in records:
+                f.write(dumps(record) + b'\n')
+        temp_path = self._path(f'current.json.{os.getpid()}.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(dumps({'generation': generation, 'dim': int(np.shape(vectors)[1]), 'encoder': MEMORY_ENCODER_MODEL}))
+        os.replace(temp_path, self._path('current.json'))
+        if current:
+            # Open memory maps keep the old files readable until they're released
+            for path in self._files(current['generation']):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def replace(self, vectors, records):
+        """Replace the whole index, e.g. after a rebuild"""
+        handle = self._flock()
+        try:
+            self._write_generation(vectors, records, self._read_current())
+        finally:
+            release(handle)
+
+    def size_bytes(self):
+        """Bytes on disk for this user's index"""
+        total = 0
+        for name in os.listdir(self.dir) if os.path.isdir(self.dir) else []:
+            total += os.path.getsize(self._path(name))
+        return total
+
+_memories = OrderedDict()
+_memories_lock = threading.Lock()
+
+def get_memory(user_id):
+    with _memories_lock:
+        memory = _memories.get(user_id)
+        if memory is None:
+            memory = _memories[user_id] = UserMemory(user_id)
+            while len(_memories) > MEMORY_MAX_LOADED_USERS:
+                _memories.popitem(last=False)
+        else:
+            _memories.move_to_end(user_id)
+        return memory
+
+def format_memories(matches, budget=MEMORY_TOKEN_BUDGET):
+    """Prompt section for recalled turns, most relevant first, within a token budget"""
+    lines = []
+    remaining = budget * 4
+    for _, record in matches:
+        line = f"- [{(record.get('timestamp') or '')[:10]}] User: {record['message']}"
+        if record.get('response'):
+            line += f" / You: {record['response']}"
+        if len(line) > remaining:
+            break
+        lines.append(line)
+        remaining -= len(line)
+    if not lines:
+        return ""
+    return "\n\nFrom earlier conversations with this user (mention only if relevant):\n" + "\n".join(lines)
+
+def recall_memories(user_id, message):
+    """Prompt context from the user's relevant past turns, and the message's embedding
+
+    Returns ("", None) when memory is disabled or the encoder is unavailable.
+    """
+    encoder = get_model('text_embedding') if MEMORY_ENABLED else None
+    if encoder is None:
+        return "", None
+    vector = embed_texts(encoder, [message])[0]
+    with MEMORY_RECALL_SECONDS.time():
+        matches = get_memory(user_id).search(vector)
+    return format_memories(matches), vector
+
+def remember_turn(user_id, doc_id, conversation, vector):
+    """Add a saved turn to the user's memory, reusing the embedding from recall"""
+    if vector is not None:
+        get_memory(user_id).append(vector, _record(doc_id, conversation))
+
+def forget_session(user_id, session_id):
+    """Drop a deleted session's turns from the user's memory"""
+    if MEMORY_ENABLED:
+        get_memory(user_id).delete_session(session_id)
+
+def drop_user_memory(user_id):
+    """Delete a user's memory entirely (e.g. when the account is removed)"""
+    with _memories_lock:
+        _memories.pop(user_id, None)
+    shutil.rmtree(_user_dir(user_id), ignore_errors=True)
+
+def rebuild_memories(user_id=None):
+    """Re-embed stored conversations into fresh indexes (all users, or one)"""
+    encoder = get_model('text_embedding')
+    if encoder is None:
+        print("⚠️  Text embedding model unavailable; memories not rebuilt")
+        return 0
+
+    conversations = db.collection('conversations')
+    if user_id:
+        conversations = conversations.where('user_id', '==', user_id)
+    by_user = {}
+    for doc in conversations.stream():
+        data = doc.to_dict()
+        if data.get('user_id'):
+            by_user.setdefault(data['user_id'], []).append((doc.id, data))
+
+    for owner, turns in by_user.items():
+        turns.sort(key=lambda turn: _iso(turn[1].get('timestamp')) or '')
+        vectors = np.concatenate([
+            embed_texts(encoder, [data.get('message', '') for _, data in turns[start:start + MEMORY_EMBED_BATCH]])
+            for start in range(0, len(turns), MEMORY_EMBED_BATCH)
+        ])
+        get_memory(owner).replace(vectors, [_record(doc_id, data) for doc_id, data in turns])
+    print(f"🧠 Rebuilt memories for {len(by_user)} users")
+    return len(by_user)
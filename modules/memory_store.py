@@ -0,0 +1,235 @@
+"""
+In-memory stand-in for the subset of the Firestore client API this app uses
+
+Backs in-memory guest accounts (GUEST_STORAGE=memory) and the offline
+benchmarks. Collections, dotted field paths, where/order_by/limit/start_after,
+select, batches, Increment and DELETE_FIELD behave like Firestore's for the
+queries the app issues. An optional per-call latency models a remote backend.
+"""
+from google.cloud.firestore import Increment, DELETE_FIELD
+import itertools
+import threading
+import time
+
+def _sleep(latency):
+    if latency:
+        time.sleep(latency)
+
+def _get_path(data, path):
+    """Read a dotted field path from nested dicts"""
+    value = data
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def _set_path(data, path, value):
+    """Write a dotted field path, resolving Increment transforms"""
+    parts = path.split('.')
+    target = data
+    for part in parts[:-1]:
+        target = target.setdefault(part, {})
+    if value is DELETE_FIELD:
+        target.pop(parts[-1], None)
+        return
+    if isinstance(value, Increment):
+        value = (target.get(parts[-1]) or 0) + value.value
+    target[parts[-1]] = value
+
+def _resolve_transforms(data):
+    return {k: (v.value if isinstance(v, Increment) else v) for k, v in data.items()}
+
+_OPERATORS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    'in': lambda a, b: a in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+}
+
+class MemoryDocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return _get_path(self._data or {}, field)
+
+class MemoryDocumentReference:
+    def __init__(self, store, collection, doc_id):
+        self._store = store
+        self._collection = collection
+        self.id = doc_id
+
+    def _docs(self):
+        return self._store._collections.setdefault(self._collection, {})
+
+    def get(self):
+        _sleep(self._store.latency)
+        with self._store._lock:
+            data = self._docs().get(self.id)
+            return MemoryDocumentSnapshot(self, dict(data) if data is not None else None)
+
+    def set(self, data, merge=False):
+        _sleep(self._store.latency)
+        self._set(data, merge)
+
+    def update(self, data):
+        _sleep(self._store.latency)
+        self._update(data)
+
+    def delete(self):
+        _sleep(self._store.latency)
+        self._delete()
+
+    def _set(self, data, merge=False):
+        with self._store._lock:
+            docs = self._docs()
+            if merge and self.id in docs:
+                for key, value in data.items():
+                    _set_path(docs[self.id], key, value)
+            else:
+                docs[self.id] = _resolve_transforms(data)
+
+    def _update(self, data):
+        with self._store._lock:
+            docs = self._docs()
+            if self.id not in docs:
+                raise KeyError(f"No document to update: {self._collection}/{self.id}")
+            for key, value in data.items():
+                _set_path(docs[self.id], key, value)
+
+    def _delete(self):
+        with self._store._lock:
+            self._docs().pop(self.id, None)
+
+class MemoryQuery:
+    def __init__(self, store, collection, filters=(), orders=(), limit=None, start_after=None, fields=None):
+        self._store = store
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._start_after = start_after
+        self._fields = fields
+
+    def _copy(self, **changes):
+        values = {
+            'filters': self._filters, 'orders': self._orders,
+            'limit': self._limit, 'start_after': self._start_after,
+            'fields': self._fields
+        }
+        values.update(changes)
+        return MemoryQuery(self._store, self._collection, **values)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction='ASCENDING'):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, field_paths):
+        return self._copy(fields=tuple(field_paths))
+
+    def start_after(self, snapshot):
+        return self._copy(start_after=snapshot)
+
+    def _sort_value(self, doc_id, data, field):
+        return doc_id if field == '__name__' else _get_path(data, field)
+
+    def stream(self):
+        _sleep(self._store.latency)
+        with self._store._lock:
+            docs = list(self._store._collections.get(self._collection, {}).items())
+
+        matches = [
+            (doc_id, data) for doc_id, data in docs
+            if all(_OPERATORS[op](_get_path(data, field), value) for field, op, value in self._filters)
+        ]
+
+        for field, direction in reversed(self._orders):
+            matches = [m for m in matches if field == '__name__' or _get_path(m[1], field) is not None]
+            matches.sort(key=lambda m: self._sort_value(m[0], m[1], field), reverse=direction == 'DESCENDING')
+
+        if self._start_after is not None:
+            ids = [doc_id for doc_id, _ in matches]
+            if self._start_after.id in ids:
+                matches = matches[ids.index(self._start_after.id) + 1:]
+
+        if self._limit is not None:
+            matches = matches[:self._limit]
+
+        for doc_id, data in matches:
+            reference = MemoryDocumentReference(self._store, self._collection, doc_id)
+            if self._fields is not None:
+                data = {f: data[f] for f in self._fields if f in data}
+            yield MemoryDocumentSnapshot(reference, dict(data))
+
+    def get(self):
+        return list(self.stream())
+
+class MemoryCollection(MemoryQuery):
+    def __init__(self, store, name):
+        super().__init__(store, name)
+
+    def document(self, doc_id=None):
+        return MemoryDocumentReference(self._store, self._collection, doc_id or self._store._new_id())
+
+    def add(self, data):
+        reference = self.document()
+        reference.set(data)
+        return time.time(), reference
+
+class MemoryWriteBatch:
+    def __init__(self, store):
+        self._store = store
+        self._operations = []
+
+    def set(self, reference, data, merge=False):
+        self._operations.append(lambda: reference._set(data, merge))
+
+    def update(self, reference, data):
+        self._operations.append(lambda: reference._update(data))
+
+    def delete(self, reference):
+        self._operations.append(reference._delete)
+
+    def commit(self):
+        # A batch is one round trip no matter how many writes it holds
+        _sleep(self._store.latency)
+        for operation in self._operations:
+            operation()
+        self._operations = []
+
+class MemoryFirestore:
+    """In-memory Firestore client covering the subset of the API this app uses"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._collections = {}
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+
+    def _new_id(self):
+        return f"doc{next(self._ids):012d}"
+
+    def collection(self, name):
+        return MemoryCollection(self, name)
+
+    def batch(self):
+        return MemoryWriteBatch(self)
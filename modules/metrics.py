@@ -0,0 +1,162 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition
+
+Counters, gauges and histograms are plain Python objects guarded by a lock;
+recording a sample is a dict lookup plus an add, and nothing is formatted
+until /metrics is scraped. Each worker process keeps its own registry and
+labels every sample with `worker` (its pid), so a scrape that lands on another
+worker shows a different series instead of a counter that jumped or reset.
+Aggregate across workers in the query, e.g. `sum without (worker) (...)`.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import bisect
+import os
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = [('worker', os.getpid())] + list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    escaped = ['{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return '{' + ','.join(escaped) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._render_samples())
+        return lines
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in self._values.items()]
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of a block"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def _render_samples(self):
+        lines = []
+        for key, series in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series['counts']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+def timed(histogram, **labels):
+    """Decorator that records a function's duration in a histogram"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def render_metrics():
+    """Render every registered metric in Prometheus text format"""
+    lines = []
+    with _registry_lock:
+        metrics = list(_registry)
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+# Shared metrics used across modules
+HTTP_REQUEST_SECONDS = Histogram(
+    'kinds_speak_http_request_seconds', 'HTTP request latency by route',
+    ('method', 'route', 'status')
+)
+DB_OPERATION_SECONDS = Histogram(
+    'kinds_speak_db_operation_seconds', 'Firestore operation latency',
+    ('operation',)
+)
+INFERENCE_SECONDS = Histogram(
+    'kinds_speak_inference_seconds', 'Model inference latency',
+    ('model',)
+)
+CHAT_STAGE_SECONDS = Histogram(
+    'kinds_speak_chat_stage_seconds', 'Latency of each stage of a chat turn',
+    ('stage',)
+)
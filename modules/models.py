@@ -0,0 +1,112 @@
+"""
+Model registry with lazy loading and background warm-up
+
+Heavy models (transformers pipelines, MediaPipe, the Gemini client) register a
+loader here instead of loading at import time. Each model is loaded once, on
+first use or by the warm-up thread, whichever comes first.
+"""
+import threading
+import time
+
+# Model lifecycle states
+PENDING = 'pending'
+LOADING = 'loading'
+READY = 'ready'
+UNAVAILABLE = 'unavailable'
+FAILED = 'failed'
+
+class ModelEntry:
+    """A registered model and its loading state"""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.model = None
+        self.state = PENDING
+        self.error = None
+        self.load_seconds = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Run the loader once; later callers wait for the first load"""
+        if self.state in (READY, UNAVAILABLE, FAILED):
+            return self.model
+
+        with self.lock:
+            if self.state != PENDING:
+                return self.model
+
+            self.state = LOADING
+            started_at = time.perf_counter()
+            try:
+                self.model = self.loader()
+                self.state = READY if self.model is not None else UNAVAILABLE
+                if self.state == READY:
+                    print(f"✅ {self.name} model loaded in {time.perf_counter() - started_at:.2f}s")
+            except Exception as e:
+                self.model = None
+                self.error = str(e)
+                self.state = FAILED
+                print(f"⚠️  {self.name} model failed to load: {e}")
+            finally:
+                self.load_seconds = round(time.perf_counter() - started_at, 3)
+
+        return self.model
+
+_registry = {}
+_registry_lock = threading.Lock()
+_warmup_thread = None
+
+def register_model(name, loader):
+    """Register a zero-argument loader for a model"""
+    with _registry_lock:
+        _registry[name] = ModelEntry(name, loader)
+
+def get_model(name):
+    """Get a model, loading it on first use; returns None if unavailable"""
+    entry = _registry.get(name)
+    if entry is None:
+        return None
+    return entry.load()
+
+def set_model(name, model):
+    """Install an already-built model (used by benchmarks and tests)"""
+    entry = ModelEntry(name, lambda: model)
+    entry.load()
+    with _registry_lock:
+        _registry[name] = entry
+
+def _load_all(names):
+    for name in names:
+        get_model(name)
+
+def warm_up_models(names=None, background=True):
+    """Load registered models ahead of the first request that needs them"""
+    global _warmup_thread
+    names = list(names or _registry.keys())
+
+    if not background:
+        _load_all(names)
+        return None
+
+    if _warmup_thread and _warmup_thread.is_alive():
+        return _warmup_thread
+
+    _warmup_thread = threading.Thread(target=_load_all, args=(names,), name='model-warmup', daemon=True)
+    _warmup_thread.start()
+    return _warmup_thread
+
+def model_states():
+    """Get the loading state of every registered model"""
+    return {
+        name: {
+            'state': entry.state,
+            'load_seconds': entry.load_seconds,
+            'error': entry.error
+        }
+        for name, entry in _registry.items()
+    }
+
+def models_ready():
+    """True once no model is still pending or loading"""
+    return all(entry.state not in (PENDING, LOADING) for entry in _registry.values())
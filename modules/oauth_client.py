@@ -0,0 +1,95 @@
+"""
+Pooled, timeout-bounded HTTP client for OAuth providers
+
+Each provider gets its own requests.Session, so token exchanges and user-info
+calls reuse kept-alive TLS connections instead of opening new ones per login.
+Every call has connect/read timeouts, so a slow provider can't hold a worker
+thread indefinitely.
+
+Retries are bounded. Connection failures are retried for any call, because the
+request never reached the provider. Read timeouts and 502/503/504 responses are
+retried only for GETs: an authorization code is single-use, so a token POST
+that may have been processed must not be replayed.
+"""
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import os
+import requests
+import threading
+import time
+from .metrics import Histogram
+
+OAUTH_CONNECT_TIMEOUT = float(os.environ.get('OAUTH_CONNECT_TIMEOUT', 3.05))
+OAUTH_READ_TIMEOUT = float(os.environ.get('OAUTH_READ_TIMEOUT', 10))
+OAUTH_RETRIES = int(os.environ.get('OAUTH_RETRIES', 2))
+OAUTH_RETRY_BACKOFF = float(os.environ.get('OAUTH_RETRY_BACKOFF', 0.3))
+# Connections kept per provider host; roughly the worker's thread count
+OAUTH_POOL_SIZE = int(os.environ.get('OAUTH_POOL_SIZE', 8))
+
+OAUTH_REQUEST_SECONDS = Histogram(
+    'kinds_speak_oauth_request_seconds', 'OAuth provider call latency including retries',
+    ('provider', 'call', 'status')
+)
+
+_sessions = {}
+_sessions_pid = None
+_lock = threading.Lock()
+
+def _build_session():
+    retry = Retry(
+        total=OAUTH_RETRIES,
+        connect=OAUTH_RETRIES,
+        read=OAUTH_RETRIES,
+        status=OAUTH_RETRIES,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+        backoff_factor=OAUTH_RETRY_BACKOFF,
+        raise_on_status=False,
+    )
+    # A provider uses a couple of hosts (token and user-info endpoints)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=OAUTH_POOL_SIZE, max_retries=retry)
+    http = requests.Session()
+    http.mount('https://', adapter)
+    http.mount('http://', adapter)
+    http.headers['Accept'] = 'application/json'
+    return http
+
+def get_session(provider):
+    """The shared session for a provider, created per worker process"""
+    global _sessions_pid
+    if _sessions_pid != os.getpid():
+        # Sockets inherited across fork can't be shared with the parent
+        with _lock:
+            if _sessions_pid != os.getpid():
+                _sessions.clear()
+                _sessions_pid = os.getpid()
+
+    http = _sessions.get(provider)
+    if http is None:
+        with _lock:
+            http = _sessions.get(provider)
+            if http is None:
+                http = _sessions[provider] = _build_session()
+    return http
+
+def oauth_request(provider, call, method, url, **kwargs):
+    """Make a provider call; returns the response, or None if the provider couldn't be reached"""
+    kwargs.setdefault('timeout', (OAUTH_CONNECT_TIMEOUT, OAUTH_READ_TIMEOUT))
+    status = 'error'
+    started = time.perf_counter()
+    try:
+        response = get_session(provider).request(method, url, **kwargs)
+        status = str(response.status_code)
+        return response
+    except requests.RequestException as e:
+        print(f"⚠️  OAuth {call} request to {provider} failed: {e}")
+        return None
+    finally:
+        OAUTH_REQUEST_SECONDS.observe(time.perf_counter() - started, provider=provider, call=call, status=status)
+
+def close_sessions():
+    """Close pooled connections, e.g. on worker exit"""
+    with _lock:
+        for http in _sessions.values():
+            http.close()
+        _sessions.clear()
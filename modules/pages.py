@@ -0,0 +1,37 @@
+"""
+Rendered-page cache for public pages with ETag revalidation
+
+Public pages such as /terms and /privacy depend only on the date, so each is
+rendered once per day and then served from memory. Browsers revalidate with
+If-None-Match and get a 304 without the page being rendered again.
+"""
+from flask import Response, request
+from datetime import datetime
+import hashlib
+import threading
+
+PUBLIC_PAGE_MAX_AGE = 3600
+
+_cache = {}
+_lock = threading.Lock()
+
+def cached_page(name, render):
+    """Serve a public page rendered at most once per day"""
+    today = datetime.now().strftime("%B %d, %Y")
+    key = (name, today)
+
+    entry = _cache.get(key)
+    if entry is None:
+        body = render(today)
+        entry = (body, hashlib.sha1(body.encode('utf-8')).hexdigest())
+        with _lock:
+            # Drop earlier days' renders of this page
+            for stale in [k for k in _cache if k[0] == name]:
+                del _cache[stale]
+            _cache[key] = entry
+
+    body, etag = entry
+    response = Response(body, mimetype='text/html')
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = f'public, max-age={PUBLIC_PAGE_MAX_AGE}'
+    return response.make_conditional(request)
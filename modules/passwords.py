@@ -0,0 +1,151 @@
+"""
+Password hashing on a bounded worker process pool
+
+Werkzeug's KDFs (scrypt by default) are deliberately CPU-expensive. If they
+run in the request thread, a burst of logins holds the GIL and stalls every
+other request in the worker. Hashing and verification therefore run in a small
+process pool. At most PASSWORD_HASH_MAX_PENDING jobs may be queued or running.
+A request that can't get a slot within PASSWORD_HASH_QUEUE_TIMEOUT fails fast
+with HasherBusy instead of piling up, as does a job that doesn't finish within
+PASSWORD_HASH_TIMEOUT or whose pool broke. A job keeps its slot until its
+process is actually done with it, even after the request stopped waiting.
+
+Pool processes are started with forkserver (spawn where that's unavailable),
+not forked from the multithreaded worker: a fork could inherit locks held by
+other threads and would copy the worker's loaded models into every child.
+
+PASSWORD_HASH_METHOD sets the KDF and its cost, e.g. "scrypt:32768:8:1" or
+"pbkdf2:sha256:600000". Shorthands such as "scrypt" or "pbkdf2:sha256" take
+werkzeug's default costs. On a successful login, a hash made with other
+parameters is replaced (see needs_rehash).
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+import concurrent.futures
+import multiprocessing
+from werkzeug.security import generate_password_hash, check_password_hash
+import os
+import threading
+import time
+from .metrics import Gauge, Histogram
+
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+# 0 hashes in the calling thread (no pool), e.g. where fork is unavailable
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 2.0))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10.0))
+PASSWORD_HASH_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+PASSWORD_HASH_SECONDS = Histogram(
+    'kinds_speak_password_hash_seconds', 'Password KDF latency including pool queueing', ('operation',)
+)
+PASSWORD_HASH_QUEUE_SECONDS = Histogram(
+    'kinds_speak_password_hash_queue_seconds', 'Time spent waiting for a password hashing slot', ('operation',)
+)
+PASSWORD_HASH_PENDING = Gauge(
+    'kinds_speak_password_hash_pending', 'Password hashing jobs queued or running'
+)
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool can't take or finish a job in time"""
+
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def _hash_password(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+def _verify_password(password_hash, password):
+    return check_password_hash(password_hash, password)
+
+def _get_pool():
+    """The process pool, created lazily in each (post-fork) worker process"""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                            mp_context=multiprocessing.get_context(PASSWORD_HASH_START_METHOD))
+                _pool_pid = os.getpid()
+    return _pool
+
+def _discard_pool(pool):
+    """Drop a broken pool so the next job starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _release_slot(future=None):
+    PASSWORD_HASH_PENDING.dec()
+    _slots.release()
+
+def _run(operation, fn, *args):
+    """Run a KDF job on the pool, bounded by the pending-job limit"""
+    waited_from = time.perf_counter()
+    if not _slots.acquire(timeout=PASSWORD_HASH_QUEUE_TIMEOUT):
+        raise HasherBusy(f"No password hashing slot free after {PASSWORD_HASH_QUEUE_TIMEOUT}s")
+    PASSWORD_HASH_QUEUE_SECONDS.observe(time.perf_counter() - waited_from, operation=operation)
+
+    PASSWORD_HASH_PENDING.inc()
+    if PASSWORD_HASH_WORKERS <= 0:
+        try:
+            with PASSWORD_HASH_SECONDS.time(operation=operation):
+                return fn(*args)
+        finally:
+            _release_slot()
+
+    pool = _get_pool()
+    try:
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:
+        _release_slot()
+        _discard_pool(pool)
+        raise HasherBusy("Password hashing pool is broken")
+    except RuntimeError:
+        # Shut down (the worker is exiting) between _get_pool and submit
+        _release_slot()
+        raise HasherBusy("Password hashing pool is shut down")
+    # The slot is freed when the job really ends, not when this request gives up on it
+    future.add_done_callback(_release_slot)
+
+    with PASSWORD_HASH_SECONDS.time(operation=operation):
+        try:
+            return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            future.cancel()  # only succeeds while the job is still queued
+            raise HasherBusy(f"Password hashing took longer than {PASSWORD_HASH_TIMEOUT}s")
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise HasherBusy("Password hashing pool is broken")
+
+def hash_password(password):
+    """Hash a password with the configured KDF parameters"""
+    return _run('hash', _hash_password, password, PASSWORD_HASH_METHOD, PASSWORD_SALT_LENGTH)
+
+def verify_password(password_hash, password):
+    """Check a password against a stored hash"""
+    return _run('verify', _verify_password, password_hash, password)
+
+@lru_cache(maxsize=None)
+def _stored_method(method):
+    """The prefix werkzeug stores for `method`, with any default costs spelled out"""
+    return generate_password_hash('', method=method, salt_length=1).split('$', 1)[0]
+
+def needs_rehash(password_hash):
+    """True when a stored hash was made with different KDF parameters"""
+    return password_hash.split('$', 1)[0] != _stored_method(PASSWORD_HASH_METHOD)
+
+def shutdown_pool():
+    """Stop the pool's worker processes"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
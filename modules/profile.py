@@ -2,33 +2,60 @@
 Profile management module for user profile operations
 """
 from flask import session, jsonify, request, render_template, redirect, url_for
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import contextvars
+import os
+import threading
+import time
 from .database import (
-    db, get_user_by_username, get_user_by_email, 
-    update_user_profile, get_user_conversations, get_user_stats
+    get_user, get_user_by_username, get_user_by_email, 
+    update_user_profile, get_user_conversations,
+    get_user_chat_sessions
 )
+from .versions import new_stamp, remember_version, get_version
+from .rollups import recent_summary, count_chat_turns
+
+# Stats stream every conversation a user has, so they are cached briefly per user.
+# Entries are keyed on the user's version stamp (the stats ETag): once any worker
+# bumps it, every worker treats its cached stats as stale.
+STATS_CACHE_SECONDS = float(os.environ.get('STATS_CACHE_SECONDS', 300))
+STATS_CACHE_MAX_USERS = int(os.environ.get('STATS_CACHE_MAX_USERS', 1024))
+BOOTSTRAP_SESSION_LIMIT = int(os.environ.get('BOOTSTRAP_SESSION_LIMIT', 20))
+
+# Fields never sent back to the browser
+PRIVATE_USER_FIELDS = ('password_hash',)
+
+# user_id -> (cached at, user version, stats), least recently used first
+_stats_cache = OrderedDict()
+_stats_lock = threading.Lock()
+
+# Firestore calls are blocking I/O; independent reads for one page run side by side here
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('BOOTSTRAP_WORKERS', 8)),
+                               thread_name_prefix='bootstrap')
+
+def _read_in_parallel(fn, *args):
+    """Start `fn` on the read pool in a copy of this request's context, so guest routing follows it"""
+    return _executor.submit(contextvars.copy_context().run, fn, *args)
 
 def get_profile_page():
-    """Render profile page with user data"""
+    """Render profile page with user data; the user and their conversations are read together"""
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
     user_id = session['user_id']
-    
-    # Get user data
-    user_doc = db.collection('users').document(user_id).get()
+    conversations_future = _read_in_parallel(get_user_conversations, user_id, 10)
+    user_doc = get_user(user_id)
+    conversations = conversations_future.result()
     if not user_doc.exists:
         return redirect(url_for('logout'))
     
-    user = user_doc.to_dict()
-    
-    # Get recent conversations
-    conversations = get_user_conversations(user_id, limit=10)
-    
     # Get recent meditation sessions (placeholder)
     meditation_sessions = []
     
-    return render_template('profile.html', user=user, conversations=conversations, meditation_sessions=meditation_sessions)
+    return render_template('profile.html', user=user_doc.to_dict(), conversations=conversations,
+                           meditation_sessions=meditation_sessions)
 
 def update_profile(data):
     """Update user profile information"""
@@ -72,11 +99,15 @@ def update_profile(data):
     if not update_data:
         return {'error': 'No valid fields to update'}, 400
     
+    # Only the fields the user sent; the timestamp and version stamp are internal
+    updated_fields = list(update_data.keys())
     update_data['updated_at'] = datetime.utcnow()
+    update_data['data_version'] = new_stamp()
     
     try:
         update_user_profile(user_id, update_data)
-        return {'message': 'Profile updated successfully', 'updated_fields': list(update_data.keys())}, 200
+        remember_version('user', user_id, update_data['data_version'], user_id)
+        return {'message': 'Profile updated successfully', 'updated_fields': updated_fields}, 200
     except Exception as e:
         print(f"Error updating profile: {e}")
         return {'error': 'Failed to update profile'}, 500
@@ -104,52 +135,103 @@ def update_preferences(preferences):
             filtered_preferences[key] = value
     
     try:
+        version = new_stamp()
         update_user_profile(user_id, {
             'preferences': filtered_preferences,
-            'updated_at': datetime.utcnow()
+            'updated_at': datetime.utcnow(),
+            'data_version': version
         })
+        remember_version('user', user_id, version, user_id)
         return {'message': 'Preferences updated successfully'}, 200
     except Exception as e:
         print(f"Error updating preferences: {e}")
         return {'error': 'Failed to update preferences'}, 500
 
+def compute_profile_statistics(user_id):
+    """Compute profile statistics from the user's daily mood rollups"""
+    # Wellness metrics come from the last STATS_WINDOW_DAYS of rollups, the chat count from all of them
+    return {
+        'total_chats': count_chat_turns(user_id),
+        'day_streak': 7,        # Placeholder
+        'wellness_score': 85,   # Placeholder
+        **recent_summary(user_id)
+    }
+
+def get_cached_statistics(user_id):
+    """Profile statistics for a user, recomputed when their version moves or after STATS_CACHE_SECONDS"""
+    # Read the stamp before the stats, so stats are never cached under a newer stamp than their data
+    version, _ = get_version('user', user_id)
+    with _stats_lock:
+        entry = _stats_cache.get(user_id)
+        if entry is not None:
+            if entry[1] == version and time.monotonic() - entry[0] < STATS_CACHE_SECONDS:
+                _stats_cache.move_to_end(user_id)
+                return entry[2]
+            del _stats_cache[user_id]
+    
+    stats = compute_profile_statistics(user_id)
+    with _stats_lock:
+        _stats_cache[user_id] = (time.monotonic(), version, stats)
+        _stats_cache.move_to_end(user_id)
+        while len(_stats_cache) > STATS_CACHE_MAX_USERS:
+            _stats_cache.popitem(last=False)
+    return stats
+
+def invalidate_profile_statistics(user_id):
+    """Drop a user's cached statistics after activity that changes them"""
+    with _stats_lock:
+        _stats_cache.pop(user_id, None)
+
+def refresh_profile_statistics(user_id):
+    """Recompute a user's cached statistics after activity, if they were cached
+
+    Runs as a background task so the next stats request finds them warm.
+    """
+    with _stats_lock:
+        was_cached = _stats_cache.pop(user_id, None) is not None
+    if was_cached:
+        get_cached_statistics(user_id)
+
 def get_profile_statistics():
     """Get user profile statistics"""
     if 'user_id' not in session:
         return {'error': 'Not authenticated'}, 401
     
+    try:
+        return get_cached_statistics(session['user_id']), 200
+    except Exception as e:
+        print(f"Error getting profile stats: {e}")
+        return {'error': 'Failed to get stats'}, 500
+
+def public_user(user_id, user):
+    """User document fields that are safe to send to the browser"""
+    profile = {key: value for key, value in user.items() if key not in PRIVATE_USER_FIELDS}
+    profile['id'] = user_id
+    return profile
+
+def get_bootstrap_data():
+    """Profile, preferences, first page of sessions and stats for the dashboard's first paint"""
+    if 'user_id' not in session:
+        return {'error': 'Not authenticated'}, 401
+    
     user_id = session['user_id']
     
     try:
-        # Get basic stats
-        basic_stats = get_user_stats(user_id)
-        
-        # Get recent activity for wellness metrics
-        recent_conversations = get_user_conversations(user_id, limit=20)
-        
-        # Calculate average mood from recent conversations
-        mood_scores = []
-        for conv in recent_conversations:
-            emotions = conv.get('emotions', [])
-            for emotion in emotions:
-                if emotion.get('emotion') in ['joy', 'happiness']:
-                    mood_scores.append(8)
-                elif emotion.get('emotion') in ['sadness', 'anger']:
-                    mood_scores.append(3)
-                else:
-                    mood_scores.append(6)
+        # Independent reads: issue them together so the request costs one round trip, not three
+        sessions_future = _read_in_parallel(get_user_chat_sessions, user_id, BOOTSTRAP_SESSION_LIMIT)
+        stats_future = _read_in_parallel(get_cached_statistics, user_id)
         
-        average_mood = sum(mood_scores) / len(mood_scores) if mood_scores else 7.0
+        user_doc = get_user(user_id)
+        if not user_doc.exists:
+            return {'error': 'User not found'}, 404
+        user = user_doc.to_dict()
         
-        stats = {
-            **basic_stats,
-            'average_mood': round(average_mood, 1),
-            'energy_level': 6.8,  # Placeholder
-            'stress_level': 4.2,   # Placeholder
-            'mindful_minutes': 12  # Placeholder
-        }
-        
-        return stats, 200
+        return {
+            'user': public_user(user_id, user),
+            'preferences': user.get('preferences', {}),
+            'sessions': sessions_future.result(),
+            'stats': stats_future.result()
+        }, 200
     except Exception as e:
-        print(f"Error getting profile stats: {e}")
-        return {'error': 'Failed to get stats'}, 500
+        print(f"Error loading bootstrap data: {e}")
+        return {'error': 'Failed to load dashboard data'}, 500
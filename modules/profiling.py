@@ -0,0 +1,122 @@
+"""
+On-demand sampling profiler for individual requests
+
+A request is profiled when it carries `X-Profile: <PROFILE_ADMIN_TOKEN>` or is
+picked by PROFILE_SAMPLE_RATE on one of PROFILE_ENDPOINTS. A background thread
+samples the request thread's stack every few milliseconds and the result is
+written as collapsed stacks (`frame;frame;frame count`), which flamegraph.pl,
+speedscope and inferno all read. With no token and a zero rate nothing runs.
+"""
+from flask import request
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+# Endpoints eligible for random sampling; the admin header works on any route
+PROFILE_ENDPOINTS = set(filter(None, os.environ.get('PROFILE_ENDPOINTS', 'chat,analyze_image_emotion').split(',')))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))
+PROFILE_INTERVAL_SECONDS = float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000
+
+_retention_lock = threading.Lock()
+
+def profiling_enabled():
+    """True if any request could be profiled under the current settings"""
+    return bool(PROFILE_ADMIN_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+def should_profile():
+    """Decide whether the current request is profiled"""
+    header = request.headers.get('X-Profile')
+    if header and PROFILE_ADMIN_TOKEN and hmac.compare_digest(header, PROFILE_ADMIN_TOKEN):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and request.endpoint in PROFILE_ENDPOINTS and random.random() < PROFILE_SAMPLE_RATE
+
+class SamplingProfiler:
+    """Samples one thread's Python stack on a timer and counts collapsed stacks"""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return self
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.duration = time.perf_counter() - self.started_at
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Stacks in collapsed format, one `frames count` line each"""
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+def start_request_profile():
+    """Start profiling the current request thread"""
+    return SamplingProfiler(threading.get_ident()).start()
+
+def _enforce_retention():
+    """Keep only the newest PROFILE_MAX_FILES profiles"""
+    with _retention_lock:
+        entries = [e for e in os.scandir(PROFILE_DIR) if e.name.endswith('.folded')]
+        if len(entries) <= PROFILE_MAX_FILES:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - PROFILE_MAX_FILES]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+def save_request_profile(profiler, route, request_id):
+    """Write a finished profile keyed by route and request id; returns the file name"""
+    profiler.stop()
+    safe_route = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+    safe_id = re.sub(r'[^A-Za-z0-9-]+', '', request_id)[:64] or uuid.uuid4().hex
+    filename = f"{safe_route}-{safe_id}.folded"
+
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, filename), 'w') as f:
+            f.write(profiler.collapsed())
+        _enforce_retention()
+        print(f"🔬 Profiled {route} ({profiler.samples} samples, {profiler.duration * 1000:.0f} ms) -> {filename}")
+    except OSError as e:
+        print(f"Error writing profile: {e}")
+        return None
+
+    return filename
@@ -0,0 +1,140 @@
+"""
+Opt-in cache of Gemini replies for recurring short messages
+
+Many messages recur almost word for word ("I can't sleep", "I'm stressed about
+exams") with the same detected emotion. With RESPONSE_CACHE_ENABLED=true,
+generate_ai_response looks replies up by the normalised message plus its
+emotion context. Optionally, with RESPONSE_CACHE_SIMILARITY set, it also
+accepts a message whose embedding is close enough to a cached one with the
+same emotion context.
+
+Each entry collects RESPONSE_CACHE_VARIANTS replies from Gemini (keeping the
+distinct ones) before it starts answering, then serves one of them at random, so repeat
+visitors don't get the same canned sentence. Entries expire after
+RESPONSE_CACHE_TTL seconds and the least recently used are evicted beyond
+RESPONSE_CACHE_MAX_ENTRIES. Only messages up to RESPONSE_CACHE_MAX_CHARS are
+cached; longer ones are personal enough that a shared reply would be wrong.
+Prompts with recalled memories never use the cache.
+
+The cache is per worker process.
+"""
+from collections import OrderedDict
+import os
+import random
+import re
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from .metrics import Counter, Gauge
+
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 6 * 3600))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 2000))
+RESPONSE_CACHE_VARIANTS = max(1, int(os.environ.get('RESPONSE_CACHE_VARIANTS', 3)))
+RESPONSE_CACHE_MAX_CHARS = int(os.environ.get('RESPONSE_CACHE_MAX_CHARS', 120))
+# Cosine similarity for a semantic match; 0 matches normalised text only
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get('RESPONSE_CACHE_SIMILARITY', 0))
+
+RESPONSE_CACHE_LOOKUPS = Counter(
+    'kinds_speak_response_cache_lookups_total', 'Response cache lookups by result', ('result',)
+)
+RESPONSE_CACHE_ENTRIES = Gauge('kinds_speak_response_cache_entries', 'Entries in the response cache')
+RESPONSE_CACHE_HIT_RATIO = Gauge('kinds_speak_response_cache_hit_ratio', 'Share of cacheable lookups answered from cache')
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+def normalize_message(message):
+    """Case-, accent-width- and punctuation-insensitive form of a message"""
+    text = unicodedata.normalize('NFKC', message).lower().replace('’', "'")
+    text = _PUNCTUATION.sub('', text.replace("'", ''))
+    return ' '.join(text.split())
+
+class _Entry:
+    __slots__ = ('replies', 'generated', 'expires_at', 'vector', 'context')
+
+    def __init__(self, context, vector):
+        self.replies = []
+        self.generated = 0  # Gemini replies seen, including duplicates
+        self.expires_at = time.monotonic() + RESPONSE_CACHE_TTL
+        self.vector = vector
+        self.context = context
+
+class ResponseCache:
+    """LRU of reply variants keyed by (emotion context, normalised message)"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.lookups = 0
+
+    def _live(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        return entry
+
+    def _similar(self, context, vector):
+        """Key of the closest entry with the same context, if above the threshold"""
+        keys = [key for key, entry in self.entries.items()
+                if entry.context == context and entry.vector is not None and entry.generated >= RESPONSE_CACHE_VARIANTS]
+        if not keys:
+            return None
+        scores = np.stack([self.entries[key].vector for key in keys]) @ vector
+        best = int(np.argmax(scores))
+        return keys[best] if scores[best] >= RESPONSE_CACHE_SIMILARITY else None
+
+    def lookup(self, message, context, vector=None):
+        """A cached reply, or None when Gemini should answer"""
+        key = (context, normalize_message(message))
+        with self.lock:
+            result = 'hit'
+            entry = self._live(key)
+            if entry is None and vector is not None and RESPONSE_CACHE_SIMILARITY > 0:
+                similar = self._similar(context, vector)
+                if similar is not None:
+                    key, entry, result = similar, self._live(similar), 'semantic_hit'
+
+            if entry is None:
+                result, reply = 'miss', None
+            elif entry.generated < RESPONSE_CACHE_VARIANTS:
+                # Still collecting variants: Gemini answers and the reply is stored
+                result, reply = 'fill', None
+            else:
+                self.entries.move_to_end(key)
+                reply = random.choice(entry.replies)
+                self.hits += 1
+            self.lookups += 1
+            RESPONSE_CACHE_HIT_RATIO.set(self.hits / self.lookups)
+        RESPONSE_CACHE_LOOKUPS.inc(result=result)
+        return reply
+
+    def store(self, message, context, reply, vector=None):
+        """Keep a fresh Gemini reply as one of the entry's variants"""
+        key = (context, normalize_message(message))
+        with self.lock:
+            entry = self._live(key)
+            if entry is None:
+                entry = self.entries[key] = _Entry(context, vector)
+            entry.generated += 1
+            if reply not in entry.replies and len(entry.replies) < RESPONSE_CACHE_VARIANTS:
+                entry.replies.append(reply)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            RESPONSE_CACHE_ENTRIES.set(len(self.entries))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            RESPONSE_CACHE_ENTRIES.set(0)
+
+response_cache = ResponseCache()
+
+def cacheable(message, memory_context=""):
+    return RESPONSE_CACHE_ENABLED and not memory_context and len(message) <= RESPONSE_CACHE_MAX_CHARS
@@ -0,0 +1,111 @@
+"""
+Fast JSON responses and on-the-fly compression
+
+`json_response` serializes with orjson when it is installed (falling back to
+the standard library), writing datetimes, including Firestore's
+DatetimeWithNanoseconds, as ISO 8601 in UTC. `compress_response` gzip- or
+brotli-encodes larger bodies for clients that accept it.
+"""
+from flask import Response, request
+from datetime import datetime, date
+import gzip
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are not worth a compression pass
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+# Low levels: on a 1,000-message session gzip -6 costs ~3x the time of -4
+# for a few percent fewer bytes (see benchmarks/serialization.py)
+GZIP_LEVEL = 4
+BROTLI_QUALITY = 4
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'text/html', 'text/plain',
+    'text/css', 'text/javascript', 'application/javascript'
+}
+
+def _default(obj):
+    """Serialize types the JSON encoder doesn't know natively"""
+    if isinstance(obj, datetime):
+        # Firestore returns tz-aware UTC; values we wrote ourselves are naive UTC
+        return obj.isoformat() if obj.tzinfo else obj.isoformat() + '+00:00'
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(payload):
+    """Serialize a payload to UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def loads(data):
+    """Parse JSON bytes or text"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_response(payload, status=200):
+    """Build a JSON response using the fast encoder"""
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+def _accepted_encodings():
+    """Content codings the client accepts (q=0 entries excluded)"""
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def accepts_encoding(coding):
+    """Whether the client accepts a given content coding"""
+    return coding in _accepted_encodings()
+
+def choose_encoding():
+    """Best content coding for the current request, or None"""
+    accepted = _accepted_encodings()
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+def compress_bytes(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def compress_response(response):
+    """after_request hook: compress eligible bodies for clients that accept it"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    response.set_data(compress_bytes(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
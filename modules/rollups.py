@@ -0,0 +1,262 @@
+"""
+Per-user daily mood rollups and downsampled mood time series
+
+Each chat turn and each completed meditation adds to one document per user
+per UTC day in `mood_rollups`. A document holds turn and emotion counts,
+mood/energy/stress score sums and meditation minutes. Deleting a chat turn
+takes its increments back out. Profile stats (including the lifetime turn
+count) and the mood series are computed from these documents alone, so
+neither reads raw conversations.
+
+    flask --app app backfill-rollups    # rebuild rollups from existing history
+"""
+from datetime import datetime, date, timedelta
+from collections import defaultdict
+import numpy as np
+from google.cloud.firestore import Increment
+
+from .database import db
+from .emotion_vectors import decode_conversation
+from .metrics import DB_OPERATION_SECONDS, timed
+
+ROLLUP_COLLECTION = 'mood_rollups'
+
+# label -> (mood, energy, stress) on a 0-10 scale. Mood keeps the scale the
+# profile stats have always used: joy/happiness 8, sadness/anger 3, others 6
+EMOTION_SCORES = {
+    'anger': (3, 7, 8),
+    'anticipation': (6, 7, 5),
+    'disgust': (6, 5, 6),
+    'fear': (6, 4, 8),
+    'joy': (8, 8, 2),
+    'happiness': (8, 7, 2),
+    'love': (6, 6, 2),
+    'optimism': (6, 7, 3),
+    'pessimism': (6, 3, 6),
+    'sadness': (3, 2, 6),
+    'surprise': (6, 7, 4),
+    'trust': (6, 5, 2),
+}
+DEFAULT_SCORES = (6, 5, 5)
+
+DEFAULT_MOOD = 7.0
+STATS_WINDOW_DAYS = 30
+DEFAULT_SERIES_DAYS = 30
+# Ranges longer than this default to weekly buckets
+AUTO_WEEKLY_DAYS = 92
+MAX_SERIES_DAYS = 731
+
+SUM_FIELDS = ('turns', 'score_count', 'mood_sum', 'energy_sum', 'stress_sum',
+              'meditation_minutes', 'meditation_count')
+
+def rollup_id(user_id, day):
+    return f"{user_id}_{day.isoformat()}"
+
+def turn_increments(emotions, dominant_emotion):
+    """Rollup field increments for one chat turn"""
+    mood = energy = stress = 0
+    for emotion in emotions:
+        m, e, s = EMOTION_SCORES.get(emotion.get('emotion'), DEFAULT_SCORES)
+        mood += m
+        energy += e
+        stress += s
+
+    return {
+        'turns': 1,
+        'score_count': len(emotions),
+        'mood_sum': mood,
+        'energy_sum': energy,
+        'stress_sum': stress,
+        f'emotion_counts.{dominant_emotion}': 1,
+    }
+
+def _add_increments(batch, user_id, day, increments):
+    """Queue additions to a day's rollup on `batch`, creating the rollup on first write"""
+    ref = db.collection(ROLLUP_COLLECTION).document(rollup_id(user_id, day))
+    batch.set(ref, {'user_id': user_id, 'date': day.isoformat()}, merge=True)
+    batch.update(ref, {field: Increment(value) for field, value in increments.items()})
+
+@timed(DB_OPERATION_SECONDS, operation='update_rollup')
+def _increment_rollup(user_id, day, increments):
+    """Add to a day's rollup, creating it on first write, in one atomic batch"""
+    batch = db.batch()
+    _add_increments(batch, user_id, day, increments)
+    batch.commit()
+
+def record_chat_turn(user_id, emotions, dominant_emotion, when=None):
+    """Fold a chat turn's emotions into today's rollup"""
+    day = (when or datetime.utcnow()).date()
+    _increment_rollup(user_id, day, turn_increments(emotions, dominant_emotion))
+
+def remove_chat_turn(user_id, conversation, batch):
+    """Queue taking a deleted chat turn back out of its day's rollup on `batch`
+
+    Commit it in the same batch as the delete, so a retried deletion never
+    subtracts a turn twice.
+    """
+    if not conversation.get('timestamp'):
+        return
+    increments = turn_increments(conversation.get('emotions') or [], conversation.get('dominant_emotion', 'neutral'))
+    _add_increments(batch, user_id, conversation['timestamp'].date(),
+                    {field: -value for field, value in increments.items()})
+
+def record_meditation(user_id, minutes, when=None):
+    """Fold a completed meditation into today's rollup"""
+    day = (when or datetime.utcnow()).date()
+    _increment_rollup(user_id, day, {'meditation_minutes': minutes, 'meditation_count': 1})
+
+@timed(DB_OPERATION_SECONDS, operation='get_rollups')
+def get_rollups(user_id, start, end):
+    """Rollup documents for a user between two dates, inclusive"""
+    query = (db.collection(ROLLUP_COLLECTION)
+             .where('user_id', '==', user_id)
+             .where('date', '>=', start.isoformat())
+             .where('date', '<=', end.isoformat())
+             .order_by('date'))
+    return [doc.to_dict() for doc in query.stream()]
+
+@timed(DB_OPERATION_SECONDS, operation='count_chat_turns')
+def count_chat_turns(user_id):
+    """A user's chat turns over all time, summed from their rollups (one small document per active day)"""
+    query = db.collection(ROLLUP_COLLECTION).where('user_id', '==', user_id).select(['turns'])
+    return sum(doc.to_dict().get('turns', 0) for doc in query.stream())
+
+def _ratio(total, count):
+    return round(total / count, 1) if count else None
+
+def summarize_rollups(rollups):
+    """Mood, energy, stress and mindfulness figures over a set of rollups"""
+    totals = {field: sum(r.get(field, 0) for r in rollups) for field in SUM_FIELDS}
+    count = totals['score_count']
+    return {
+        'average_mood': _ratio(totals['mood_sum'], count) or DEFAULT_MOOD,
+        'energy_level': _ratio(totals['energy_sum'], count),
+        'stress_level': _ratio(totals['stress_sum'], count),
+        'mindful_minutes': totals['meditation_minutes'],
+        'meditation_count': totals['meditation_count'],
+    }
+
+def recent_summary(user_id, days=STATS_WINDOW_DAYS):
+    """Summary of a user's rollups over the last `days` days"""
+    today = datetime.utcnow().date()
+    return summarize_rollups(get_rollups(user_id, today - timedelta(days=days - 1), today))
+
+def mood_series(user_id, start, end, bucket='day'):
+    """Daily or weekly buckets of mood, energy, stress and meditation over a date range"""
+    # Weekly buckets start on Monday
+    origin = start - timedelta(days=start.weekday()) if bucket == 'week' else start
+    width = 7 if bucket == 'week' else 1
+    n_buckets = (end - origin).days // width + 1
+
+    rollups = get_rollups(user_id, start, end)
+    index = np.array([(date.fromisoformat(r['date']) - origin).days // width for r in rollups], dtype=np.intp)
+
+    totals = {
+        field: np.bincount(index, weights=np.array([r.get(field, 0) for r in rollups], dtype=np.float64),
+                           minlength=n_buckets)
+        for field in SUM_FIELDS
+    }
+
+    labels = sorted({label for r in rollups for label in r.get('emotion_counts', {})})
+    emotion_counts = np.zeros((n_buckets, len(labels)))
+    if labels:
+        per_day = np.array([[r.get('emotion_counts', {}).get(label, 0) for label in labels] for r in rollups],
+                           dtype=np.float64)
+        np.add.at(emotion_counts, index, per_day)
+
+    count = totals['score_count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = {
+            name: np.where(count > 0, totals[field] / count, np.nan)
+            for name, field in (('average_mood', 'mood_sum'), ('energy_level', 'energy_sum'),
+                                ('stress_level', 'stress_sum'))
+        }
+
+    has_emotions = emotion_counts.sum(axis=1) > 0
+    dominant = emotion_counts.argmax(axis=1) if labels else np.zeros(n_buckets, dtype=np.intp)
+
+    buckets = []
+    for i in range(n_buckets):
+        bucket_start = origin + timedelta(days=i * width)
+        buckets.append({
+            'start': max(bucket_start, start).isoformat(),
+            'end': min(bucket_start + timedelta(days=width - 1), end).isoformat(),
+            'turns': int(totals['turns'][i]),
+            **{name: (None if np.isnan(values[i]) else round(float(values[i]), 2))
+               for name, values in averages.items()},
+            'meditation_minutes': float(totals['meditation_minutes'][i]),
+            'dominant_emotion': labels[dominant[i]] if has_emotions[i] else None,
+        })
+    return buckets
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be a date in YYYY-MM-DD format")
+
+def get_mood_series(user_id, args):
+    """Validate query arguments and build the mood series for a user"""
+    try:
+        end = _parse_date(args['end'], 'end') if args.get('end') else datetime.utcnow().date()
+        start = _parse_date(args['start'], 'start') if args.get('start') else end - timedelta(days=DEFAULT_SERIES_DAYS - 1)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+    days = (end - start).days + 1
+    if days < 1:
+        return {'error': "'start' must not be after 'end'"}, 400
+    if days > MAX_SERIES_DAYS:
+        return {'error': f'Range cannot exceed {MAX_SERIES_DAYS} days'}, 400
+
+    bucket = args.get('bucket') or ('week' if days > AUTO_WEEKLY_DAYS else 'day')
+    if bucket not in ('day', 'week'):
+        return {'error': "'bucket' must be 'day' or 'week'"}, 400
+
+    try:
+        buckets = mood_series(user_id, start, end, bucket)
+        return {'start': start.isoformat(), 'end': end.isoformat(), 'bucket': bucket, 'buckets': buckets}, 200
+    except Exception as e:
+        print(f"Error building mood series: {e}")
+        return {'error': 'Failed to build mood series'}, 500
+
+def backfill_rollups(user_id=None):
+    """Rebuild rollups from stored conversations and completed meditations"""
+    from .wellness import meditation_minutes
+    rollups = defaultdict(lambda: defaultdict(int))
+
+    conversations = db.collection('conversations')
+    if user_id:
+        conversations = conversations.where('user_id', '==', user_id)
+    for doc in conversations.stream():
+        conv = decode_conversation(doc.to_dict())
+        if not conv.get('timestamp') or not conv.get('user_id'):
+            continue
+        increments = turn_increments(conv.get('emotions') or [], conv.get('dominant_emotion', 'neutral'))
+        target = rollups[(conv['user_id'], conv['timestamp'].date())]
+        for field, value in increments.items():
+            target[field] += value
+
+    meditations = db.collection('meditation_sessions').where('completed', '==', True)
+    if user_id:
+        meditations = meditations.where('user_id', '==', user_id)
+    for doc in meditations.stream():
+        meditation = doc.to_dict()
+        finished = meditation.get('completed_at') or meditation.get('started_at')
+        if not finished or not meditation.get('user_id'):
+            continue
+        target = rollups[(meditation['user_id'], finished.date())]
+        target['meditation_minutes'] += meditation_minutes(meditation.get('duration'))
+        target['meditation_count'] += 1
+
+    for (owner, day), fields in rollups.items():
+        data = {'user_id': owner, 'date': day.isoformat(), 'emotion_counts': {}}
+        for field, value in fields.items():
+            if field.startswith('emotion_counts.'):
+                data['emotion_counts'][field.split('.', 1)[1]] = value
+            else:
+                data[field] = value
+        db.collection(ROLLUP_COLLECTION).document(rollup_id(owner, day)).set(data)
+
+    print(f"📈 Rebuilt {len(rollups)} daily rollups")
+    return len(rollups)
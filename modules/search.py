@@ -0,0 +1,341 @@
+"""
+Per-user full-text search over conversation history
+
+Each user has an inverted index: lowercased word tokens mapped to the
+messages that contain them, with token positions. Results are ranked with BM25.
+Quoted phrases must appear as consecutive tokens.
+
+The index is persisted as an append-only journal per user under
+SEARCH_INDEX_DIR, one JSON line per added message or deleted session/message.
+Added lines keep the message and response text, which results and snippets
+are built from, so a search never reads Firestore; the postings are rebuilt
+from that text on load rather than stored. Workers load it lazily and replay only the journal tail
+written since their last read, so every worker stays current without
+re-reading history. Once enough records are dead, the journal is compacted
+(rewritten with live messages only) through an atomic rename. Appends,
+compaction and rebuilds hold a lock on the user's lock file, so a line
+another worker appends can't land in a journal that is being replaced.
+
+    flask --app app rebuild-search-index [--user <id>]
+"""
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import json
+import math
+import os
+import re
+import secrets
+import shutil
+import threading
+
+from .database import db
+from .filelock import open_locked, release
+from .metrics import Histogram
+from .responses import dumps
+
+SEARCH_INDEX_DIR = os.environ.get('SEARCH_INDEX_DIR', 'search_index')
+# Per-user indexes kept in memory per worker (least recently used are dropped)
+SEARCH_MAX_LOADED_USERS = int(os.environ.get('SEARCH_MAX_LOADED_USERS', 256))
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+SNIPPET_CHARS = 160
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Compact once dead records outnumber live ones (and there are enough to matter)
+COMPACT_MIN_DEAD = 200
+
+SEARCH_QUERY_SECONDS = Histogram('kinds_speak_search_query_seconds', 'Conversation search latency')
+
+_TOKEN = re.compile(r'[^\W_]+')
+_PHRASE = re.compile(r'"([^"]+)"')
+
+def tokenize(text):
+    return [match.group(0).lower() for match in _TOKEN.finditer(text or '')]
+
+def _user_dir(user_id):
+    # Hashed so arbitrary ids are always safe path components
+    return os.path.join(SEARCH_INDEX_DIR, hashlib.sha256(user_id.encode('utf-8')).hexdigest()[:32])
+
+class UserIndex:
+    """One user's in-memory inverted index, synchronised with their journal"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.dir = _user_dir(user_id)
+        self.path = os.path.join(self.dir, 'journal.ndjson')
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.docs = {}          # doc id -> {session_id, timestamp, message, response, length}
+        self.postings = {}      # term -> {doc id: [positions]}
+        self.total_length = 0
+        self.dead = 0
+        self.offset = 0
+        self.inode = None
+        self.head = None        # the journal's first line, to tell a reused inode from ours
+
+    # Index maintenance
+
+    def _add(self, record):
+        doc_id = record['id']
+        if doc_id in self.docs:
+            self._remove(doc_id)
+        tokens = tokenize(record.get('message')) + tokenize(record.get('response'))
+        for position, term in enumerate(tokens):
+            self.postings.setdefault(term, {}).setdefault(doc_id, []).append(position)
+        self.docs[doc_id] = {
+            'session_id': record.get('session_id'),
+            'timestamp': record.get('timestamp'),
+            'message': record.get('message', ''),
+            'response': record.get('response', ''),
+            'length': len(tokens),
+        }
+        self.total_length += len(tokens)
+
+    def _remove(self, doc_id):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        self.total_length -= doc['length']
+        self.dead += 1
+        for term in set(tokenize(doc['message']) + tokenize(doc['response'])):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def _apply(self, record):
+        op = record.get('op')
+        if op == 'add':
+            self._add(record)
+        elif op == 'delete':
+            self._remove(record['id'])
+        elif op == 'delete_session':
+            for doc_id in [d for d, doc in self.docs.items() if doc['session_id'] == record['session_id']]:
+                self._remove(doc_id)
+            self.dead += 1
+
+    # Journal
+
+    def _flock(self):
+        os.makedirs(self.dir, exist_ok=True)
+        return open_locked(os.path.join(self.dir, 'lock'))
+
+    def refresh(self):
+        """Replay journal records written since the last read (by any worker)"""
+        with self.lock:
+            try:
+                f = open(self.path, 'rb')
+            except FileNotFoundError:
+                if self.inode is not None:
+                    self._reset()
+                return
+            with f:
+                # Stat the file actually opened, in case it was swapped in between
+                stat = os.fstat(f.fileno())
+                if (stat.st_ino != self.inode or stat.st_size < self.offset
+                        or (self.head is not None and f.read(len(self.head)) != self.head)):
+                    # Compacted or replaced by another worker: start over
+                    self._reset()
+                    self.inode = stat.st_ino
+                if stat.st_size == self.offset:
+                    return
+                f.seek(self.offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # a record still being written
+                    if self.offset == 0:
+                        self.head = line
+                    self.offset += len(line)
+                    self._apply(json.loads(line))
+
+    def append(self, record):
+        """Write a record to the journal and apply it"""
+        with self.lock:
+            handle = self._flock()
+            try:
+                line = dumps(record) + b'\n'
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                try:
+                    os.write(fd, line)
+                finally:
+                    os.close(fd)
+                self.refresh()
+                if self.dead > COMPACT_MIN_DEAD and self.dead > len(self.docs):
+                    self._rewrite(self._live_records())
+            finally:
+                release(handle)
+
+    def compact(self):
+        """Rewrite the journal with only live messages"""
+        with self.lock:
+            handle = self._flock()
+            try:
+                self.refresh()
+                self._rewrite(self._live_records())
+            finally:
+                release(handle)
+
+    def replace(self, records):
+        """Replace the whole journal, e.g. after a rebuild"""
+        with self.lock:
+            handle = self._flock()
+            try:
+                self._rewrite(records)
+            finally:
+                release(handle)
+
+    def _live_records(self):
+        return [{'op': 'add', 'id': doc_id, 'session_id': doc['session_id'], 'timestamp': doc['timestamp'],
+                 'message': doc['message'], 'response': doc['response']} for doc_id, doc in self.docs.items()]
+
+    def _rewrite(self, records):
+        """Atomically swap in a journal holding `records`; the caller holds the lock"""
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            # A fresh first line marks the new journal even if the filesystem reuses an old inode
+            f.write(dumps({'op': 'generation', 'id': secrets.token_hex(8)}) + b'\n')
+            for record in records:
+                f.write(dumps(record) + b'\n')
+        os.replace(temp_path, self.path)
+        self._reset()
+        self.refresh()
+
+    # Querying
+
+    def search(self, query, page=1, per_page=SEARCH_PAGE_SIZE):
+        """BM25-ranked matches for a query; quoted phrases must match exactly"""
+        with self.lock:
+            self.refresh()
+            phrases = [tokenize(p) for p in _PHRASE.findall(query)]
+            terms = list(dict.fromkeys(tokenize(query)))
+            if not terms or not self.docs:
+                return 0, []
+
+            n_docs = len(self.docs)
+            avg_length = self.total_length / n_docs if n_docs else 0
+            scores = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, positions in postings.items():
+                    tf = len(positions)
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.docs[doc_id]['length'] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+            for phrase in phrases:
+                scores = {doc_id: score for doc_id, score in scores.items() if self._has_phrase(doc_id, phrase)}
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            start = (page - 1) * per_page
+            results = [self._result(doc_id, score, terms) for doc_id, score in ranked[start:start + per_page]]
+            return len(ranked), results
+
+    def _has_phrase(self, doc_id, phrase):
+        if not phrase:
+            return True
+        starts = self.postings.get(phrase[0], {}).get(doc_id, [])
+        following = [set(self.postings.get(term, {}).get(doc_id, [])) for term in phrase[1:]]
+        return any(all(start + i + 1 in positions for i, positions in enumerate(following)) for start in starts)
+
+    def _result(self, doc_id, score, terms):
+        doc = self.docs[doc_id]
+        return {
+            'id': doc_id,
+            'session_id': doc['session_id'],
+            'timestamp': doc['timestamp'],
+            'message': doc['message'],
+            'snippet': _snippet(doc['message'] + '\n' + doc['response'], terms),
+            'score': round(score, 4),
+        }
+
+def _snippet(text, terms):
+    """A window of text around the first query term"""
+    lowered = text.lower()
+    hits = [i for i in (lowered.find(term) for term in terms) if i >= 0]
+    start = max(0, min(hits) - SNIPPET_CHARS // 4) if hits else 0
+    snippet = text[start:start + SNIPPET_CHARS].replace('\n', ' ')
+    return ('…' if start else '') + snippet + ('…' if start + SNIPPET_CHARS < len(text) else '')
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def get_index(user_id):
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            index = _indexes[user_id] = UserIndex(user_id)
+            while len(_indexes) > SEARCH_MAX_LOADED_USERS:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(user_id)
+        return index
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def index_conversation(user_id, doc_id, conversation):
+    """Add a saved conversation turn to the user's index"""
+    get_index(user_id).append({
+        'op': 'add', 'id': doc_id, 'session_id': conversation.get('session_id'),
+        'timestamp': _iso(conversation.get('timestamp')),
+        'message': conversation.get('message', ''), 'response': conversation.get('response', ''),
+    })
+
+def remove_session(user_id, session_id):
+    """Drop a deleted session's messages from the user's index"""
+    get_index(user_id).append({'op': 'delete_session', 'session_id': session_id})
+
+def drop_user_index(user_id):
+    """Delete a user's index entirely (e.g. when the account is removed)"""
+    with _indexes_lock:
+        _indexes.pop(user_id, None)
+    shutil.rmtree(_user_dir(user_id), ignore_errors=True)
+
+def search_conversations(user_id, args):
+    """Validate ?q=&page=&per_page= and run a search for a user"""
+    query = (args.get('q') or '').strip()
+    if not query:
+        return {'error': "Query parameter 'q' is required"}, 400
+    try:
+        page = max(1, int(args.get('page', 1)))
+        per_page = min(SEARCH_MAX_PAGE_SIZE, max(1, int(args.get('per_page', SEARCH_PAGE_SIZE))))
+    except ValueError:
+        return {'error': "'page' and 'per_page' must be integers"}, 400
+
+    try:
+        with SEARCH_QUERY_SECONDS.time():
+            total, results = get_index(user_id).search(query, page, per_page)
+        return {'query': query, 'page': page, 'per_page': per_page, 'total': total, 'results': results}, 200
+    except Exception as e:
+        print(f"Error searching conversations: {e}")
+        return {'error': 'Search failed'}, 500
+
+def rebuild_index(user_id=None):
+    """Rebuild journals from Firestore conversations (all users, or one)"""
+    conversations = db.collection('conversations')
+    if user_id:
+        conversations = conversations.where('user_id', '==', user_id)
+
+    records = {}
+    for doc in conversations.stream():
+        data = doc.to_dict()
+        if data.get('user_id'):
+            records.setdefault(data['user_id'], []).append({
+                'op': 'add', 'id': doc.id, 'session_id': data.get('session_id'),
+                'timestamp': _iso(data.get('timestamp')),
+                'message': data.get('message', ''), 'response': data.get('response', ''),
+            })
+
+    for owner, owner_records in records.items():
+        get_index(owner).replace(owner_records)
+    print(f"🔎 Rebuilt search indexes for {len(records)} users")
+    return len(records)
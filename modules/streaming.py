@@ -0,0 +1,172 @@
+"""
+Real-time camera emotion streaming over WebSocket
+
+Clients push binary JPEG frames and receive JSON results. Each connection
+holds at most one pending frame: a newer frame replaces an unprocessed one
+instead of queueing behind the model, so a slow server never builds a backlog.
+
+A connection holds one of the worker's request threads for its whole life.
+Each worker accepts at most STREAM_MAX_CONNECTIONS streams, and gunicorn.conf.py
+adds that many threads on top of WORKER_THREADS, so open streams never take
+the threads that serve plain HTTP. Streams over the cap are closed with 1013
+(try again later), and the dashboard falls back to HTTP polling.
+"""
+from flask import session, request
+from urllib.parse import urlparse
+import threading
+import json
+import os
+import time
+from .emotions import detect_image_emotions_from_bytes
+from .capture import next_capture_config, track_inference
+from .metrics import Counter, Gauge, Histogram
+from .admission import get_controller, Rejected
+
+# Frames larger than this are rejected without being decoded
+MAX_FRAME_BYTES = 2 * 1024 * 1024
+# Open streams per worker process; gunicorn.conf.py reserves a thread for each
+STREAM_MAX_CONNECTIONS = int(os.environ.get('STREAM_MAX_CONNECTIONS', 16))
+
+STREAM_CONNECTIONS = Gauge('kinds_speak_emotion_stream_connections', 'Open emotion stream connections')
+STREAM_REFUSED = Counter(
+    'kinds_speak_emotion_stream_refused_total', 'Emotion stream connections refused because the worker was full'
+)
+STREAM_FRAMES = Counter(
+    'kinds_speak_emotion_stream_frames_total',
+    'Emotion stream frames by outcome (received, dropped as stale, rejected, shed, processed)',
+    ('outcome',)
+)
+STREAM_QUEUE_WAIT_SECONDS = Histogram(
+    'kinds_speak_emotion_stream_queue_wait_seconds',
+    'Time a frame waited in its connection slot before inference'
+)
+STREAM_FRAME_SECONDS = Histogram(
+    'kinds_speak_emotion_stream_frame_seconds',
+    'Per-frame latency from receipt to result (queue wait plus inference)'
+)
+
+class LatestFrameSlot:
+    """Single-slot mailbox that only ever holds the most recent frame"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._received_at = None
+        self._closed = False
+
+    def put(self, frame):
+        """Store a frame, returning True if an unprocessed frame was replaced"""
+        with self._cond:
+            replaced = self._frame is not None
+            self._frame = frame
+            self._received_at = time.perf_counter()
+            self._cond.notify()
+            return replaced
+
+    def take(self):
+        """Block until a frame is available; returns (None, None) once closed"""
+        with self._cond:
+            while self._frame is None and not self._closed:
+                self._cond.wait()
+            if self._frame is None:
+                return None, None
+            frame, received_at = self._frame, self._received_at
+            self._frame = None
+            self._received_at = None
+            return frame, received_at
+
+    def close(self):
+        """Wake up the consumer and stop accepting frames"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+_stream_slots = threading.BoundedSemaphore(STREAM_MAX_CONNECTIONS)
+
+def is_same_origin():
+    """Reject cross-site WebSocket handshakes that would ride on the session cookie"""
+    origin = request.headers.get('Origin')
+    if not origin:
+        return True
+    return urlparse(origin).netloc == request.host
+
+def _receive_frames(ws, slot):
+    """Drain incoming messages into the single-frame slot"""
+    try:
+        while True:
+            message = ws.receive()
+            if message is None:
+                break
+            if not isinstance(message, (bytes, bytearray)):
+                # Text messages are reserved for control; nothing to do yet
+                continue
+
+            STREAM_FRAMES.inc(outcome='received')
+            if len(message) > MAX_FRAME_BYTES:
+                STREAM_FRAMES.inc(outcome='rejected')
+                continue
+
+            if slot.put(bytes(message)):
+                STREAM_FRAMES.inc(outcome='dropped')
+    except Exception:
+        # Connection closed by the client or the server
+        pass
+    finally:
+        slot.close()
+
+def handle_emotion_stream(ws):
+    """Serve one emotion stream connection until the client disconnects"""
+    if 'user_id' not in session or not is_same_origin():
+        ws.close(reason=1008, message='Not authenticated')
+        return
+
+    if not _stream_slots.acquire(blocking=False):
+        STREAM_REFUSED.inc()
+        ws.close(reason=1013, message='Too many streams, use HTTP')
+        return
+
+    user_id = session['user_id']
+    admission = get_controller('inference')
+    slot = LatestFrameSlot()
+    reader = threading.Thread(target=_receive_frames, args=(ws, slot), daemon=True)
+    reader.start()
+    STREAM_CONNECTIONS.inc()
+
+    try:
+        while True:
+            frame, received_at = slot.take()
+            if frame is None:
+                break
+
+            # Stream frames share the image-inference rate and concurrency limits
+            try:
+                admitted_at = admission.acquire(user_id)
+            except Rejected as rejected:
+                STREAM_FRAMES.inc(outcome='shed')
+                ws.send(json.dumps({'type': 'throttled', 'reason': rejected.reason, 'retry_after': rejected.retry_after}))
+                continue
+
+            started_at = time.perf_counter()
+            try:
+                with track_inference():
+                    result = detect_image_emotions_from_bytes(frame)
+            finally:
+                admission.release(admitted_at)
+            finished_at = time.perf_counter()
+
+            STREAM_FRAMES.inc(outcome='processed')
+            STREAM_QUEUE_WAIT_SECONDS.observe(started_at - received_at)
+            STREAM_FRAME_SECONDS.observe(finished_at - received_at)
+
+            ws.send(json.dumps({
+                'type': 'result',
+                **result,
+                'latency_ms': round((finished_at - received_at) * 1000, 1),
+                'capture': next_capture_config(user_id, result['dominant_emotion'])
+            }))
+    except Exception as e:
+        print(f"Emotion stream closed: {e}")
+    finally:
+        slot.close()
+        STREAM_CONNECTIONS.dec()
+        _stream_slots.release()
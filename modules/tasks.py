@@ -0,0 +1,199 @@
+"""
+In-process background tasks for work that doesn't need to finish before the response
+
+    defer(fn, *args, priority=NORMAL, retries=0, name=None, **kwargs)
+
+Tasks wait in a bounded priority queue and run on TASK_WORKERS threads per
+worker process. Each runs in a fresh context that carries only the caller's
+database routing (e.g. in-memory guests). The Flask request, session and app
+context are not available, so pass ids explicitly, and a queued task doesn't
+keep its finished request alive.
+
+A failing task is retried up to `retries` times with exponential backoff. Only
+ask for retries when the work is idempotent: a Firestore Increment that times
+out may still have been applied.
+
+When the queue is full, or after shutdown has begun, defer runs the task inline,
+so work is delayed but never dropped. shutdown_tasks drains the queue for up to
+TASK_DRAIN_SECONDS (gunicorn calls it in worker_exit). TASK_MODE=sync runs every
+task inline at the call site, for tests and scripts.
+"""
+import atexit
+import contextvars
+import itertools
+import os
+import queue
+import random
+import threading
+import time
+
+from .database import db
+from .metrics import Counter, Gauge, Histogram
+
+TASK_MODE = os.environ.get('TASK_MODE', 'thread')  # thread or sync
+TASK_WORKERS = int(os.environ.get('TASK_WORKERS', 2))
+TASK_QUEUE_SIZE = int(os.environ.get('TASK_QUEUE_SIZE', 1000))
+TASK_RETRY_BACKOFF = float(os.environ.get('TASK_RETRY_BACKOFF', 0.5))
+TASK_DRAIN_SECONDS = float(os.environ.get('TASK_DRAIN_SECONDS', 20))
+
+# Lower runs first
+HIGH = 0
+NORMAL = 5
+LOW = 9
+
+TASKS = Counter('kinds_speak_tasks_total', 'Background tasks by outcome', ('task', 'result'))
+TASK_QUEUE_DEPTH = Gauge('kinds_speak_task_queue_depth', 'Background tasks waiting to run')
+TASK_WAIT_SECONDS = Histogram('kinds_speak_task_wait_seconds', 'Time background tasks spend queued', ('task',))
+TASK_RUN_SECONDS = Histogram('kinds_speak_task_run_seconds', 'Background task run time', ('task', 'status'))
+
+def _routing_context():
+    """A fresh context holding only the current database routing"""
+    context = contextvars.Context()
+    client = db.routed_client()
+    if client is not None:
+        context.run(db.route_to, client)
+    return context
+
+class _Task:
+    __slots__ = ('fn', 'args', 'kwargs', 'name', 'priority', 'retries', 'attempt', 'context', 'queued_at')
+
+    def __init__(self, fn, args, kwargs, name, priority, retries):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.name = name or getattr(fn, '__name__', 'task')
+        self.priority = priority
+        self.retries = retries
+        self.attempt = 0
+        self.context = _routing_context()
+        self.queued_at = time.perf_counter()
+
+    def run(self):
+        """One attempt; True on success"""
+        self.attempt += 1
+        status = 'ok'
+        started = time.perf_counter()
+        try:
+            self.context.copy().run(self.fn, *self.args, **self.kwargs)
+            return True
+        except Exception as e:
+            status = 'error'
+            print(f"⚠️  Background task {self.name} failed (attempt {self.attempt}): {e}")
+            return False
+        finally:
+            TASK_RUN_SECONDS.observe(time.perf_counter() - started, task=self.name, status=status)
+
+    def backoff(self):
+        return TASK_RETRY_BACKOFF * 2 ** (self.attempt - 1) * random.uniform(0.8, 1.2)
+
+_queue = None
+_workers = []
+_pid = None
+_accepting = False
+_sequence = itertools.count()
+_lock = threading.Lock()
+
+def _enqueue(task):
+    _queue.put_nowait((task.priority, next(_sequence), task))
+    TASK_QUEUE_DEPTH.set(_queue.qsize())
+
+def _finish(task, succeeded):
+    if succeeded:
+        TASKS.inc(task=task.name, result='ok')
+    elif task.attempt <= task.retries:
+        TASKS.inc(task=task.name, result='retried')
+        return False
+    else:
+        TASKS.inc(task=task.name, result='failed')
+    return True
+
+def _run_inline(task):
+    while not _finish(task, task.run()):
+        if TASK_MODE != 'sync':
+            time.sleep(task.backoff())
+
+def _retry_later(task):
+    """Re-queue a failed task after its backoff (or at once while draining)"""
+    def requeue():
+        if not _accepting:
+            _run_inline(task)
+            return
+        try:
+            _enqueue(task)
+        except queue.Full:
+            _run_inline(task)
+
+    if not _accepting:
+        # Draining: finish the retries on this worker instead of behind the stop sentinels
+        _run_inline(task)
+        return
+    timer = threading.Timer(task.backoff(), requeue)
+    timer.daemon = True
+    timer.start()
+
+def _work():
+    while True:
+        _, _, task = _queue.get()
+        TASK_QUEUE_DEPTH.set(_queue.qsize())
+        try:
+            if task is None:
+                return
+            if task.attempt == 0:
+                TASK_WAIT_SECONDS.observe(time.perf_counter() - task.queued_at, task=task.name)
+            if not _finish(task, task.run()):
+                _retry_later(task)
+        finally:
+            _queue.task_done()
+
+def _start():
+    """Start this process's workers (once per process; threads don't survive fork)"""
+    global _queue, _workers, _pid, _accepting
+    with _lock:
+        if _pid == os.getpid():
+            return
+        _queue = queue.PriorityQueue(maxsize=TASK_QUEUE_SIZE)
+        _workers = [threading.Thread(target=_work, name=f'tasks-{i}', daemon=True) for i in range(TASK_WORKERS)]
+        for worker in _workers:
+            worker.start()
+        _pid = os.getpid()
+        _accepting = True
+
+def defer(fn, *args, priority=NORMAL, retries=0, name=None, **kwargs):
+    """Run fn(*args, **kwargs) after the response, on a background worker"""
+    task = _Task(fn, args, kwargs, name, priority, retries)
+    if TASK_MODE == 'sync' or TASK_WORKERS <= 0:
+        _run_inline(task)
+        return
+    if _pid != os.getpid():
+        _start()
+    if not _accepting:
+        TASKS.inc(task=task.name, result='inline')
+        _run_inline(task)
+        return
+    try:
+        _enqueue(task)
+    except queue.Full:
+        # Backpressure: the request pays for its own work instead of losing it
+        TASKS.inc(task=task.name, result='inline')
+        _run_inline(task)
+
+def shutdown_tasks(timeout=TASK_DRAIN_SECONDS):
+    """Stop accepting tasks and let queued ones finish, for up to `timeout` seconds"""
+    global _accepting
+    if _pid != os.getpid() or not _accepting:
+        return
+    _accepting = False
+    deadline = time.monotonic() + timeout
+    try:
+        # Sentinels sort after every real task
+        for _ in _workers:
+            _queue.put((float('inf'), next(_sequence), None), timeout=max(0.01, deadline - time.monotonic()))
+    except queue.Full:
+        pass
+    for worker in _workers:
+        worker.join(max(0, deadline - time.monotonic()))
+    left = sum(1 for _, _, task in list(_queue.queue) if task is not None)
+    if left:
+        print(f"⚠️  {left} background tasks were still queued at shutdown")
+
+atexit.register(shutdown_tasks)
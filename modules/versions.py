@@ -0,0 +1,125 @@
+"""
+Version stamps and conditional GET for per-user data
+
+Each user document carries a `data_version` stamp and each chat session a
+`version` stamp. A stamp is replaced on every write that changes what the
+user sees: a chat turn, a profile update, or a deleted session. List endpoints
+use the stamp as their ETag. When a client revalidates with If-None-Match, the
+endpoint answers 304 after a single version lookup, without reading
+conversations.
+
+Stamps are cached in-process. Writes made by this worker update the cache
+immediately. Writes made by other workers become visible within
+VERSION_CACHE_SECONDS (set to 0 to read the stamp from Firestore on every
+request). The cache keeps at most VERSION_CACHE_MAX_ENTRIES stamps, dropping
+the least recently used.
+"""
+from flask import Response, request
+from collections import OrderedDict
+import os
+import secrets
+import threading
+import time
+
+from .database import db
+from .responses import json_response
+
+VERSION_CACHE_SECONDS = float(os.environ.get('VERSION_CACHE_SECONDS', 2))
+VERSION_CACHE_MAX_ENTRIES = int(os.environ.get('VERSION_CACHE_MAX_ENTRIES', 4096))
+
+# kind -> (collection, stamp field)
+VERSIONED = {
+    'user': ('users', 'data_version'),
+    'session': ('chat_sessions', 'version'),
+}
+
+# (kind, doc_id) -> (cached at, version, owner), least recently used first
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+def new_stamp():
+    """A fresh, opaque version stamp"""
+    return secrets.token_hex(8)
+
+def remember_version(kind, doc_id, version, owner):
+    """Record a stamp this worker just wrote (or read)"""
+    with _lock:
+        _cache[(kind, doc_id)] = (time.monotonic(), version, owner)
+        _cache.move_to_end((kind, doc_id))
+        while len(_cache) > VERSION_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+def forget_version(kind, doc_id):
+    with _lock:
+        _cache.pop((kind, doc_id), None)
+
+def _load_version(kind, doc_id):
+    """Read a stamp and its owning user from Firestore, creating the stamp on first use"""
+    collection, field = VERSIONED[kind]
+    doc_ref = db.collection(collection).document(doc_id)
+    doc = doc_ref.get()
+    if not doc.exists:
+        return None, None
+
+    data = doc.to_dict()
+    version = data.get(field)
+    if version is None:
+        # Documents written before versioning existed
+        version = new_stamp()
+        doc_ref.update({field: version})
+    owner = doc_id if kind == 'user' else data.get('user_id')
+    return version, owner
+
+def get_version(kind, doc_id):
+    """(version, owner user id) for a document, or (None, None) if it doesn't exist"""
+    with _lock:
+        entry = _cache.get((kind, doc_id))
+        if entry is not None:
+            if time.monotonic() - entry[0] < VERSION_CACHE_SECONDS:
+                _cache.move_to_end((kind, doc_id))
+                return entry[1], entry[2]
+            del _cache[(kind, doc_id)]
+
+    version, owner = _load_version(kind, doc_id)
+    if version is not None:
+        remember_version(kind, doc_id, version, owner)
+    return version, owner
+
+def bump_user_version(user_id):
+    """Mark a user's sessions, stats and profile as changed"""
+    version = new_stamp()
+    collection, field = VERSIONED['user']
+    db.collection(collection).document(user_id).update({field: version})
+    remember_version('user', user_id, version, user_id)
+    return version
+
+def conditional_json(etag, build):
+    """JSON response tagged with `etag`, or 304 if the client already holds it
+
+    `build` returns (payload, status) and is only called when the client's copy
+    is stale, so an unchanged resource costs nothing beyond the version lookup.
+    """
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    result, status_code = build()
+    response = json_response(result, status_code)
+    if etag is not None and status_code == 200:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def user_etag(user_id, resource):
+    """ETag for a per-user resource, derived from the user's version stamp"""
+    version, _ = get_version('user', user_id)
+    return f"{resource}-{version}" if version else None
+
+def session_etag(session_id, user_id):
+    """ETag for a session's messages; None when the session isn't the user's"""
+    version, owner = get_version('session', session_id)
+    if version is None or owner != user_id:
+        return None
+    return f"messages-{version}"
@@ -3,6 +3,7 @@ Wellness and mindfulness features module
 """
 from flask import session, jsonify
 from datetime import datetime
+import math
 import random
 
 def start_meditation_session(duration):
@@ -51,16 +52,44 @@ def complete_meditation_session(session_id):
         if session_data.get('user_id') != session['user_id']:
             return {'error': 'Unauthorized'}, 403
         
+        # Completing twice must not count the meditation twice
+        if session_data.get('completed'):
+            return {'message': 'Meditation session already completed'}, 200
+        
+        completed_at = datetime.utcnow()
         session_ref.update({
             'completed': True,
-            'completed_at': datetime.utcnow()
+            'completed_at': completed_at
         })
         
+        from .tasks import defer
+        defer(_record_completed_meditation, session['user_id'], meditation_minutes(session_data.get('duration')),
+              completed_at)
+        
         return {'message': 'Meditation session completed successfully'}, 200
     except Exception as e:
         print(f"Error completing meditation: {e}")
         return {'error': 'Failed to complete meditation session'}, 500
 
+def meditation_minutes(duration):
+    """A session's requested duration as non-negative minutes (0 when it isn't a usable number)"""
+    try:
+        minutes = float(duration)
+    except (TypeError, ValueError):
+        return 0
+    if not math.isfinite(minutes) or minutes <= 0:
+        return 0
+    return int(minutes) if minutes.is_integer() else minutes
+
+def _record_completed_meditation(user_id, duration, completed_at):
+    """Add a finished meditation to the user's rollup, then move the version stamp and refresh stats"""
+    from .rollups import record_meditation
+    from .profile import refresh_profile_statistics
+    from .versions import bump_user_version
+    record_meditation(user_id, duration, completed_at)
+    bump_user_version(user_id)
+    refresh_profile_statistics(user_id)
+
 def get_wellness_reminders():
     """Get personalized wellness reminders"""
     if 'user_id' not in session:
@@ -1,16 +1,17 @@
 #!/usr/bin/env python3
 """
 Simple startup script for the Companion App
+
+    python run.py           Flask development server (debug, auto-reload)
+    python run.py --prod    Production server: pre-fork gunicorn (see gunicorn.conf.py),
+                            or waitress where fork is unavailable
 """
 
+import argparse
 import os
 import sys
 
-def main():
-    print("🌿 Starting Companion App...")
-    print("📱 A simple AI companion and meditation app")
-    print("=" * 50)
-    
+def check_requirements():
     # Check if required packages are installed
     try:
         import flask
@@ -21,16 +22,80 @@ def main():
         print(f"❌ Missing package: {e}")
         print("Please run: pip install -r requirements.txt")
         sys.exit(1)
-    
-    # Start the application
-    print("🚀 Starting Flask server...")
-    print("🌐 Open your browser to: http://localhost:5001")
+
+def run_development(host, port):
+    print("🚀 Starting Flask development server...")
+    print(f"🌐 Open your browser to: http://localhost:{port}")
     print("⏹️  Press Ctrl+C to stop the server")
     print("=" * 50)
-    
+
     # Import and run the app
     from app import app
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    from modules.guests import start_guest_sweeper
+    # Sweep from the reloader's serving process only
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_guest_sweeper()
+    app.run(debug=True, host=host, port=port)
+
+def build_static_assets():
+    from modules.assets import build_assets
+    print("📦 Building static assets...")
+    build_assets(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+
+def run_production(host, port, workers):
+    build_static_assets()
+
+    bind = f"{host}:{port}"
+    os.environ['BIND'] = bind
+    if workers:
+        os.environ['WEB_CONCURRENCY'] = str(workers)
+
+    try:
+        import gunicorn
+        has_gunicorn = hasattr(os, 'fork')
+    except ImportError:
+        has_gunicorn = False
+
+    if has_gunicorn:
+        print(f"🚀 Starting gunicorn on {bind} (pre-fork, models shared copy-on-write)")
+        print("🔁 Graceful reload: kill -HUP <master pid>")
+        print("=" * 50)
+        config = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+        # Replace this process so gunicorn's master receives signals directly
+        os.execv(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', config, 'app:app'])
+
+    try:
+        from waitress import serve
+    except ImportError:
+        print("❌ No production server found")
+        print("Please run: pip install gunicorn  (or waitress on Windows)")
+        sys.exit(1)
+
+    print(f"🚀 Starting waitress on {bind} (single process, threaded)")
+    print("=" * 50)
+    from app import app
+    from modules.guests import start_guest_sweeper
+    start_guest_sweeper()
+    serve(app, host=host, port=port, threads=int(os.environ.get('WORKER_THREADS', 8)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Start the Companion App")
+    parser.add_argument('--prod', action='store_true', help='run the production server instead of the Flask dev server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--workers', type=int, help='gunicorn worker processes (default: WEB_CONCURRENCY or CPUs / 2)')
+    args = parser.parse_args()
+
+    print("🌿 Starting Companion App...")
+    print("📱 A simple AI companion and meditation app")
+    print("=" * 50)
+
+    check_requirements()
+
+    if args.prod:
+        run_production(args.host, args.port, args.workers)
+    else:
+        run_development(args.host, args.port)
 
 if __name__ == '__main__':
     main()
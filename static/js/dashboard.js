@@ -11,13 +11,17 @@ class ModernDashboard {
         this.mediaStream = null;
         this.emotionDetectionInterval = null;
         this.isAnalyzing = false;
+        this.emotionSocket = null;
+        this.streamFrameTimeout = null;
+        this.lastFrameSentAt = 0;
+        // Server-negotiated capture settings (see /emotions/capture-config)
+        this.captureConfig = { width: 320, height: 240, jpeg_quality: 0.6, interval_ms: 3000 };
         this.init();
     }
 
     init() {
         this.bindEvents();
-        this.loadUserInfo();
-        this.loadChatSessions();
+        this.loadBootstrap();
         this.initializeChat();
     }
 
@@ -118,25 +122,30 @@ class ModernDashboard {
         dropdown.classList.toggle('hidden');
     }
 
-    async loadUserInfo() {
+    async loadBootstrap() {
+        // Profile, preferences, sessions and stats arrive in a single request
         try {
-            const response = await fetch('/profile');
+            const response = await fetch('/api/bootstrap');
             if (response.ok) {
                 const data = await response.json();
-                const user = data.user;
-                
-                // Update user display
-                const initials = this.getInitials(user.username || user.name || 'User');
-                document.getElementById('userInitials').textContent = initials;
-                document.getElementById('userName').textContent = user.username || user.name || 'User';
-                document.getElementById('sidebarUserInitials').textContent = initials;
-                document.getElementById('sidebarUserName').textContent = user.username || user.name || 'Welcome';
+                this.preferences = data.preferences || {};
+                this.stats = data.stats || {};
+                this.renderUserInfo(data.user);
+                this.renderChatSessions(data.sessions || []);
             }
         } catch (error) {
-            console.error('Error loading user info:', error);
+            console.error('Error loading dashboard data:', error);
         }
     }
 
+    renderUserInfo(user) {
+        const initials = this.getInitials(user.username || user.name || 'User');
+        document.getElementById('userInitials').textContent = initials;
+        document.getElementById('userName').textContent = user.username || user.name || 'User';
+        document.getElementById('sidebarUserInitials').textContent = initials;
+        document.getElementById('sidebarUserName').textContent = user.username || user.name || 'Welcome';
+    }
+
     getInitials(name) {
         return name.split(' ').map(n => n[0]).join('').toUpperCase().slice(0, 2);
     }
@@ -145,8 +154,8 @@ class ModernDashboard {
         try {
             const response = await fetch('/chat/sessions');
             if (response.ok) {
-                const data = await response.json();
-                this.renderChatSessions(data.sessions || []);
+                const sessions = await response.json();
+                this.renderChatSessions(Array.isArray(sessions) ? sessions : []);
             }
         } catch (error) {
             console.error('Error loading chat sessions:', error);
@@ -433,26 +442,160 @@ class ModernDashboard {
         this.showNotification('Camera stopped', 'info');
     }
 
-    startRealTimeEmotionDetection() {
-        if (this.emotionDetectionInterval) {
-            clearInterval(this.emotionDetectionInterval);
+    async loadCaptureConfig() {
+        try {
+            const response = await fetch('/emotions/capture-config');
+            if (response.ok) {
+                this.applyCaptureConfig(await response.json());
+            }
+        } catch (error) {
+            console.error('Error loading capture config:', error);
         }
-        
-        // Analyze emotions every 3 seconds
-        this.emotionDetectionInterval = setInterval(() => {
-            if (this.cameraActive && !this.isAnalyzing) {
-                this.analyzeCurrentFrame();
+    }
+
+    applyCaptureConfig(config) {
+        if (config) {
+            this.captureConfig = { ...this.captureConfig, ...config };
+        }
+    }
+
+    async startRealTimeEmotionDetection() {
+        this.stopRealTimeEmotionDetection();
+        await this.loadCaptureConfig();
+        if (!this.cameraActive) return;
+
+        // Prefer the persistent WebSocket stream; fall back to HTTP polling
+        if ('WebSocket' in window) {
+            this.openEmotionStream();
+        } else {
+            this.startEmotionPolling();
+        }
+    }
+
+    startEmotionPolling() {
+        clearTimeout(this.emotionDetectionInterval);
+        console.log('Real-time emotion detection started (HTTP polling)');
+        this.scheduleNextPoll();
+    }
+
+    scheduleNextPoll() {
+        // The server picks the next interval based on its load and how
+        // stable the detected emotion has been
+        this.emotionDetectionInterval = setTimeout(async () => {
+            if (!this.cameraActive) return;
+            if (!this.isAnalyzing) {
+                await this.analyzeCurrentFrame();
             }
-        }, 3000);
-        
-        console.log('Real-time emotion detection started');
+            if (this.cameraActive && !this.emotionSocket) {
+                this.scheduleNextPoll();
+            }
+        }, this.captureConfig.interval_ms);
+    }
+
+    openEmotionStream() {
+        const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        const socket = new WebSocket(`${protocol}://${window.location.host}/emotions/stream`);
+        socket.binaryType = 'arraybuffer';
+        this.emotionSocket = socket;
+
+        socket.onopen = () => {
+            console.log('Real-time emotion detection started (WebSocket)');
+            this.sendStreamFrame();
+        };
+
+        socket.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            if (data.type === 'result' && data.emotions && data.emotions.length > 0) {
+                this.displayEmotionResults(data.emotions);
+                this.showRealTimeIndicator();
+            }
+            this.applyCaptureConfig(data.capture);
+
+            if (data.type === 'throttled') {
+                // Server is shedding load; back off for the advised time
+                this.lastFrameSentAt = performance.now() + data.retry_after * 1000 - this.captureConfig.interval_ms;
+            }
+            this.scheduleStreamFrame();
+        };
+
+        socket.onclose = () => {
+            if (this.emotionSocket !== socket) return;
+            this.emotionSocket = null;
+            clearTimeout(this.streamFrameTimeout);
+
+            // Keep detection running over HTTP if the stream drops
+            if (this.cameraActive) {
+                this.startEmotionPolling();
+            }
+        };
+    }
+
+    scheduleStreamFrame() {
+        // Only one frame is ever in flight: the next capture waits for the
+        // previous result, so a busy server naturally slows the cadence
+        clearTimeout(this.streamFrameTimeout);
+        const elapsed = performance.now() - this.lastFrameSentAt;
+        const delay = Math.max(0, this.captureConfig.interval_ms - elapsed);
+        this.streamFrameTimeout = setTimeout(() => this.sendStreamFrame(), delay);
+    }
+
+    async sendStreamFrame() {
+        const socket = this.emotionSocket;
+        if (!this.cameraActive || !socket || socket.readyState !== WebSocket.OPEN) return;
+
+        this.lastFrameSentAt = performance.now();
+        const blob = await this.captureFrameBlob();
+
+        if (!blob) {
+            // Video not ready yet; try again on the next tick
+            this.scheduleStreamFrame();
+            return;
+        }
+
+        if (socket.readyState === WebSocket.OPEN) {
+            socket.send(blob);
+        }
+    }
+
+    captureFrameCanvas(video) {
+        // Downscale to the server's target resolution, keeping aspect ratio
+        const scale = Math.min(
+            1,
+            this.captureConfig.width / video.videoWidth,
+            this.captureConfig.height / video.videoHeight
+        );
+
+        const canvas = document.createElement('canvas');
+        canvas.width = Math.round(video.videoWidth * scale);
+        canvas.height = Math.round(video.videoHeight * scale);
+
+        const ctx = canvas.getContext('2d');
+        ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+        return canvas;
+    }
+
+    captureFrameBlob() {
+        const video = document.getElementById('cameraFeed');
+        if (!video || video.readyState !== 4) {
+            return Promise.resolve(null);
+        }
+
+        const canvas = this.captureFrameCanvas(video);
+        return new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', this.captureConfig.jpeg_quality));
     }
 
     stopRealTimeEmotionDetection() {
         if (this.emotionDetectionInterval) {
-            clearInterval(this.emotionDetectionInterval);
+            clearTimeout(this.emotionDetectionInterval);
             this.emotionDetectionInterval = null;
         }
+        if (this.emotionSocket) {
+            const socket = this.emotionSocket;
+            this.emotionSocket = null;
+            socket.close();
+        }
+        clearTimeout(this.streamFrameTimeout);
+        this.streamFrameTimeout = null;
         this.isAnalyzing = false;
         console.log('Real-time emotion detection stopped');
     }
@@ -469,14 +612,8 @@ class ModernDashboard {
                 return;
             }
 
-            const canvas = document.createElement('canvas');
-            canvas.width = video.videoWidth;
-            canvas.height = video.videoHeight;
-            
-            const ctx = canvas.getContext('2d');
-            ctx.drawImage(video, 0, 0);
-            
-            const imageData = canvas.toDataURL('image/jpeg', 0.8);
+            const canvas = this.captureFrameCanvas(video);
+            const imageData = canvas.toDataURL('image/jpeg', this.captureConfig.jpeg_quality);
             
             const response = await fetch('/emotions/analyze-image', {
                 method: 'POST',
@@ -488,6 +625,16 @@ class ModernDashboard {
             
             const data = await response.json();
             
+            if (response.ok) {
+                this.applyCaptureConfig(data.capture);
+            } else if (response.status === 429) {
+                // Back off for as long as the server asks, never polling faster than before
+                const retryAfter = parseInt(response.headers.get('Retry-After') || '5', 10);
+                this.applyCaptureConfig({
+                    interval_ms: Math.max(this.captureConfig.interval_ms, retryAfter * 1000)
+                });
+            }
+
             if (response.ok && data.emotions && data.emotions.length > 0) {
                 this.displayEmotionResults(data.emotions);
                 
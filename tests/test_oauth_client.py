@@ -0,0 +1,56 @@
+"""
+The pooled OAuth client's retry and timeout rules, against the local stub provider
+
+GETs are retried on 503 and on timeouts; the token POST (a one-time code) is
+never resent; a read timeout comes back as None within the configured bound.
+"""
+import time
+
+import pytest
+
+from benchmarks.fakes import StubOAuthProvider
+from modules import oauth_client
+
+READ_TIMEOUT = 0.3
+
+@pytest.fixture(autouse=True)
+def fast_client(monkeypatch):
+    monkeypatch.setattr(oauth_client, 'OAUTH_READ_TIMEOUT', READ_TIMEOUT)
+    monkeypatch.setattr(oauth_client, 'OAUTH_RETRY_BACKOFF', 0)
+    oauth_client.close_sessions()
+    yield
+    oauth_client.close_sessions()
+
+def stub_call(method, url, **stub):
+    """One oauth_request against a fresh stub; returns (response, seconds, provider counts)"""
+    provider = StubOAuthProvider(**stub).start()
+    try:
+        started = time.perf_counter()
+        response = oauth_client.oauth_request('stub', 'check', method, provider.base_url + url)
+        return response, time.perf_counter() - started, dict(provider.counts)
+    finally:
+        oauth_client.close_sessions()
+        provider.stop()
+
+def test_get_answered_503_is_retried_then_returned():
+    response, _, counts = stub_call('GET', '/user', fail_every=1)
+    assert counts['userinfo'] == oauth_client.OAUTH_RETRIES + 1
+    assert response is not None and response.status_code == 503
+
+def test_token_post_answered_503_is_sent_once():
+    response, _, counts = stub_call('POST', '/token', fail_token_every=1)
+    assert counts['token'] == 1
+    assert response is not None and response.status_code == 503
+
+def test_token_post_that_times_out_is_sent_once():
+    response, elapsed, counts = stub_call('POST', '/token', stall=READ_TIMEOUT * 3)
+    assert counts['token'] == 1
+    assert response is None
+    assert elapsed < READ_TIMEOUT * 2
+
+def test_get_that_times_out_is_retried_within_bound():
+    attempts = oauth_client.OAUTH_RETRIES + 1
+    response, elapsed, counts = stub_call('GET', '/user', stall=READ_TIMEOUT * 3)
+    assert counts['userinfo'] == attempts
+    assert response is None
+    assert elapsed < attempts * READ_TIMEOUT + 1